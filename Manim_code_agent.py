@@ -1,18 +1,21 @@
-import google.generativeai as genai
 import json
 import os
 import re
-from dotenv import load_dotenv
+import ast
+import concurrent.futures
+import contextvars
+import threading
+import time
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from Topic_analysis_agent import TopicAnalysisAgent
 from visual_plan_agent import VisualPlanAgent, VisualPlan, ManimObject
-from manim import *
-
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-genai.configure(api_key=GEMINI_API_KEY)
+from llm_stream import code_guard, diff_guard, stream_with_reissue
+from gemini_client import get_model
+from script_patch import PATCH_INSTRUCTIONS, PatchError, apply_unified_diff, extract_diff, number_lines
+from manim_linter import lint_manim_script
+from render_pool import DRAFT_RESOLUTION
+from tracing import annotate, fail, traced
 
 class VisualPlan(BaseModel):
     Topic: str
@@ -100,8 +103,8 @@ class EqualVectors(Scene):
         label_2 = MathTex("\\vec{B}").next_to(vector_2, UP).set_color(BLUE)
 
         # Add vectors to the scene
-        self.add(GrowArrow(vector_1), FadeIn(label_1))
-        self.add(GrowArrow(vector_2), FadeIn(label_2))
+        self.add(vector_1, label_1)
+        self.add(vector_2, label_2)
 
         # Add annotation for equality
         annotation = MathTex("\\vec{A} = \\vec{B}").to_edge(DOWN).set_color(YELLOW)
@@ -112,10 +115,31 @@ class EqualVectors(Scene):
 
 """
 
+DEFAULT_FANOUT = int(os.getenv("CODEGEN_FANOUT", 4))
+DEFAULT_MAX_CANDIDATES = int(os.getenv("CODEGEN_MAX_CANDIDATES", 8))
+
+
+def candidate_temperature(index: int) -> float:
+    """Distinct temperature in [0.2, 1.0) per candidate (golden-ratio spread), so every
+    candidate is a different sample and gets its own LLM cache entry."""
+    return round(0.2 + 0.8 * ((index * 0.618034) % 1), 3)
+
+
+def scene_class_name(code: str) -> Optional[str]:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and any(
+                isinstance(b, ast.Name) and b.id.endswith("Scene") for b in node.bases):
+            return node.name
+    return None
+
+
 class ManimCodeAgent:
     def __init__(self):
         self.system_prompt = MANIM_CODE_SYSTEM_PROMPT
-        self.model = genai.GenerativeModel("gemini-1.5-flash")
         self.validation_prompt = """
         **Code Validation Rules:**
         1. Ensure all objects from VisualPlan.ManimObjects are present
@@ -123,9 +147,19 @@ class ManimCodeAgent:
         3. Check for required educational elements (equations, labels)
         4. Validate Manim syntax and scene structure
         """
+        # The static prompt and few-shot example are sent once as the system instruction
+        self.model = get_model("gemini-1.5-flash", system_instruction=self.system_prompt + self.validation_prompt)
 
-    def validate_and_correct(self, generated_code: str, visual_plan: VisualPlan) -> str:
+    @traced("validation")
+    def validate_and_correct(self, generated_code: str, visual_plan: VisualPlan, repair_mode: str = "patch",
+                             generation_config: Optional[dict] = None,
+                             cancel: Optional[threading.Event] = None) -> str:
         """Self-correcting mechanism with visual plan validation"""
+        if repair_mode == "patch":
+            patched = self._patch_code(generated_code, visual_plan, generation_config, cancel)
+            if patched is not None:
+                return patched
+
         correction_prompt = f"""
         Identify and fix issues in this Manim code based on the visual plan:
         
@@ -145,20 +179,157 @@ class ManimCodeAgent:
         
         Provide corrected code with comments explaining fixes.
         """
-        response = self.model.generate_content(self.system_prompt + self.validation_prompt + correction_prompt)
-        return self._extract_code(response.text)
+        # Streamed so a reply that turns into prose is cut off and re-issued early
+        response_text = stream_with_reissue(
+            self.model, correction_prompt,
+            guard=code_guard(), generation_config=generation_config, cancel=cancel,
+        )
+        return self._extract_code(response_text or "")
+
+    def _patch_code(self, generated_code: str, visual_plan: VisualPlan,
+                    generation_config: Optional[dict] = None,
+                    cancel: Optional[threading.Event] = None) -> Optional[str]:
+        """Asks for a unified diff instead of the whole script; None if it can't be applied."""
+        patch_prompt = f"""
+        Identify and fix issues in this Manim code based on the visual plan:
+
+        Visual Plan Requirements:
+        - Topic: {visual_plan.Topic}
+        - Objects: {[obj.Object for obj in visual_plan.ManimObjects]}
+        - Key Elements: {visual_plan.Description}
+
+        Code to Validate (with line numbers):
+        {number_lines(generated_code)}
+        {PATCH_INSTRUCTIONS}
+        """
+        response_text = stream_with_reissue(self.model, patch_prompt, guard=diff_guard(),
+                                            generation_config=generation_config, cancel=cancel)
+        diff = extract_diff(response_text or "")
+        if diff is None:
+            return None
+        try:
+            patched = apply_unified_diff(generated_code, diff)
+            ast.parse(patched)
+        except (PatchError, SyntaxError) as e:
+            print(f"Debug: Discarding patch ({e}), regenerating full code")
+            annotate(patch_rejected=type(e).__name__)
+            return None
+        return patched.strip()
         
+    @traced("code_generation", mode="serial")
     def generate_code(self, visual_plan: VisualPlan) -> ManimCode:
         max_attempts = 3
+        validated_code = ""
         for attempt in range(max_attempts):
-            code = self._generate_initial_code(visual_plan)
-            validated_code = self.validate_and_correct(code, visual_plan)
+            # The first attempt writes the scene from the skeleton in full; a retry repairs the
+            # previous attempt's code with a diff (regenerating in full if that doesn't apply)
+            if attempt and validated_code.strip():
+                code, repair_mode = validated_code, "patch"
+            else:
+                code, repair_mode = self._generate_initial_code(visual_plan), "full"
+            # Retries must sample again rather than replay the cached response
+            config = {"temperature": candidate_temperature(attempt)} if attempt else None
+            validated_code = self.validate_and_correct(code, visual_plan, repair_mode=repair_mode,
+                                                       generation_config=config)
             
             if self._passes_validation(validated_code, visual_plan):
+                annotate(attempts=attempt + 1)
                 return ManimCode(Code=validated_code, Description=f"Validated in {attempt+1} attempts")
             
+        annotate(attempts=max_attempts)
+        fail("validation_failed")
         return ManimCode(Code=validated_code, Description="Best effort after validation attempts")
 
+    @traced("code_candidate")
+    def _candidate(self, visual_plan: VisualPlan, index: int, render_pool,
+                   cancel: Optional[threading.Event] = None) -> tuple:
+        """
+        Generate one candidate and check it; returns (code, accepted, reason).
+        Once cancel is set (another candidate won) streaming stops and nothing more is rendered.
+        """
+        # The skeleton is a placeholder, so the scene is written in full rather than as a diff
+        code = self.validate_and_correct(self._generate_initial_code(visual_plan), visual_plan, repair_mode="full",
+                                         generation_config={"temperature": candidate_temperature(index)},
+                                         cancel=cancel)
+        if cancel is not None and cancel.is_set():
+            fail("cancelled")
+            return code, False, "cancelled"
+        if not self._passes_validation(code, visual_plan):
+            fail("missing_elements")
+            return code, False, "missing required elements"
+        scene_name = scene_class_name(code)
+        if scene_name is None:
+            fail("no_scene_class")
+            return code, False, "no Scene class"
+        # Heuristic findings are left to the dry run below
+        findings = [f for f in lint_manim_script(code, scene_name) if f.blocking]
+        if findings:
+            fail("lint")
+            return code, False, str(findings[0])
+        if render_pool is not None:
+            if cancel is not None and cancel.is_set():
+                fail("cancelled")
+                return code, False, "cancelled"
+            result = render_pool.render(code, scene_name, resolution=DRAFT_RESOLUTION, dry_run=True)
+            if not result.success:
+                fail(result.error_type or "render_failed")
+                return code, False, f"render failed: {result.error_type}: {result.error_message}"
+        return code, True, ""
+
+    @traced("code_generation", mode="parallel")
+    def generate_code_parallel(self, visual_plan: VisualPlan, fanout: int = DEFAULT_FANOUT,
+                               max_candidates: int = DEFAULT_MAX_CANDIDATES, timeout: Optional[float] = None,
+                               render_pool=None) -> ManimCode:
+        """
+        Requests up to `fanout` candidates at once (each at a different temperature), pre-flights
+        and optionally dry-run renders them in parallel, and returns the first that passes.
+        At most `max_candidates` are generated in total, within `timeout` seconds if given.
+        """
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=fanout)
+        # Set when this returns: running candidates stop streaming and don't take a render worker
+        cancel = threading.Event()
+        pending = set()
+        submitted = 0
+        fallback = None
+
+        def submit(index):
+            # Run in a copy of this context so candidate spans nest under this one
+            return executor.submit(contextvars.copy_context().run, self._candidate, visual_plan, index,
+                                   render_pool, cancel)
+
+        try:
+            while submitted < min(fanout, max_candidates):
+                pending.add(submit(submitted))
+                submitted += 1
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while pending:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                done, pending = concurrent.futures.wait(
+                    pending, timeout=remaining, return_when=concurrent.futures.FIRST_COMPLETED)
+                if not done:
+                    print("Debug: Candidate budget exhausted (timeout)")
+                    break
+                for future in done:
+                    try:
+                        code, accepted, reason = future.result()
+                    except Exception as e:
+                        code, accepted, reason = None, False, f"{type(e).__name__}: {e}"
+                    if accepted:
+                        annotate(candidates=submitted)
+                        return ManimCode(Code=code, Description=f"First passing candidate of {submitted} requested")
+                    print(f"Debug: Candidate rejected ({reason})")
+                    fallback = fallback or code
+                    if submitted < max_candidates:
+                        pending.add(submit(submitted))
+                        submitted += 1
+        finally:
+            # Don't wait for the losing candidates; the ones already running see cancel and stop
+            cancel.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+        annotate(candidates=submitted)
+        fail("no_passing_candidate")
+        return ManimCode(Code=fallback or "", Description=f"Best effort after {submitted} candidates")
+
     def _passes_validation(self, code: str, visual_plan: VisualPlan) -> bool:
         # Check for required elements using regex patterns
         required_elements = [
@@ -196,27 +367,39 @@ class {visual_plan.Topic.replace(' ', '')}Scene(Scene):
 
 
 if __name__ == "__main__":  
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Generate a Manim script for a topic")
+    parser.add_argument("topic", nargs="?", help="Prompted for (with chapter and grade) if omitted")
+    parser.add_argument("--chapter", default="")
+    parser.add_argument("--grade", default="")
+    parser.add_argument("--output", default="generated_manim_script.py",
+                        help="Where to write the script (debugging_agent passes the job's workspace)")
+    args = parser.parse_args()
+
     topic_agent = TopicAnalysisAgent()
     visual_agent = VisualPlanAgent()
     manim_agent = ManimCodeAgent()
 
-    # Get required inputs from user
-    topic = input("Enter topic: ").strip()
-    chapter = input("Enter chapter: ").strip()  # Add chapter input
-    grade = input("Enter grade: ").strip()      # Add grade input
-    output_filename = "generated_manim_script"
+    # Get required inputs from the command line, or from the user
+    topic, chapter, grade = args.topic, args.chapter, args.grade
+    if not topic:
+        topic = input("Enter topic: ").strip()
+        chapter = input("Enter chapter: ").strip()
+        grade = input("Enter grade: ").strip()
 
     # Pass all required parameters to analyze_topic
     topic_analysis = topic_agent.analyze_topic(topic, chapter, grade)
 
     if not topic_analysis:
         print("Failed to generate topic analysis.")
-        exit()
+        sys.exit(1)
 
     visual_plan = visual_agent.generate_plan(topic_analysis, chapter, grade)
     if not visual_plan:
         print("Failed to generate visual plan.")
-        exit()
+        sys.exit(1)
 
     print("Extracted Visual Plan:")
     print(visual_plan.model_dump_json(indent=4))
@@ -227,10 +410,14 @@ if __name__ == "__main__":
         print("Generated Manim Code:")
         print(manim_code.Code)
         
-        # Write to standardized output file
-        with open(f"{output_filename}.py", "w", encoding="utf-8") as f:
+        # Write through a temp file so a concurrent reader never sees a partial script
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        tmp_path = f"{args.output}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             f.write(manim_code.Code)
+        os.replace(tmp_path, args.output)
             
-        print(f"Manim code saved to '{output_filename}.py'.")
+        print(f"Manim code saved to '{args.output}'.")
     else:
-        print("Failed to generate Manim code.")
\ No newline at end of file
+        print("Failed to generate Manim code.")
+        sys.exit(1)
\ No newline at end of file
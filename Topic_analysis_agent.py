@@ -1,14 +1,10 @@
-import google.generativeai as genai
 import json
-import os
-import re
 from pydantic import BaseModel, ValidationError
 from typing import List, Optional
-from dotenv import load_dotenv
-
-# Load API key from environment variables
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+from llm_cache import cached_generate_content
+from gemini_client import get_model
+from json_extractor import extract_json
+from tracing import annotate, fail, record, traced
 
 # Define data models
 class Definition(BaseModel):
@@ -58,12 +54,30 @@ You are an AI assistant that extracts structured information from textbook topic
 class TopicAnalysisAgent:
     """AI-driven agent for analyzing textbook topics."""
     
-    def __init__(self):
-        self.model = genai.GenerativeModel("gemini-1.5-flash")
+    def __init__(self, semantic_cache=None):
+        self.model = get_model("gemini-1.5-flash", system_instruction=SYSTEM_PROMPT)
+        self.semantic_cache = semantic_cache  # None: the shared one, loaded on first use (imports numpy)
+
+    def _semantic_cache(self):
+        if self.semantic_cache is None:
+            from semantic_cache import get_default_semantic_cache
+            self.semantic_cache = get_default_semantic_cache("topic_analysis")
+        return self.semantic_cache
 
+    @traced("topic_analysis")
     def analyze_topic(self, topic: str, chapter: str, grade: str) -> Optional[TopicAnalysis]:
-        """Generates structured topic analysis using AI."""
-        
+        """
+        Generates structured topic analysis using AI.
+        An analysis of a near-identical topic for the same grade is reused without a
+        model call; one of a merely similar topic is passed to the model as a starting point.
+        """
+        cache = self._semantic_cache()
+        mode, match = cache.find(topic, grade=grade)
+        if mode == "reuse":
+            annotate(semantic_cache="reuse", similarity=round(match.similarity, 3), reused_topic=match.text)
+            record(semantic_reuses=1)
+            return TopicAnalysis.model_validate(match.value)
+
         prompt = f"""
         ### Educational Context:
         - Chapter: {chapter}
@@ -75,45 +89,47 @@ class TopicAnalysisAgent:
         2. Chapter learning objectives
         3. Relevant examples
         """
+        if mode == "seed":
+            annotate(semantic_cache="seed", similarity=round(match.similarity, 3), seed_topic=match.text)
+            record(semantic_seeds=1)
+            prompt += f"""
+        ### Related Analysis:
+        A similar topic ("{match.text}", grade {match.meta.get('grade')}) was analyzed as below.
+        Keep what applies and adapt the rest to this topic, chapter and grade.
+        {json.dumps(match.value)}
+        """
 
-        response = self.model.generate_content(SYSTEM_PROMPT + prompt)
+        response_text = cached_generate_content(self.model, prompt)
 
-        if not response.candidates:
+        if response_text is None:
             print("Error: No response received.")
+            fail("no_response")
             return None
 
-        response_text = response.candidates[0].content.parts[0].text.strip()
+        response_text = response_text.strip()
 
-        try:
-            # Improved JSON cleaning
-            json_str = re.sub(
-                r'(?m)^\s*//.*?$|//.*',  # Remove both line and inline comments
-                '', 
-                response_text
-            ).strip()
-            
-            # Remove JSON markdown tags
-            json_str = re.sub(r'^```json|```$', '', json_str, flags=re.MULTILINE)
-            
-            # Fix trailing commas in JSON arrays/objects
-            json_str = re.sub(r',\s*([}\]])', r'\1', json_str)
-            
-            parsed = json.loads(json_str)
-            
-            # Add validation for required fields
-            if not all(key in parsed for key in ['CoreTopic', 'KeyConcepts', 'Definitions']):
-                print("Error: Missing required fields in JSON response")
-                return None
-                
-            return TopicAnalysis(**parsed)
-            
-        except json.JSONDecodeError as e:
-            print(f"JSON Error: {str(e)}")
+        # Tolerates fences, comments, trailing commas and truncated output
+        parsed = extract_json(response_text, expect=(dict,))
+        if parsed is None:
+            print("JSON Error: no JSON object found in response")
             print("Received Response:\n", response_text)  # Debug output
+            fail("json_error")
+            return None
+
+        # Add validation for required fields
+        if not all(key in parsed for key in ['CoreTopic', 'KeyConcepts', 'Definitions']):
+            print("Error: Missing required fields in JSON response")
+            fail("missing_fields")
             return None
+
+        try:
+            analysis = TopicAnalysis.model_validate(parsed)
         except ValidationError as ve:
             print(f"Validation Error: {ve.errors()}")
+            fail("validation_error")
             return None
+        cache.put(topic, analysis.model_dump(), grade=grade, chapter=chapter)
+        return analysis
 
 if __name__ == "__main__":  
     agent = TopicAnalysisAgent()
@@ -0,0 +1,188 @@
+import argparse
+import asyncio
+import csv
+import functools
+import json
+import time
+from typing import Dict, Iterator, List, Optional
+
+from Topic_analysis_agent import TopicAnalysisAgent
+from visual_plan_agent import VisualPlanAgent
+from Manim_code_agent import ManimCodeAgent
+from tracing import span
+
+DEFAULT_CONCURRENCY = {"analyze": 8, "plan": 8, "codegen": 4}
+# Topic titles this similar (within the same grade and chapter) are generated once
+DEFAULT_DEDUP_THRESHOLD = 0.9
+
+
+def read_rows(path: str) -> Iterator[Dict[str, str]]:
+    """Yield (topic, chapter, grade) rows from a CSV or JSONL file."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                line = line.strip()
+                if line:
+                    row = json.loads(line)
+                    yield {k: str(row.get(k, "")).strip() for k in ("topic", "chapter", "grade")}
+        else:
+            for row in csv.DictReader(f):
+                yield {k: (row.get(k) or "").strip() for k in ("topic", "chapter", "grade")}
+
+
+class BatchPipeline:
+    """
+    Runs analyze_topic -> generate_plan -> generate_code for many topics at once.
+    Each stage has its own concurrency bound, so stage N for one topic overlaps
+    with stage N-1 for another. Results stream to JSONL as topics finish.
+    Duplicate and near-duplicate topics are processed once and their result is
+    written for every copy (marked with duplicate_of). With codegen_fanout > 1,
+    candidates are dry-run rendered on render_pool when one is given.
+    """
+
+    def __init__(self, analyze_concurrency: int = DEFAULT_CONCURRENCY["analyze"],
+                 plan_concurrency: int = DEFAULT_CONCURRENCY["plan"],
+                 codegen_concurrency: int = DEFAULT_CONCURRENCY["codegen"], codegen_fanout: int = 1,
+                 dedup_threshold: Optional[float] = DEFAULT_DEDUP_THRESHOLD, render_pool=None):
+        self.codegen_fanout = codegen_fanout
+        self.render_pool = render_pool
+        self.dedup_threshold = dedup_threshold
+        self.topic_agent = TopicAnalysisAgent()
+        self.visual_agent = VisualPlanAgent()
+        self.manim_agent = ManimCodeAgent()
+        self.limits = {
+            "analyze": asyncio.Semaphore(analyze_concurrency),
+            "plan": asyncio.Semaphore(plan_concurrency),
+            "codegen": asyncio.Semaphore(codegen_concurrency),
+        }
+
+    async def _stage(self, name: str, timings: Dict[str, float], func, *args):
+        # The agents are synchronous, so each call runs on a worker thread
+        async with self.limits[name]:
+            start = time.perf_counter()
+            try:
+                return await asyncio.to_thread(func, *args)
+            finally:
+                timings[name] = round(time.perf_counter() - start, 3)
+
+    async def process(self, row: Dict[str, str]) -> dict:
+        # One trace per topic; the stage spans nest under it (to_thread copies the context)
+        with span("topic", topic=row["topic"], chapter=row["chapter"], grade=row["grade"]) as topic_span:
+            record = await self._process(row)
+            if record["status"] != "ok":
+                topic_span.fail(record["failed_stage"] or "unknown")
+            return record
+
+    async def _process(self, row: Dict[str, str]) -> dict:
+        topic, chapter, grade = row["topic"], row["chapter"], row["grade"]
+        record = {"topic": topic, "chapter": chapter, "grade": grade,
+                  "status": "failed", "failed_stage": None, "error": None,
+                  "analysis": None, "plan": None, "code": None, "timings": {}}
+        timings = record["timings"]
+        stage = "analyze"
+        try:
+            analysis = await self._stage("analyze", timings, self.topic_agent.analyze_topic, topic, chapter, grade)
+            if not analysis:
+                record["failed_stage"] = stage
+                return record
+            record["analysis"] = analysis.model_dump()
+
+            stage = "plan"
+            plan = await self._stage("plan", timings, self.visual_agent.generate_plan, analysis, chapter, grade)
+            if not plan:
+                record["failed_stage"] = stage
+                return record
+            record["plan"] = plan.model_dump()
+
+            stage = "codegen"
+            if self.codegen_fanout > 1:
+                generate = functools.partial(self.manim_agent.generate_code_parallel, render_pool=self.render_pool)
+                code = await self._stage("codegen", timings, generate, plan, self.codegen_fanout)
+            else:
+                code = await self._stage("codegen", timings, self.manim_agent.generate_code, plan)
+            record["code"] = code.model_dump()
+            record["status"] = "ok"
+        except Exception as e:
+            record["failed_stage"] = stage
+            record["error"] = f"{type(e).__name__}: {e}"
+        return record
+
+    def _groups(self, rows: List[Dict[str, str]]) -> Dict[int, List[int]]:
+        """Representative row index -> indices of all rows that share its result."""
+        if self.dedup_threshold is None:
+            return {i: [i] for i in range(len(rows))}
+        from dedup import deduplicate, normalize
+
+        result = deduplicate([row["topic"] for row in rows], self.dedup_threshold,
+                             partitions=[(normalize(row["grade"]), normalize(row["chapter"])) for row in rows])
+        if result.representatives != list(range(len(rows))):
+            print(f"Dedup: {result.stats()}")
+        return result.members()
+
+    async def run(self, rows: List[Dict[str, str]], output_path: str) -> Dict[str, int]:
+        """Process all rows and append each finished topic (and its duplicates) to output_path."""
+        counts = {"ok": 0, "failed": 0}
+        groups = self._groups(rows)
+
+        async def process_group(rep: int):
+            return rep, await self.process(rows[rep])
+
+        with open(output_path, "a", encoding="utf-8") as out:
+            tasks = [asyncio.create_task(process_group(rep)) for rep in groups]
+            for finished in asyncio.as_completed(tasks):
+                rep, result = await finished
+                for i in groups[rep]:
+                    record = result if i == rep else {**result, **rows[i], "duplicate_of": rows[rep]["topic"]}
+                    counts[record["status"]] += 1
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    print(f"[{counts['ok'] + counts['failed']}/{len(rows)}] {record['topic']}: {record['status']}")
+                out.flush()
+        return counts
+
+
+def run_batch(input_path: str, output_path: str, analyze_concurrency: Optional[int] = None,
+              plan_concurrency: Optional[int] = None, codegen_concurrency: Optional[int] = None,
+              codegen_fanout: int = 1,
+              dedup_threshold: Optional[float] = DEFAULT_DEDUP_THRESHOLD,
+              render_check: bool = True) -> Dict[str, int]:
+    """render_check: dry-run render code candidates (codegen_fanout > 1) on the shared render pool."""
+    rows = list(read_rows(input_path))
+    render_pool = None
+    if codegen_fanout > 1 and render_check:
+        from render_pool import get_default_pool
+
+        render_pool = get_default_pool()
+
+    async def _main():
+        pipeline = BatchPipeline(
+            analyze_concurrency or DEFAULT_CONCURRENCY["analyze"],
+            plan_concurrency or DEFAULT_CONCURRENCY["plan"],
+            codegen_concurrency or DEFAULT_CONCURRENCY["codegen"],
+            codegen_fanout,
+            dedup_threshold,
+            render_pool,
+        )
+        return await pipeline.run(rows, output_path)
+
+    return asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch topic -> plan -> code pipeline")
+    parser.add_argument("input", help="CSV or JSONL file with topic, chapter, grade columns")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--analyze-concurrency", type=int, default=DEFAULT_CONCURRENCY["analyze"])
+    parser.add_argument("--plan-concurrency", type=int, default=DEFAULT_CONCURRENCY["plan"])
+    parser.add_argument("--codegen-concurrency", type=int, default=DEFAULT_CONCURRENCY["codegen"])
+    parser.add_argument("--codegen-fanout", type=int, default=1,
+                        help="Code candidates requested in parallel per topic (1 = serial attempts)")
+    parser.add_argument("--no-dedup", action="store_true", help="Process duplicate topics separately")
+    parser.add_argument("--no-render-check", action="store_true",
+                        help="Don't dry-run render code candidates (e.g. where manim isn't installed)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = run_batch(args.input, args.output, args.analyze_concurrency,
+                       args.plan_concurrency, args.codegen_concurrency, args.codegen_fanout,
+                       None if args.no_dedup else DEFAULT_DEDUP_THRESHOLD, not args.no_render_check)
+    print(f"Done in {time.perf_counter() - start:.1f}s: {counts['ok']} ok, {counts['failed']} failed")
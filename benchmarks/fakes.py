@@ -0,0 +1,207 @@
+"""
+Offline stand-ins for Gemini and the manim renderer, used by the benchmarks.
+
+FakeModel mimics google.generativeai.GenerativeModel (blocking and streaming
+generate_content) with seeded, configurable latency and error rates. Replies
+come from CannedResponder, which recognises each agent's prompt and answers the
+way a well-behaved model would, including unified diffs for patch requests.
+FakeRenderPool mimics render_pool.RenderPool and fails any script that still
+contains BUG, so the repair loop has something to fix.
+"""
+import difflib
+import os
+import random
+import re
+import threading
+import time
+import types
+from typing import Callable, Optional
+
+BUG, FIX = "colour=", "color="
+
+TOPIC_ANALYSIS_JSON = """```json
+{
+  "CoreTopic": "Equality of Vectors",
+  "KeyConcepts": ["Vector", "Magnitude", "Direction"],
+  "Definitions": [{"Term": "Vector", "Definition": "A quantity with magnitude and direction"}],
+  "Relationships": [{"Concept1": "Magnitude", "Concept2": "Direction", "Relationship": "Both define a vector"}],
+  "Formulas": ["\\\\vec{A} = \\\\vec{B}"],
+  "VisualCues": ["Two parallel arrows of equal length"],
+  "Examples": ["Two cars moving east at 10 m/s"], // equal velocities
+}
+```"""
+
+VISUAL_PLAN_JSON = """Here is the plan:
+```json
+{
+    "Topic": "Equality of Vectors",
+    "Description": "Two equal vectors drawn at different positions on a plane.",
+    "ManimObjects": [
+        {"Object": "Vector", "Description": "The two equal vectors"},
+        {"Object": "Axes", "Description": "Reference coordinate system"}
+    ],
+    "SelectedVisualization": "Diagram"
+}
+```"""
+
+MANIM_CODE = """from manim import *
+
+class GeneratedManimScene(Scene):
+    def construct(self):
+        # Title
+        title = Text("Equality of Vectors", font_size=36).to_edge(UP)
+        axes = Axes(x_range=[-5, 5, 1], y_range=[-3, 3, 1])
+        vector_1 = Vector([2, 1], color=BLUE).shift(LEFT * 3)
+        vector_2 = Vector([2, 1], color=BLUE).shift(RIGHT * 2)
+        label = MathTex(r"\\vec{A} = \\vec{B}").to_edge(DOWN)
+        self.add(title, axes, vector_1, vector_2, label)
+"""
+
+# What Manim_code_agent "writes" before the debugging loop: one bug to repair
+BROKEN_SCRIPT = MANIM_CODE.replace("Vector([2, 1], color=BLUE).shift(RIGHT", f"Vector([2, 1], {BUG}BLUE).shift(RIGHT")
+
+_NUMBERED_LINE = re.compile(r"^\s*(\d+)\| ?(.*)$")
+
+
+def _numbered_lines(prompt: str) -> dict:
+    lines = {}
+    for raw in prompt.splitlines():
+        match = _NUMBERED_LINE.match(raw)
+        if match:
+            lines[int(match.group(1))] = match.group(2)
+    return lines
+
+
+def _diff(numbered: dict, transform: Callable[[str], str]) -> str:
+    """Unified diff over the numbered lines shown in a prompt, one hunk per contiguous run."""
+    hunks, run = [], []
+    for number in sorted(numbered):
+        if run and number != run[-1] + 1:
+            hunks.append(run)
+            run = []
+        run.append(number)
+    if run:
+        hunks.append(run)
+    out = ["--- a/generated_manim_script.py", "+++ b/generated_manim_script.py"]
+    for run in hunks:
+        old = [numbered[n] for n in run]
+        new = transform("\n".join(old)).split("\n")
+        if old == new:
+            continue
+        out.append(f"@@ -{run[0]},{len(old)} +{run[0]},{len(new)} @@")
+        for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(a=old, b=new).get_opcodes():
+            if tag == "equal":
+                out += [" " + line for line in old[i1:i2]]
+            else:
+                out += ["-" + line for line in old[i1:i2]] + ["+" + line for line in new[j1:j2]]
+    return "```diff\n" + "\n".join(out) + "\n```"
+
+
+def canned_response(prompt) -> str:
+    """Reply to each agent's prompt the way a cooperative model would."""
+    text = prompt if isinstance(prompt, str) else "\n".join(str(p) for p in prompt)
+    wants_diff = "unified diff" in text
+    if "extracts structured information from textbook topics" in text:
+        return TOPIC_ANALYSIS_JSON
+    if "structured **visualization plans**" in text:
+        return VISUAL_PLAN_JSON
+    if "Manim Code Generation Agent" in text:
+        if wants_diff:
+            return _diff(_numbered_lines(text), lambda _: MANIM_CODE.rstrip("\n"))
+        return f"Here is the corrected code:\n```python\n{MANIM_CODE}```"
+    if "my script has errors" in text:
+        if wants_diff:
+            return _diff(_numbered_lines(text), lambda block: block.replace(BUG, FIX))
+        script = re.search(r"```python\s*\n(.*?)```", text, re.DOTALL)
+        fixed = (script.group(1) if script else MANIM_CODE).replace(BUG, FIX)
+        return f"```python\n{fixed}```"
+    return "I am not sure what you are asking."
+
+
+class FakeRateLimitError(Exception):
+    code = 429
+
+
+class FakeModel:
+    """Deterministic stand-in for genai.GenerativeModel."""
+
+    def __init__(self, model_name: str, latency_ms: float = 50.0, jitter: float = 0.2,
+                 error_rate: float = 0.0, seed: int = 0, chunk_chars: int = 80,
+                 responder: Callable = canned_response, system_instruction: Optional[str] = None):
+        self.model_name = f"models/{model_name}"
+        self._system_instruction = system_instruction
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.chunk_chars = chunk_chars
+        self.responder = responder
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _sample(self):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency * (1 + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.error_rate
+        return delay, fail
+
+    def generate_content(self, prompt, stream: bool = False, generation_config=None, **kwargs):
+        delay, fail = self._sample()
+        if fail:
+            time.sleep(delay / 10)
+            raise FakeRateLimitError("429 Resource has been exhausted. Please retry in 0.01s.")
+        if self._system_instruction:
+            prompt = [self._system_instruction, prompt]
+        text = self.responder(prompt)
+        usage = types.SimpleNamespace(total_token_count=(len(str(prompt)) + len(text)) // 4)
+        if not stream:
+            time.sleep(delay)
+            part = types.SimpleNamespace(text=text)
+            candidate = types.SimpleNamespace(content=types.SimpleNamespace(parts=[part]))
+            return types.SimpleNamespace(candidates=[candidate], text=text, usage_metadata=usage)
+        return self._stream(text, delay)
+
+    def _stream(self, text: str, delay: float):
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or [""]
+        for chunk in chunks:
+            time.sleep(delay / len(chunks))
+            yield types.SimpleNamespace(text=chunk)
+
+
+class FakeRenderPool:
+    """Stand-in for render_pool.RenderPool; scripts containing BUG fail like manim would."""
+
+    def __init__(self, draft_ms: float = 20.0, final_ms: float = 100.0):
+        self.draft = draft_ms / 1000.0
+        self.final = final_ms / 1000.0
+        self.renders = 0
+
+    def render(self, script: str, scene_name: str, output_path: Optional[str] = None,
+               resolution=(3840, 2160), timeout: float = 0, script_path: str = "<generated_manim_script>",
+               dry_run: bool = False, media_dir: Optional[str] = None):
+        from render_pool import RenderResult
+
+        self.renders += 1
+        duration = self.draft if dry_run else self.final
+        time.sleep(duration)
+        if BUG in script:
+            line = next(i for i, l in enumerate(script.splitlines(), start=1) if BUG in l)
+            source = script.splitlines()[line - 1].strip()
+            message = "Mobject.__init__() got an unexpected keyword argument 'colour'"
+            tb = (f'Traceback (most recent call last):\n'
+                  f'  File "{script_path}", line {line}, in construct\n    {source}\n'
+                  f'  File "/site-packages/manim/mobject/geometry/line.py", line 120, in __init__\n'
+                  f'    super().__init__(**kwargs)\nTypeError: {message}\n')
+            return RenderResult(success=False, error_type="TypeError", error_message=message,
+                                traceback=tb, duration=duration)
+        image_path = None
+        if output_path and not dry_run:
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+            with open(output_path, "wb") as f:
+                f.write(b"\x89PNG\r\n\x1a\n")
+            image_path = output_path
+        return RenderResult(success=True, image_path=image_path, duration=duration)
+
+    def close(self):
+        pass
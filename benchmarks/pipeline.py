@@ -0,0 +1,222 @@
+"""
+Offline benchmark for the agent pipeline.
+
+Runs every stage against benchmarks/fakes.py (a seeded fake Gemini model and a
+stub renderer), so it needs no API key, network or manim install. Reports
+throughput and p50/p95 latency per stage, and compares against
+benchmarks/baselines/pipeline.json, exiting non-zero on a regression.
+
+    python benchmarks/pipeline.py                      # check against the baseline
+    python benchmarks/pipeline.py --update-baseline    # record new numbers
+    python benchmarks/pipeline.py --llm-latency-ms 200 --llm-error-rate 0.1 --json report.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import types
+from unittest import mock
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [REPO_ROOT, BENCH_DIR]
+
+import fakes  # noqa: E402
+import gemini_client  # noqa: E402
+import llm_cache  # noqa: E402
+import rate_limiter  # noqa: E402
+import semantic_cache  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCH_DIR, "baselines", "pipeline.json")
+
+# Allowed slowdown before a stage counts as a regression: relative, plus absolute slack
+TOLERANCE = 0.3
+SLACK_MS = 5.0
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(func, iterations):
+    timings = []
+    sink = io.StringIO()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sink):  # The agents print raw responses
+            func()
+        timings.append(time.perf_counter() - start)
+    total = sum(timings)
+    return {
+        "n": iterations,
+        "throughput_per_s": round(iterations / total, 2) if total else None,
+        "mean_ms": round(statistics.mean(timings) * 1000, 3),
+        "p50_ms": round(percentile(timings, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 0.95) * 1000, 3),
+    }
+
+
+def run(config: dict) -> dict:
+    models = []
+
+    def model_factory(name, system_instruction=None):
+        model = fakes.FakeModel(name, latency_ms=config["llm_latency_ms"], error_rate=config["llm_error_rate"],
+                                seed=config["seed"] + len(models), system_instruction=system_instruction)
+        models.append(model)
+        return model
+
+    # Measure the pipeline itself: no cached responses, no quota pacing
+    gemini_client.set_model_factory(model_factory)
+    gemini_client.reset_token_usage()
+    llm_cache.set_default_cache(llm_cache.LLMCache(":memory:", bypass=True))
+    for kind in ("topic_analysis", "visual_plan"):
+        semantic_cache.set_default_semantic_cache(kind, semantic_cache.SemanticCache(bypass=True))
+    rate_limiter.set_default_limiter(rate_limiter.RateLimiter(
+        limits={name: {"rpm": 10 ** 9, "tpm": 10 ** 12} for name in ("gemini-1.5-flash", "gemini-pro")},
+        base_delay=0.001, max_delay=0.01))
+
+    from Topic_analysis_agent import TopicAnalysisAgent
+    from visual_plan_agent import VisualPlanAgent
+    from Manim_code_agent import ManimCodeAgent
+    import debugging_agent
+    from render_cache import RenderCache
+
+    iterations = config["iterations"]
+    topic_agent, plan_agent, code_agent = TopicAnalysisAgent(), VisualPlanAgent(), ManimCodeAgent()
+    analysis = topic_agent.analyze_topic("Equality of Vectors", "Motion in a Plane", "11")
+    with contextlib.redirect_stdout(io.StringIO()):
+        plan = plan_agent.generate_plan(analysis, "Motion in a Plane", "11")
+    if analysis is None or plan is None:
+        raise RuntimeError("Fake responses no longer parse; update benchmarks/fakes.py")
+    code_reply = fakes.canned_response("Manim Code Generation Agent")
+
+    stages = {}
+    stages["analyze_topic"] = measure(
+        lambda: topic_agent.analyze_topic("Equality of Vectors", "Motion in a Plane", "11"), iterations)
+    stages["generate_plan"] = measure(
+        lambda: plan_agent.generate_plan(analysis, "Motion in a Plane", "11"), iterations)
+    stages["generate_code"] = measure(lambda: code_agent.generate_code(plan), iterations)
+    stages["_extract_code"] = measure(lambda: code_agent._extract_code(code_reply), iterations * 50)
+    stages["_passes_validation"] = measure(
+        lambda: code_agent._passes_validation(fakes.MANIM_CODE, plan), iterations * 50)
+    stages["validate_python_script"] = measure(
+        lambda: debugging_agent.validate_python_script(fakes.MANIM_CODE), iterations * 50)
+
+    # The debugging loop: Manim_code_agent.py "writes" a broken script, one repair, draft + final render
+    pool = fakes.FakeRenderPool(draft_ms=config["draft_render_ms"], final_ms=config["final_render_ms"])
+
+    def fake_subprocess_run(args, **kwargs):
+        if any(str(arg).endswith("Manim_code_agent.py") for arg in args):
+            with open(args[args.index("--output") + 1], "w") as f:
+                f.write(fakes.BROKEN_SCRIPT)
+        return types.SimpleNamespace(returncode=0)
+
+    fake_subprocess = types.SimpleNamespace(run=fake_subprocess_run,
+                                            CalledProcessError=debugging_agent.subprocess.CalledProcessError)
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir, mock.patch.object(debugging_agent, "subprocess", fake_subprocess):
+        os.chdir(workdir)
+        try:
+            counter = iter(range(10 ** 9))
+
+            def debug_loop():
+                cache = RenderCache(os.path.join(workdir, f"render_cache_{next(counter)}"))
+                script, image = debugging_agent.run_manim_code_agent(
+                    "Equality of Vectors", render_pool=pool, render_cache=cache)
+                if image is None:
+                    raise RuntimeError("run_manim_code_agent did not converge on the fake renderer")
+
+            stages["run_manim_code_agent"] = measure(debug_loop, max(1, iterations // 2))
+        finally:
+            os.chdir(previous_dir)
+
+    gemini_client.set_model_factory(None)
+    llm_cache.set_default_cache(None)
+    for kind in ("topic_analysis", "visual_plan"):
+        semantic_cache.set_default_semantic_cache(kind, None)
+    rate_limiter.set_default_limiter(None)
+    return {
+        "config": config,
+        "stages": stages,
+        "llm_calls": sum(m.calls for m in models),
+        "renders": pool.renders,
+        "token_usage": gemini_client.token_usage(),
+    }
+
+
+def compare(report: dict, baseline: dict) -> list:
+    failures = []
+    if baseline.get("config") != report["config"]:
+        print("Note: baseline was recorded with a different configuration; skipping comparison.")
+        return failures
+    for stage, result in report["stages"].items():
+        base = baseline["stages"].get(stage)
+        if not base:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            limit = base[metric] * (1 + TOLERANCE) + SLACK_MS
+            if result[metric] > limit:
+                failures.append(f"{stage} {metric} {result[metric]:.2f} ms > limit {limit:.2f} ms "
+                                f"(baseline {base[metric]:.2f} ms)")
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--llm-latency-ms", type=float, default=20.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--draft-render-ms", type=float, default=10.0)
+    parser.add_argument("--final-render-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    config = {
+        "iterations": args.iterations,
+        "llm_latency_ms": args.llm_latency_ms,
+        "llm_error_rate": args.llm_error_rate,
+        "draft_render_ms": args.draft_render_ms,
+        "final_render_ms": args.final_render_ms,
+        "seed": args.seed,
+    }
+    report = run(config)
+
+    print(f"{'stage':<24} {'n':>5} {'ops/s':>10} {'p50 ms':>10} {'p95 ms':>10}")
+    for stage, r in report["stages"].items():
+        print(f"{stage:<24} {r['n']:>5} {r['throughput_per_s']:>10} {r['p50_ms']:>10.3f} {r['p95_ms']:>10.3f}")
+    print(f"LLM calls: {report['llm_calls']}, renders: {report['renders']}")
+    for model_name, usage in sorted(report["token_usage"].items()):
+        print(f"  {model_name}: {usage['calls']} calls, {usage['prompt_tokens']} prompt tokens "
+              f"({usage['cached_tokens']} cached), {usage['response_tokens']} response tokens")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+            f.write("\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        print("No baseline recorded yet; run with --update-baseline.")
+        return 0
+    with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+        failures = compare(report, json.load(f))
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Cold-start benchmark and regression check for the agent entry points.
+
+Each module is imported in a fresh interpreter; the median import time is
+compared with benchmarks/baselines/startup.json, and the run fails if an
+import got slower than the baseline allows or pulled in a heavy dependency
+(manim, google.generativeai, pandas, ...) eagerly. Import attempts are recorded,
+so the check holds on machines where those packages aren't installed.
+
+    python benchmarks/startup.py                    # check against the baseline
+    python benchmarks/startup.py --update-baseline  # record new numbers
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(REPO_ROOT, "benchmarks", "baselines", "startup.json")
+
+MODULES = ["cli", "Topic_analysis_agent", "visual_plan_agent", "Manim_code_agent",
+           "debugging_agent", "batch_pipeline"]
+HEAVY_MODULES = ["manim", "google.generativeai", "pandas", "numpy", "cv2", "cairo"]
+
+# Allowed slowdown before the check fails: relative, plus absolute slack for noisy machines
+TOLERANCE = 0.5
+SLACK_SECONDS = 0.15
+
+_PROBE = """
+import json, sys, time
+attempted = set()
+
+class Recorder:
+    @staticmethod
+    def find_spec(name, path=None, target=None):
+        attempted.add(name.split(".")[0])
+
+sys.meta_path.insert(0, Recorder)
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m.split(".")[0] in attempted]}}))
+"""
+
+
+def measure(module: str, runs: int) -> dict:
+    timings, heavy = [], set()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                             cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        timings.append(result["seconds"])
+        heavy.update(result["heavy"])
+    return {"median_seconds": round(statistics.median(timings), 4), "heavy_modules": sorted(heavy)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = {module: measure(module, args.runs) for module in MODULES}
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({m: r["median_seconds"] for m, r in results.items()}, f, indent=4)
+            f.write("\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    failures = []
+    for module, result in results.items():
+        line = f"{module:<24} {result['median_seconds'] * 1000:8.1f} ms"
+        if module in baseline:
+            limit = baseline[module] * (1 + TOLERANCE) + SLACK_SECONDS
+            line += f"  (baseline {baseline[module] * 1000:.1f} ms, limit {limit * 1000:.1f} ms)"
+            if result["median_seconds"] > limit:
+                failures.append(f"{module} imports in {result['median_seconds']:.3f}s, limit {limit:.3f}s")
+        if result["heavy_modules"]:
+            failures.append(f"{module} eagerly imports {', '.join(result['heavy_modules'])}")
+        print(line)
+
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
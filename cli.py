@@ -0,0 +1,188 @@
+"""
+Single entry point for the agent pipeline:
+
+    python cli.py analyze --topic "Equality of Vectors" --chapter "Motion in a Plane" --grade 11
+    python cli.py plan    --topic ... --chapter ... --grade ...
+    python cli.py codegen --topic ... --chapter ... --grade ... [--fanout 4] [--output generated_manim_script.py]
+    python cli.py render  generated_manim_script.py [--scene GeneratedManimScene] [--draft]
+    python cli.py batch   topics.csv results.jsonl
+
+Global options: --trace spans.jsonl appends a span per stage (wall time, tokens,
+cache hits, retries, failure class); --metrics-port 9464 serves them as
+Prometheus metrics on /metrics while the command runs; --no-semantic-cache stops
+analyses and plans from being reused or seeded from similar earlier topics.
+
+Agents, manim and google.generativeai are imported inside each command, so
+`python cli.py --help` and any tool that imports this module start instantly.
+"""
+import argparse
+import json
+import os
+import sys
+
+
+def _add_topic_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--topic", required=True)
+    parser.add_argument("--chapter", required=True)
+    parser.add_argument("--grade", required=True)
+
+
+def _analyze(args):
+    from Topic_analysis_agent import TopicAnalysisAgent
+
+    return TopicAnalysisAgent().analyze_topic(args.topic, args.chapter, args.grade)
+
+
+def _plan(args):
+    from visual_plan_agent import VisualPlanAgent
+
+    analysis = _analyze(args)
+    if not analysis:
+        return None
+    return VisualPlanAgent().generate_plan(analysis, args.chapter, args.grade)
+
+
+def cmd_analyze(args) -> int:
+    result = _analyze(args)
+    if not result:
+        print("Analysis failed.")
+        return 1
+    print(json.dumps(result.model_dump(), indent=4))
+    return 0
+
+
+def cmd_plan(args) -> int:
+    plan = _plan(args)
+    if not plan:
+        print("Failed to generate visual plan.")
+        return 1
+    print(json.dumps(plan.model_dump(), indent=4))
+    return 0
+
+
+def cmd_codegen(args) -> int:
+    from Manim_code_agent import ManimCodeAgent
+
+    plan = _plan(args)
+    if not plan:
+        print("Failed to generate visual plan.")
+        return 1
+    agent = ManimCodeAgent()
+    if args.fanout > 1 and not args.no_render_check:
+        from render_pool import RenderPool, default_worker_count
+
+        # Candidates are kept only if they also pass a dry-run render
+        with RenderPool(workers=min(args.fanout, default_worker_count())) as pool:
+            manim_code = agent.generate_code_parallel(plan, fanout=args.fanout, render_pool=pool)
+    elif args.fanout > 1:
+        manim_code = agent.generate_code_parallel(plan, fanout=args.fanout)
+    else:
+        manim_code = agent.generate_code(plan)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(manim_code.Code)
+    print(f"Manim code saved to '{args.output}' ({manim_code.Description}).")
+    return 0
+
+
+def cmd_render(args) -> int:
+    from render_pool import DRAFT_RESOLUTION, RenderPool
+
+    with open(args.script, "r", encoding="utf-8") as f:
+        script = f.read()
+    width, height = (int(v) for v in args.resolution.split(","))
+    with RenderPool(workers=1) as pool:
+        result = pool.render(script, args.scene, output_path=args.output,
+                             resolution=DRAFT_RESOLUTION if args.draft else (width, height),
+                             script_path=args.script, dry_run=args.draft)
+    if not result.success:
+        print(result.error_log())
+        return 1
+    print(f"Rendered in {result.duration:.2f}s" + (f": {result.image_path}" if result.image_path else ""))
+    return 0
+
+
+def cmd_batch(args) -> int:
+    from batch_pipeline import DEFAULT_DEDUP_THRESHOLD, run_batch
+
+    counts = run_batch(args.input, args.output, args.analyze_concurrency, args.plan_concurrency,
+                       args.codegen_concurrency, args.codegen_fanout,
+                       dedup_threshold=None if args.no_dedup else DEFAULT_DEDUP_THRESHOLD,
+                       render_check=not args.no_render_check)
+    print(f"{counts['ok']} ok, {counts['failed']} failed")
+    return 0 if counts["failed"] == 0 else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="Textbook topic -> Manim visualization agents")
+    parser.add_argument("--trace", default=None, help="Append stage spans to this JSONL file")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Serve Prometheus metrics on this port")
+    parser.add_argument("--no-semantic-cache", action="store_true",
+                        help="Don't reuse or seed from analyses and plans of similar topics")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("analyze", help="Structured topic analysis")
+    _add_topic_args(p)
+    p.set_defaults(func=cmd_analyze)
+
+    p = sub.add_parser("plan", help="Topic analysis followed by a visual plan")
+    _add_topic_args(p)
+    p.set_defaults(func=cmd_plan)
+
+    p = sub.add_parser("codegen", help="Analysis, plan and Manim code for one topic")
+    _add_topic_args(p)
+    p.add_argument("--fanout", type=int, default=1, help="Code candidates requested in parallel")
+    p.add_argument("--output", default="generated_manim_script.py")
+    p.add_argument("--no-render-check", action="store_true",
+                   help="Don't dry-run render candidates (with --fanout; e.g. where manim isn't installed)")
+    p.set_defaults(func=cmd_codegen)
+
+    p = sub.add_parser("render", help="Render a scene script to PNG")
+    p.add_argument("script")
+    p.add_argument("--scene", default="GeneratedManimScene")
+    p.add_argument("--output", default=None, help="PNG path (default: under media/)")
+    p.add_argument("--resolution", default="3840,2160")
+    p.add_argument("--draft", action="store_true", help="Dry run only: check that the scene executes")
+    p.set_defaults(func=cmd_render)
+
+    p = sub.add_parser("batch", help="Run many topics from a CSV/JSONL file")
+    p.add_argument("input")
+    p.add_argument("output")
+    p.add_argument("--analyze-concurrency", type=int, default=None)
+    p.add_argument("--plan-concurrency", type=int, default=None)
+    p.add_argument("--codegen-concurrency", type=int, default=None)
+    p.add_argument("--codegen-fanout", type=int, default=1)
+    p.add_argument("--no-dedup", action="store_true", help="Process duplicate topics separately")
+    p.add_argument("--no-render-check", action="store_true",
+                   help="Don't dry-run render code candidates (with --codegen-fanout)")
+    p.set_defaults(func=cmd_batch)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.no_semantic_cache:
+        os.environ["SEMANTIC_CACHE_BYPASS"] = "1"
+    if args.trace or args.metrics_port:
+        import tracing
+
+        if args.trace:
+            tracing.set_default_tracer(tracing.Tracer(path=args.trace))
+        if args.metrics_port:
+            tracing.serve_metrics(args.metrics_port)
+            print(f"Serving metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+    status = args.func(args)
+    _print_token_usage()
+    return status
+
+
+def _print_token_usage() -> None:
+    """Per-model calls and tokens of this run, on stderr so stdout stays the command's output."""
+    gemini_client = sys.modules.get("gemini_client")  # Not imported: no model was used
+    usage = gemini_client.token_usage() if gemini_client else {}
+    for model_name, counts in sorted(usage.items()):
+        print(f"{model_name}: {counts['calls']} calls, {counts['prompt_tokens']} prompt tokens "
+              f"({counts['cached_tokens']} cached), {counts['response_tokens']} response tokens", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,75 @@
 import subprocess
 import os
-import google.generativeai as genai
+import sys
 import ast
-import datetime
-from dotenv import load_dotenv
+import json
+import time
+from llm_stream import code_guard, diff_guard, stream_with_reissue
+from gemini_client import get_model
+from render_pool import DRAFT_RESOLUTION, RenderResult, get_default_pool
+from render_cache import get_default_render_cache
+from manim_linter import format_findings, lint_manim_script
+from manim_autofix import stats as autofix_stats, try_autofix
+from script_patch import (PATCH_INSTRUCTIONS, PatchError, apply_unified_diff, context_lines,
+                          extract_diff, number_lines, trim_error_log)
+from tracing import annotate, fail, record, span, traced
+from workspace import JobWorkspace
 
-# Load API key
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+MANIM_CODE_AGENT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Manim_code_agent.py")
 
-# Configure Gemini AI
-genai.configure(api_key=GEMINI_API_KEY)
+def patch_manim_script(error_message, original_script, lint_notes=""):
+    """
+    Asks the LLM for a unified diff covering only the lines the error points at,
+    and applies it locally. Returns None if no usable patch comes back.
+    """
+    trimmed_log, error_lines = trim_error_log(error_message)
+    if lint_notes:  # Added after trimming, which keeps only the end of a traceback
+        trimmed_log += "\n\n" + lint_notes
+    # Without a location in the script, show all of it; the reply is still just a diff
+    shown_lines = context_lines(original_script, error_lines) if error_lines else None
+    model = get_model("gemini-pro")
+    prompt = f"""
+    I am using Manim to generate an animation, but my script has errors.
+    You MUST keep the scene class name as GeneratedManimScene.
 
-def refine_manim_script(error_message, original_script):
+    Relevant lines of generated_manim_script.py:
+    ```
+    {number_lines(original_script, shown_lines)}
+    ```
+
+    Error:
+    ```
+    {trimmed_log}
+    ```
+    {PATCH_INSTRUCTIONS}
+    """
+    response_text = stream_with_reissue(model, prompt, guard=diff_guard())
+    diff = extract_diff(response_text or "")
+    if diff is None:
+        print("LLM did not return a diff.")
+        return None
+    try:
+        patched = apply_unified_diff(original_script, diff)
+    except PatchError as e:
+        print(f"Patch did not apply: {e}")
+        return None
+    return patched if validate_python_script(patched) else None
+
+def refine_manim_script(error_message, original_script, repair_mode="patch", lint_notes=""):
     """
     Uses an LLM to refine the Manim script based on error messages.
+    repair_mode="patch" asks for a diff first and regenerates the full script only as a fallback.
+    lint_notes are non-blocking linter findings shown alongside the error.
     """
-    model = genai.GenerativeModel("gemini-pro")  
+    if repair_mode == "patch":
+        patched = patch_manim_script(error_message, original_script, lint_notes)
+        if patched is not None:
+            return patched
+        print("Falling back to full-script regeneration.")
+    error_message, _ = trim_error_log(error_message)
+    if lint_notes:
+        error_message += "\n\n" + lint_notes
+    model = get_model("gemini-pro")  
     prompt = f"""
     I am using Manim to generate an animation, but my script has errors. 
     You MUST keep the scene class name as GeneratedManimScene.
@@ -26,7 +79,7 @@ def refine_manim_script(error_message, original_script):
     {original_script}
     ```
     
-    And here is the error message from Manim:
+    And here is the error message from Manim (or from static analysis of the script):
     ```
     {error_message}
     ```
@@ -36,9 +89,10 @@ def refine_manim_script(error_message, original_script):
     2. Has proper construct() method
     3. Returns valid Python code only
     """
-    response = model.generate_content(prompt)
+    # Streamed so prose or a renamed scene class is cut off and re-issued early
+    response_text = stream_with_reissue(model, prompt, guard=code_guard("GeneratedManimScene"))
     # Add code extraction from response
-    cleaned_script = response.text.strip()
+    cleaned_script = (response_text or "").strip()
     if "```python" in cleaned_script:  # Extract code block
         cleaned_script = cleaned_script.split("```python")[1].split("```")[0]
     elif "```" in cleaned_script:
@@ -63,47 +117,152 @@ def validate_python_script(script):
         print(f"Validation Error: {e}")
         return False
 
-def run_manim_code_agent(topic, max_attempts=3):
+FINAL_RESOLUTION = (3840, 2160)  # Higher resolution for better quality
+
+
+@traced("render_attempt")
+def render_script(script, script_path, output_image, render_pool, render_cache, draft, timings, media_dir=None):
+    """
+    Renders GeneratedManimScene from the script. In draft mode a cheap dry run
+    checks that the script executes first, and the 4K frame is only rendered
+    once it does. Draft and final render times accumulate in `timings`.
+    media_dir keeps manim's intermediate files inside the job's workspace.
+    """
+    if render_cache.fetch(script, "GeneratedManimScene", FINAL_RESOLUTION, output_image):
+        print("Render cache hit.")
+        annotate(render_cache_hit=True)
+        return RenderResult(success=True, image_path=output_image)
+    annotate(render_cache_hit=False)
+
+    if draft:
+        result = render_pool.render(script, "GeneratedManimScene", resolution=DRAFT_RESOLUTION,
+                                    script_path=script_path, dry_run=True, media_dir=media_dir)
+        timings["draft_renders"] += 1
+        timings["draft_seconds"] += result.duration
+        annotate(draft_seconds=round(result.duration, 3))
+        if not result.success:
+            fail(result.error_type or "render_failed")
+            return result
+
+    result = render_pool.render(script, "GeneratedManimScene", output_path=output_image,
+                                resolution=FINAL_RESOLUTION, script_path=script_path, media_dir=media_dir)
+    timings["final_renders"] += 1
+    timings["final_seconds"] += result.duration
+    annotate(final_seconds=round(result.duration, 3))
+    if result.success:
+        render_cache.put(script, "GeneratedManimScene", FINAL_RESOLUTION, result.image_path)
+    else:
+        fail(result.error_type or "render_failed")
+    return result
+
+
+def check_render_quality(image_path, attempt):
+    """
+    Scores the rendered frame with score_manim_images.py (blank, clipped, overlapping,
+    low contrast) and saves the scores next to it. None if the scorer can't run here.
+    """
+    with span("quality_check", attempt=attempt) as check:
+        try:
+            from score_manim_images import score_image
+            quality = score_image(image_path)
+        except (ImportError, OSError, ValueError) as e:  # numpy/opencv missing, or not a readable PNG
+            print(f"Skipping quality check: {e}")
+            check.fail("skipped")
+            return None
+        quality["attempt"] = attempt
+        with open(os.path.splitext(image_path)[0] + ".score.json", "w") as f:
+            json.dump(quality, f, indent=4)
+        check.set(score=quality["score"], passed=quality["passed"], scored_ms=quality["scored_ms"])
+        if not quality["passed"]:
+            check.fail("rejected")
+        return quality
+
+
+def print_run_stats(timings):
+    print(f"Draft renders: {timings['draft_renders']} in {timings['draft_seconds']:.2f}s, "
+          f"final renders: {timings['final_renders']} in {timings['final_seconds']:.2f}s")
+    print(autofix_stats.report())
+
+
+@traced("debug_loop")
+def run_manim_code_agent(topic, max_attempts=3, render_pool=None, render_cache=None, draft=True, workspace=None):
     """
     Generates a Manim script for the given topic, runs it, and refines it if errors occur.
     Stops retrying after max_attempts to prevent infinite loops.
+    Renders go through a pool of warm manim workers (render_pool.RenderPool),
+    and scripts that were rendered before are served from the render cache.
+    With draft=True repair iterations use dry runs and 4K is rendered once at the end.
+    Scripts, logs and images of the run live in their own JobWorkspace, so several
+    topics can be processed at once. A render still rejected by the quality check on
+    the last attempt is returned, but its job finishes with status "quality_failed".
     """
+    render_pool = render_pool or get_default_pool()
+    render_cache = render_cache or get_default_render_cache()
+    workspace = workspace or JobWorkspace(topic=topic)
+    annotate(job_id=workspace.job_id)
+    print(f"Job {workspace.job_id}: {workspace.path}")
+    timings = {"draft_renders": 0, "draft_seconds": 0.0, "final_renders": 0, "final_seconds": 0.0}
     try:
-        # Step 1: Generate the initial script using Manim_code_agent.py
-        subprocess.run(["python", "Manim_code_agent.py", topic], check=True)
+        # Step 1: Generate the initial script into the job's workspace using Manim_code_agent.py
+        subprocess.run([sys.executable, MANIM_CODE_AGENT, topic, "--output", workspace.script_path], check=True)
 
-        # Step 2: Define path for generated script
-        script_path = "generated_manim_script.py"
+        # Step 2: Keep the generated script as the job's first version
+        script_path = workspace.write_script(workspace.read_script(), attempt=0, source="codegen")
 
         attempt = 0
         while attempt < max_attempts:
             print(f"Attempt {attempt + 1} of {max_attempts}")
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            
-            # Create required directories if they don't exist
-            os.makedirs("error_logs", exist_ok=True)
-            os.makedirs("media/images/generated_manim_script", exist_ok=True)
-            
-            output_image = f"media/images/generated_manim_script/output_attempt_{attempt+1}_{timestamp}.png"
-            error_log = f"error_logs/manim_error_{timestamp}.log"
-
-            # Step 3: Run Manim and capture errors in a log file
+            # Numbered per attempt inside the workspace, so names never collide across jobs
+            output_image = workspace.image_path(attempt + 1)
+            error_log = workspace.log_path(attempt + 1)
+
+            # Step 3: Render on a warm worker (unless cached) and capture errors in a log file
+            with open(script_path, "r") as f:
+                script = f.read()
+            # Pre-flight lint catches common mistakes without paying for a render. Only certain
+            # findings block it; heuristic ones go into the repair prompt if the render fails
+            findings = lint_manim_script(script)
+            lint_notes = ""
+            if any(f.blocking for f in findings):
+                print(f"Pre-flight check found {len(findings)} problem(s), skipping render.")
+                record(lint_rejections=1)
+                result = RenderResult(success=False, error_type="LintError", error_message=format_findings(findings))
+            else:
+                if findings:
+                    print(f"Pre-flight check flagged {len(findings)} possible problem(s), rendering anyway.")
+                    lint_notes = format_findings(findings)
+                result = render_script(script, script_path, output_image, render_pool, render_cache, draft, timings,
+                                       workspace.media_dir)
+            quality = None
+            if result.success:
+                # Quality gate: a frame that rendered but is unusable goes back for refinement
+                quality = check_render_quality(output_image, attempt + 1)
+                if quality and not quality["passed"]:
+                    print(f"Render rejected by the quality check (score {quality['score']}).")
+                    if attempt + 1 < max_attempts:
+                        result = RenderResult(success=False, error_type="QualityError", error_message=(
+                            "The scene renders, but the final frame has layout problems:\n- "
+                            + "\n- ".join(quality["issues"])))
             with open(error_log, "w") as error_file:
-                result = subprocess.run([
-                    "manim",
-                    "-r", "3840,2160",  # Higher resolution for better quality
-                    script_path,
-                    "GeneratedManimScene",
-                    "-s",
-                    "--format=png",
-                    "-o", output_image
-                ], stderr=error_file, text=True)
+                error_file.write(result.error_log())
+            workspace.record("log", error_log, attempt=attempt + 1, success=result.success,
+                             error_type=result.error_type)
 
             # Check if Manim executed successfully
-            if result.returncode == 0:
+            if result.success:
+                print_run_stats(timings)
+                annotate(attempts=attempt + 1)
+                workspace.record("image", output_image, attempt=attempt + 1)
+                if quality and not quality["passed"]:
+                    # Out of attempts: keep the frame, but don't report it as a clean success
+                    print(f"Out of attempts; keeping the rejected render at {output_image}")
+                    annotate(quality_score=quality["score"])
+                    fail("quality_failed")
+                    workspace.finish(status="quality_failed", attempts=attempt + 1, image=output_image,
+                                     score=quality["score"], issues=quality["issues"])
+                    return script_path, output_image
                 print(f"Manim script executed successfully! Output saved at {output_image}")
-                # Add scoring after successful generation
-                subprocess.run(["python", "score_manim_images.py", output_image, str(attempt+1)])
+                workspace.finish(status="ok", attempts=attempt + 1, image=output_image)
                 return script_path, output_image
 
             print(f"Error detected. Logs saved at {error_log}, refining script...")
@@ -114,33 +273,71 @@ def run_manim_code_agent(topic, max_attempts=3):
             with open(error_log, "r") as f:
                 error_message = f.read()
 
-            # Step 4: Get refined script from LLM
-            refined_script = refine_manim_script(error_message, original_script)
+            with span("refinement", attempt=attempt + 1, error_type=result.error_type) as refinement:
+                # Step 4: Try a deterministic local fix first, fall back to the LLM
+                fix = try_autofix(original_script, error_message)
+                if fix:
+                    print(f"Auto-fix [{fix.rule}]: {fix.description}")
+                    method = "autofix"
+                    refinement.set(method=method, rule=fix.rule)
+                    record(autofix_repairs=1)
+                    refined_script = fix.script
+                else:
+                    method = "llm"
+                    refinement.set(method=method)
+                    record(llm_repairs=1)
+                    llm_start = time.perf_counter()
+                    refined_script = refine_manim_script(error_message, original_script, lint_notes=lint_notes)
+                    autofix_stats.record_llm_call(time.perf_counter() - llm_start)
 
-            # Step 5: Validate refined script before writing
-            if refined_script.strip() == original_script.strip():
-                print("LLM made no changes to the script. Stopping to prevent infinite loop.")
-                break
+                # Step 5: Validate refined script before writing
+                if refined_script.strip() == original_script.strip():
+                    print("LLM made no changes to the script. Stopping to prevent infinite loop.")
+                    refinement.fail("no_change")
+                    break
 
-            if not validate_python_script(refined_script):
-                print("Refined script has syntax errors. Stopping refinement process.")
-                break
+                if not validate_python_script(refined_script):
+                    print("Refined script has syntax errors. Stopping refinement process.")
+                    refinement.fail("invalid_script")
+                    break
 
-            # Step 6: Save the refined script
-            with open(script_path, "w") as f:
-                f.write(refined_script)
+            # Step 6: Save the refined script (earlier versions stay in the workspace)
+            workspace.write_script(refined_script, attempt=attempt + 1, source=method)
 
             attempt += 1
 
         print("Max attempts reached. Manual debugging required.")
+        fail("max_attempts")
+        print_run_stats(timings)
+        workspace.finish(status="failed", attempts=attempt, error="max_attempts")
         return None, None
 
     except subprocess.CalledProcessError as e:
         print(f"Manim command failed: {e.stderr}")
+        fail("codegen_subprocess")
+        workspace.finish(status="failed", error="codegen_subprocess")
         return None, None
     except Exception as e:
         print(f"Unexpected error: {e}")
+        fail(type(e).__name__)
+        workspace.finish(status="failed", error=type(e).__name__)
         return None, None
 
 # Example usage
-run_manim_code_agent("Pythagorean Theorem")
+if __name__ == "__main__":
+    import argparse
+    import concurrent.futures
+    import contextvars
+
+    parser = argparse.ArgumentParser(description="Generate, render and repair Manim scenes, one workspace per topic")
+    parser.add_argument("topics", nargs="*", default=["Pythagorean Theorem"])
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--parallel", type=int, default=1, help="Topics processed at once")
+    args = parser.parse_args()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.parallel)) as executor:
+        futures = {executor.submit(contextvars.copy_context().run, run_manim_code_agent, topic,
+                                   args.max_attempts): topic for topic in args.topics}
+        for future in concurrent.futures.as_completed(futures):
+            script_path, output_image = future.result()
+            print(f"{futures[future]}: {output_image or 'failed'}")
@@ -0,0 +1,186 @@
+"""
+Exact and near-duplicate detection for content that is about to be sent to the LLM.
+
+Texts are grouped first by an exact hash of their normalized form, then by
+MinHash/LSH over character shingles: candidate pairs that share an LSH band are
+kept if their estimated Jaccard similarity reaches the threshold. Only one
+representative per group needs an LLM call; fan_out() copies its output back to
+every member. Shingling, MinHash and banding are vectorized with NumPy.
+
+Optional `partitions` (e.g. grade and chapter for topics) keep texts from
+different partitions apart however similar they are. Short texts such as topic
+titles are only near duplicates if they have the same set of words: at character
+level "Laws of Motion I" and "Laws of Motion II" are over 0.9 similar, but they
+are different topics.
+"""
+import hashlib
+import re
+from typing import Dict, Hashable, List, Optional, Sequence, TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+
+DEFAULT_THRESHOLD = 0.85
+DEFAULT_NUM_PERM = 128
+DEFAULT_BANDS = 16  # 16 bands x 8 rows: pairs above ~0.7 similarity almost always collide
+DEFAULT_SHINGLE = 5
+SHORT_TEXT_WORDS = 16  # Below this, near duplicates must also have the same words
+_PRIME = np.uint64((1 << 31) - 1)  # a * h stays below 2**62, so uint64 never overflows
+_BASE = 257
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", (text or "").lower()).strip()
+
+
+def words(text: str) -> List[str]:
+    return re.findall(r"\w+", normalize(text))
+
+
+def token_set(text: str) -> frozenset:
+    return frozenset(words(text))
+
+
+def exact_key(text: str, partition: Hashable = None) -> str:
+    return hashlib.sha256(repr((partition, normalize(text))).encode("utf-8")).hexdigest()
+
+
+def shingle_hashes(text: str, k: int = DEFAULT_SHINGLE) -> np.ndarray:
+    """Distinct hashes of the k-byte shingles of the normalized text."""
+    data = np.frombuffer(normalize(text).encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+    if len(data) < k:
+        data = np.concatenate([data, np.zeros(k - len(data), dtype=np.uint64)])
+    windows = np.lib.stride_tricks.sliding_window_view(data, k)
+    powers = np.uint64(_BASE) ** np.arange(k - 1, -1, -1, dtype=np.uint64)
+    return np.unique((windows * powers).sum(axis=1) % _PRIME)
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+
+    def signature(self, hashes: np.ndarray, chunk: int = 4096) -> np.ndarray:
+        """Minimum of each of num_perm universal hash functions over the shingle set."""
+        sig = np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        for start in range(0, len(hashes), chunk):
+            h = hashes[start:start + chunk]
+            values = (self.a[:, None] * h[None, :] + self.b[:, None]) % _PRIME
+            sig = np.minimum(sig, values.min(axis=1))
+        return sig
+
+    def signatures(self, texts: Sequence[str], k: int = DEFAULT_SHINGLE) -> np.ndarray:
+        return np.stack([self.signature(shingle_hashes(t, k)) for t in texts]) if len(texts) else \
+            np.empty((0, self.num_perm), dtype=np.uint64)
+
+
+class DedupResult:
+    """group[i] is the index of the representative whose output item i reuses."""
+
+    def __init__(self, group: List[int], exact_duplicates: int, near_duplicates: int):
+        self.group = group
+        self.exact_duplicates = exact_duplicates
+        self.near_duplicates = near_duplicates
+
+    @property
+    def representatives(self) -> List[int]:
+        return [i for i, rep in enumerate(self.group) if i == rep]
+
+    def members(self) -> Dict[int, List[int]]:
+        out: Dict[int, List[int]] = {}
+        for i, rep in enumerate(self.group):
+            out.setdefault(rep, []).append(i)
+        return out
+
+    def fan_out(self, outputs: Dict[int, T]) -> List[Optional[T]]:
+        """Per-item outputs from outputs keyed by representative index (None if it has none)."""
+        return [outputs.get(rep) for rep in self.group]
+
+    def stats(self) -> dict:
+        return {"items": len(self.group), "unique": len(self.representatives),
+                "exact_duplicates": self.exact_duplicates, "near_duplicates": self.near_duplicates}
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def deduplicate(texts: Sequence[str], threshold: float = DEFAULT_THRESHOLD, partitions: Optional[Sequence] = None,
+                num_perm: int = DEFAULT_NUM_PERM, bands: int = DEFAULT_BANDS, k: int = DEFAULT_SHINGLE,
+                seed: int = 1) -> DedupResult:
+    """
+    Group texts that are identical after normalization, or whose estimated Jaccard
+    similarity is at least `threshold` (threshold >= 1 disables near-duplicate matching).
+    The earliest text of each group is its representative.
+    """
+    n = len(texts)
+    partitions = list(partitions) if partitions is not None else [None] * n
+    group = list(range(n))
+
+    # 1. Exact duplicates
+    first_by_key: Dict[str, int] = {}
+    for i, text in enumerate(texts):
+        group[i] = first_by_key.setdefault(exact_key(text, partitions[i]), i)
+    exact = sum(1 for i in range(n) if group[i] != i)
+    unique = [i for i in range(n) if group[i] == i]
+    if threshold >= 1 or len(unique) < 2:
+        return DedupResult(group, exact, 0)
+
+    # 2. MinHash signatures of the exact-unique texts, banded for LSH
+    if num_perm % bands:
+        raise ValueError("num_perm must be a multiple of bands")
+    sig = MinHasher(num_perm, seed).signatures([texts[i] for i in unique], k)
+    rows = num_perm // bands
+    multipliers = np.random.default_rng(seed + 1).integers(1, 1 << 62, size=rows, dtype=np.uint64)
+    band_keys = (sig.reshape(len(unique), bands, rows) * multipliers).sum(axis=2)  # Wraps mod 2**64
+    part_ids = np.unique(np.array([repr(p) for p in (partitions[i] for i in unique)]), return_inverse=True)[1]
+    band_keys ^= (part_ids.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15))[:, None]
+
+    # 3. Candidate pairs: every text paired with the first text of each band bucket it falls in
+    left, right = [], []
+    for b in range(bands):
+        order = np.argsort(band_keys[:, b], kind="stable")
+        keys = band_keys[order, b]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        heads = np.repeat(order[starts], np.diff(np.r_[starts, len(order)]))
+        mask = heads != order
+        left.append(heads[mask])
+        right.append(order[mask])
+    if not any(len(x) for x in left):
+        return DedupResult(group, exact, 0)
+    pairs = np.unique(np.stack([np.concatenate(left), np.concatenate(right)], axis=1), axis=0)
+    similarity = (sig[pairs[:, 0]] == sig[pairs[:, 1]]).mean(axis=1)
+    pairs = pairs[(similarity >= threshold) & (part_ids[pairs[:, 0]] == part_ids[pairs[:, 1]])]
+    tokens = [token_set(texts[i]) for i in unique]
+    lengths = [len(words(texts[i])) for i in unique]
+
+    def same_words(a: int, b: int) -> bool:
+        # Length counts every word, so repetitive long texts aren't treated as short
+        short = min(lengths[a], lengths[b]) < SHORT_TEXT_WORDS
+        return not short or tokens[a] == tokens[b]
+
+    # 4. Union the verified pairs; keep a member only if it is itself close to its representative
+    parent = list(range(len(unique)))
+    for a, b in pairs.tolist():
+        if not same_words(a, b):
+            continue
+        ra, rb = _find(parent, a), _find(parent, b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    roots = np.array([_find(parent, i) for i in range(len(unique))])
+    close = (sig == sig[roots]).mean(axis=1) >= threshold
+    near = 0
+    for i, root in enumerate(roots.tolist()):
+        if root != i and close[i] and same_words(i, root):
+            group[unique[i]] = unique[root]
+            near += 1
+    for i in range(n):  # Exact copies follow their original
+        group[i] = group[group[i]]
+    return DedupResult(group, exact, near)
+
@@ -0,0 +1,40 @@
+"""
+Advisory inter-process lock on a lock file, for caches that several processes
+(batch workers, CLI runs) read and rewrite at once.
+
+    with file_lock(manifest_path + ".lock"):
+        entries = load(); entries.update(mine); save(entries)
+
+Locks are per open file, so threads of one process also exclude each other.
+"""
+import contextlib
+import os
+
+
+@contextlib.contextmanager
+def file_lock(path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # Gives up after ~10s; keep waiting
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
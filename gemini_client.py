@@ -0,0 +1,147 @@
+"""
+Shared Gemini clients.
+
+get_model() returns one pooled GenerativeModel per (model, system instruction),
+so agents and repair loops stop constructing a client per call. Static prompts
+(agent system prompts, few-shot examples, extraction instructions) go in as the
+system instruction instead of being concatenated onto every request. If an
+instruction is long enough for the provider's context caching
+(GEMINI_CONTEXT_CACHE_MIN_TOKENS), it is uploaded once as cached content and
+the model is built on that, so later requests only bill the new tokens at the
+full rate.
+
+record_tokens()/token_usage() keep a per-model ledger of prompt, cached and
+response tokens next to the per-stage counters in tracing.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+_configured = False
+_env_loaded = False
+_lock = threading.Lock()
+# Replaces GenerativeModel construction, e.g. with an offline fake for benchmarks
+_model_factory = None
+
+# Gemini 1.5 only caches contexts of at least 32k tokens; override for models with a lower minimum
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", 32768))
+CONTEXT_CACHE_TTL = float(os.getenv("GEMINI_CONTEXT_CACHE_TTL", 3600))
+
+_pool: Dict[Tuple[str, Optional[str]], Tuple[object, Optional[float]]] = {}  # -> (model, expires_at)
+_usage: Dict[str, Dict[str, int]] = {}
+_usage_lock = threading.Lock()
+
+
+def load_env() -> None:
+    """Load .env into os.environ once; settings read after this (cache paths, limits) see it."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    try:
+        from dotenv import load_dotenv
+    except ImportError:  # Without python-dotenv only the real environment applies
+        return
+    load_dotenv()
+    _env_loaded = True
+
+
+def configure():
+    """
+    Load .env and configure google.generativeai once per process.
+    The SDK is imported here, on first use, so importing an agent stays cheap.
+    """
+    global _configured
+    with _lock:
+        import google.generativeai as genai
+        if not _configured:
+            load_env()
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            _configured = True
+        return genai
+
+
+def set_model_factory(factory) -> None:
+    """Build models with factory(model_name, system_instruction=...) instead of the Gemini SDK (None to reset)."""
+    global _model_factory
+    with _lock:
+        _model_factory = factory
+        _pool.clear()
+
+
+def _context_cached_model(genai, model_name: str, system_instruction: str):
+    """A model whose system instruction lives in provider-side cached content; None if that isn't possible."""
+    import datetime
+
+    try:
+        cached = genai.caching.CachedContent.create(
+            model=model_name if model_name.startswith("models/") else f"models/{model_name}",
+            system_instruction=system_instruction, ttl=datetime.timedelta(seconds=CONTEXT_CACHE_TTL))
+        return genai.GenerativeModel.from_cached_content(cached)
+    except Exception as e:  # Model without caching support, quota, old SDK: send the instruction inline
+        print(f"Context caching unavailable for {model_name}: {e}")
+        return None
+
+
+def _build_model(model_name: str, system_instruction: Optional[str]) -> Tuple[object, Optional[float]]:
+    from rate_limiter import estimate_tokens
+
+    if _model_factory is not None:
+        return _model_factory(model_name, system_instruction=system_instruction), None
+    genai = configure()
+    instruction_tokens = estimate_tokens(system_instruction) if system_instruction else 0
+    if instruction_tokens >= CONTEXT_CACHE_MIN_TOKENS:
+        model = _context_cached_model(genai, model_name, system_instruction)
+        if model is not None:
+            model._instruction_text = system_instruction
+            model._context_cached_tokens = instruction_tokens
+            # Rebuilt a minute early so no request reaches an expired cache
+            return model, time.time() + CONTEXT_CACHE_TTL - 60
+    if system_instruction:
+        model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+        model._instruction_text = system_instruction
+    else:
+        model = genai.GenerativeModel(model_name)
+    return model, None
+
+
+def get_model(model_name: str, system_instruction: Optional[str] = None):
+    """The pooled GenerativeModel for model_name and system_instruction, created on first use."""
+    key = (model_name, system_instruction)
+    with _lock:
+        entry = _pool.get(key)
+        if entry is not None and (entry[1] is None or entry[1] > time.time()):
+            return entry[0]
+    model, expires_at = _build_model(model_name, system_instruction)
+    with _lock:
+        entry = _pool.get(key)
+        if entry is not None and (entry[1] is None or entry[1] > time.time()):
+            return entry[0]  # Another thread built it meanwhile
+        _pool[key] = (model, expires_at)
+        return model
+
+
+def context_cached_tokens(model) -> int:
+    """Tokens of the model's system instruction served from provider-side cached content."""
+    return getattr(model, "_context_cached_tokens", 0)
+
+
+def record_tokens(model_name: str, prompt_tokens: int, response_tokens: int, cached_tokens: int = 0) -> None:
+    with _usage_lock:
+        usage = _usage.setdefault(model_name, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0,
+                                               "response_tokens": 0})
+        usage["calls"] += 1
+        usage["prompt_tokens"] += prompt_tokens
+        usage["cached_tokens"] += cached_tokens
+        usage["response_tokens"] += response_tokens
+
+
+def token_usage() -> Dict[str, Dict[str, int]]:
+    """Calls and tokens per model since the process started (or reset_token_usage())."""
+    with _usage_lock:
+        return {name: dict(usage) for name, usage in _usage.items()}
+
+
+def reset_token_usage() -> None:
+    with _usage_lock:
+        _usage.clear()
@@ -0,0 +1,229 @@
+import json
+from typing import Any, Iterable, List, Optional, Tuple, Type, TypeVar, get_args
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+M = TypeVar("M", bound=BaseModel)
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class JSONStreamScanner:
+    """
+    Incremental, tolerant scanner for JSON embedded in LLM output.
+
+    Feed it text as it arrives; it skips prose and ``` fences, drops // and /* */
+    comments and trailing commas, escapes raw newlines inside strings, and returns
+    each top-level object/array as soon as it closes. partial() repairs the value
+    still being streamed (closing open strings and brackets) so callers can look
+    at it before generation ends; finish() does the same for truncated output.
+    """
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self._reset_value()
+
+    def _reset_value(self) -> None:
+        self._buf: List[str] = []
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._comment: Optional[str] = None  # "line" or "block"
+        self._slash = False
+        self._star = False
+        # (buffer length, stack) at each comma, used to cut back a truncated tail
+        self._marks: List[Tuple[int, Tuple[str, ...]]] = []
+
+    def _drop_trailing_comma(self) -> None:
+        i = len(self._buf) - 1
+        while i >= 0 and self._buf[i].isspace():
+            i -= 1
+        if i >= 0 and self._buf[i] == ",":
+            del self._buf[i]
+            if self._marks and self._marks[-1][0] == i:
+                self._marks.pop()
+
+    def _complete(self) -> None:
+        text = "".join(self._buf)
+        self._reset_value()
+        try:
+            self.values.append(json.loads(text))
+        except json.JSONDecodeError:
+            pass  # Bracketed prose such as "[1]" or "{see above}" is not a value
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Consume more text; returns the values completed by this chunk."""
+        before = len(self.values)
+        for ch in chunk:
+            self._step(ch)
+        return self.values[before:]
+
+    def _step(self, ch: str) -> None:
+        if not self._stack:
+            if ch in _CLOSERS:
+                self._stack.append(ch)
+                self._buf.append(ch)
+            return
+
+        if self._comment == "line":
+            if ch == "\n":
+                self._comment = None
+            return
+        if self._comment == "block":
+            if self._star and ch == "/":
+                self._comment = None
+            self._star = ch == "*"
+            return
+
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+                self._buf.append(ch)
+            elif ch == "\\":
+                self._escape = True
+                self._buf.append(ch)
+            elif ch == '"':
+                self._in_string = False
+                self._buf.append(ch)
+            elif ch == "\n":
+                self._buf.append("\\n")
+            elif ch < " ":
+                self._buf.append(f"\\u{ord(ch):04x}")
+            else:
+                self._buf.append(ch)
+            return
+
+        if self._slash:
+            self._slash = False
+            if ch == "/":
+                self._comment = "line"
+                return
+            if ch == "*":
+                self._comment = "block"
+                self._star = False
+                return
+        if ch == "/":
+            self._slash = True
+        elif ch == '"':
+            self._in_string = True
+            self._buf.append(ch)
+        elif ch in _CLOSERS:
+            self._stack.append(ch)
+            self._buf.append(ch)
+        elif ch in "}]":
+            self._drop_trailing_comma()
+            self._stack.pop()
+            self._buf.append(ch)
+            if not self._stack:
+                self._complete()
+        elif ch == ",":
+            self._marks.append((len(self._buf), tuple(self._stack)))
+            self._buf.append(ch)
+        elif ch == "`":
+            pass  # Stray fence characters
+        else:
+            self._buf.append(ch)
+
+    def partial(self) -> Optional[Any]:
+        """Best-effort parse of the value currently being streamed, or None."""
+        if not self._stack:
+            return None
+        return _repair("".join(self._buf), self._in_string, list(self._stack), list(self._marks))
+
+    def finish(self) -> List[Any]:
+        """All complete values plus a repaired version of a truncated trailing value."""
+        tail = self.partial()
+        if tail is not None:
+            self.values.append(tail)
+        self._reset_value()
+        return self.values
+
+
+def _close(text: str, stack: List[str]) -> str:
+    text = text.rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    elif text.endswith(":"):
+        text += " null"
+    return text + "".join(_CLOSERS[opener] for opener in reversed(stack))
+
+
+def _repair(text: str, in_string: bool, stack: List[str], marks) -> Optional[Any]:
+    if in_string:
+        if text.endswith("\\"):
+            text = text[:-1]
+        text += '"'
+    candidates = [(text, stack)]
+    # Cut back to earlier commas until what remains parses
+    candidates += [(text[:pos], list(mark_stack)) for pos, mark_stack in reversed(marks)]
+    for candidate, candidate_stack in candidates:
+        try:
+            return json.loads(_close(candidate, candidate_stack))
+        except json.JSONDecodeError:
+            continue
+    # Nothing after the opening bracket survived
+    return {} if stack and stack[0] == "{" else [] if stack else None
+
+
+def extract_all_json(text: str) -> List[Any]:
+    """Every JSON object/array in the text, repairing a truncated last one."""
+    scanner = JSONStreamScanner()
+    scanner.feed(text)
+    return scanner.finish()
+
+
+def extract_json(text: str, expect: Tuple[type, ...] = (dict, list)) -> Optional[Any]:
+    """The first JSON value of the expected type(s) in the text, or None."""
+    for value in extract_all_json(text):
+        if isinstance(value, expect):
+            return value
+    return None
+
+
+def validate_into(values: Iterable[Any], model: Type[M]) -> Optional[M]:
+    """First value that validates into the pydantic model."""
+    for value in values:
+        if isinstance(value, list) and len(value) == 1:
+            value = value[0]
+        if not isinstance(value, dict):
+            continue
+        try:
+            return model.model_validate(value)
+        except ValidationError:
+            continue
+    return None
+
+
+def parse_model(text: str, model: Type[M]) -> Optional[M]:
+    """Extract JSON from an LLM response and validate it into the model."""
+    return validate_into(extract_all_json(text), model)
+
+
+def validate_partial(data: Any, model: Type[M]) -> dict:
+    """
+    Fields of a (possibly truncated) object that already validate against the model.
+    For list fields, the valid prefix of items is kept, so a half-streamed last item
+    doesn't discard the ones before it.
+    """
+    if not isinstance(data, dict):
+        return {}
+    fields = {}
+    for name, field in model.model_fields.items():
+        if name not in data:
+            continue
+        adapter = TypeAdapter(field.annotation)
+        try:
+            fields[name] = adapter.validate_python(data[name])
+            continue
+        except ValidationError:
+            pass
+        if isinstance(data[name], list) and get_args(field.annotation):
+            item_adapter = TypeAdapter(get_args(field.annotation)[0])
+            items = []
+            for item in data[name]:
+                try:
+                    items.append(item_adapter.validate_python(item))
+                except ValidationError:
+                    break
+            fields[name] = items
+    return fields
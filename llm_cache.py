@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+import tracing
+from gemini_client import context_cached_tokens, load_env, record_tokens
+from rate_limiter import (estimate_tokens, limited_generate_content, model_name_of, request_tokens,
+                          system_instruction_of)
+
+# Defaults; LLM_CACHE_PATH, LLM_CACHE_TTL and LLM_CACHE_MAX_BYTES in the environment or .env
+# override them for the default cache (read in get_default_cache, after .env is loaded)
+DEFAULT_CACHE_PATH = ".cache/llm_cache.sqlite3"
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600.0
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def _bypass_from_env() -> bool:
+    return os.getenv("LLM_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+
+
+def _settings_of(model) -> Any:
+    # Settings baked into the model object also change the output
+    settings = {}
+    for attr in ("_generation_config", "_safety_settings"):
+        value = getattr(model, attr, None)
+        if value:
+            settings[attr.lstrip("_")] = value
+    # Read as text: a model built from context-cached content has no _system_instruction
+    instruction = system_instruction_of(model)
+    if instruction:
+        settings["system_instruction"] = instruction
+    return settings
+
+
+class LLMCache:
+    """Content-addressed SQLite cache for LLM responses with TTL and LRU eviction."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: Optional[float] = DEFAULT_TTL_SECONDS,
+                 max_bytes: Optional[int] = DEFAULT_MAX_BYTES, bypass: Optional[bool] = None):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bypass = _bypass_from_env() if bypass is None else bypass
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name: str, prompt: Any, settings: Any = None) -> str:
+        """Hash the model name, full prompt and generation settings."""
+        payload = json.dumps(
+            {"model": model_name, "prompt": prompt, "settings": settings or {}},
+            sort_keys=True, default=str, ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if self.bypass:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str, model_name: str = "") -> None:
+        if self.bypass:
+            return
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, value, size, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop expired rows, then least recently used rows until under max_bytes."""
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+        if self.max_bytes is None:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": total,
+            "bypass": self.bypass,
+        }
+
+
+_default_cache: Optional[LLMCache] = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache() -> LLMCache:
+    """Process-wide cache shared by every agent."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            load_env()
+            _default_cache = LLMCache(os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+                                      ttl=float(os.getenv("LLM_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+                                      max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)))
+        return _default_cache
+
+
+def request_key(model, prompt, generation_config=None) -> str:
+    """Cache key for a generate_content request."""
+    settings = {"generation_config": generation_config, **_settings_of(model)}
+    return LLMCache.make_key(model_name_of(model), prompt, settings)
+
+
+def set_default_cache(cache: Optional[LLMCache]) -> None:
+    """Replace the process-wide cache (None to recreate it from the environment on next use)."""
+    global _default_cache
+    with _default_lock:
+        _default_cache = cache
+
+
+def _response_text(response) -> Optional[str]:
+    if not response.candidates:
+        return None
+    return response.candidates[0].content.parts[0].text
+
+
+def record_usage(prompt, text: Optional[str], usage=None, model=None) -> None:
+    """
+    Count one model call and its tokens on the current span and in the per-model
+    ledger. Without usage_metadata the counts are estimated, system instruction included.
+    """
+    prompt_tokens = getattr(usage, "prompt_token_count", None) or \
+        (request_tokens(model, prompt) if model is not None else estimate_tokens(prompt))
+    response_tokens = getattr(usage, "candidates_token_count", None) or (estimate_tokens(text) if text else 0)
+    cached_tokens = getattr(usage, "cached_content_token_count", None) or \
+        (context_cached_tokens(model) if usage is None else 0)
+    tracing.record(llm_calls=1, prompt_tokens=prompt_tokens, response_tokens=response_tokens,
+                   **({"cached_prompt_tokens": cached_tokens} if cached_tokens else {}))
+    record_tokens(model_name_of(model) if model is not None else "unknown", prompt_tokens, response_tokens,
+                  cached_tokens)
+
+
+def cached_generate_content(model, prompt, generation_config=None,
+                            cache: Optional[LLMCache] = None, bypass: bool = False) -> Optional[str]:
+    """
+    Drop-in for model.generate_content(prompt) that returns the response text,
+    served from the shared cache when the same (model, prompt, settings) was seen before.
+    Returns None when the model produced no candidates (nothing is cached then).
+    """
+    cache = cache or get_default_cache()
+    name = model_name_of(model)
+    key = request_key(model, prompt, generation_config)
+
+    if not bypass:
+        cached = cache.get(key)
+        if cached is not None:
+            tracing.record(cache_hits=1)
+            return cached
+        tracing.record(cache_misses=1)
+
+    if generation_config is not None:
+        response = limited_generate_content(model, prompt, generation_config=generation_config)
+    else:
+        response = limited_generate_content(model, prompt)
+    text = _response_text(response)
+    record_usage(prompt, text, getattr(response, "usage_metadata", None), model)
+    if text is not None and not bypass:
+        cache.set(key, text, name)
+    return text
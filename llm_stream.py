@@ -0,0 +1,148 @@
+import re
+from typing import Callable, Optional
+
+import tracing
+from llm_cache import LLMCache, get_default_cache, record_usage, request_key
+from rate_limiter import get_default_limiter, model_name_of, request_tokens
+
+# A guard looks at the text received so far and returns a reason to abort, or None
+Guard = Callable[[str], Optional[str]]
+
+PROSE_LIMIT = 400  # characters of leading prose tolerated before the expected output starts
+DEFAULT_REISSUES = 2
+CANCELLED = "cancelled"  # Abort reason of a cancelled request, which is never re-issued
+
+
+class StreamAborted(Exception):
+    def __init__(self, reason: str, partial_text: str):
+        super().__init__(reason)
+        self.reason = reason
+        self.partial_text = partial_text
+
+
+def code_guard(expected_class: Optional[str] = None) -> Guard:
+    """Abort when the reply is prose instead of code, or names the wrong scene class."""
+    def check(text: str) -> Optional[str]:
+        start = re.search(r"```(?:python)?\s*\n|^from manim import|^import ", text, re.MULTILINE)
+        if start is None:
+            return "no code block" if len(text) > PROSE_LIMIT else None
+        if expected_class:
+            for name in re.findall(r"^\s*class (\w+)\s*\(\s*\w*Scene\s*\)", text[start.start():], re.MULTILINE):
+                if name != expected_class:
+                    return f"wrong scene class {name}"
+        return None
+    return check
+
+
+def diff_guard() -> Guard:
+    """Abort when a reply that should be a unified diff starts regenerating the script."""
+    def check(text: str) -> Optional[str]:
+        if re.search(r"^@@ ", text, re.MULTILINE):
+            return None
+        if re.search(r"```python|^from manim import|^class \w+", text, re.MULTILINE):
+            return "full script instead of a diff"
+        return "no diff" if len(text) > PROSE_LIMIT else None
+    return check
+
+
+def json_guard() -> Guard:
+    """Abort when no JSON value has started after a paragraph of prose."""
+    def check(text: str) -> Optional[str]:
+        if "{" in text or "[" in text:
+            return None
+        return "no JSON in response" if len(text) > PROSE_LIMIT else None
+    return check
+
+
+def cancellable(guard: Optional[Guard], cancel) -> Optional[Guard]:
+    """guard that also aborts as soon as cancel (a threading.Event) is set."""
+    if cancel is None:
+        return guard
+
+    def check(text: str) -> Optional[str]:
+        if cancel.is_set():
+            return CANCELLED
+        return guard(text) if guard else None
+    return check
+
+
+def _chunk_text(chunk) -> str:
+    try:
+        return chunk.text
+    except (ValueError, AttributeError, IndexError):  # Chunks without candidates (e.g. safety stops)
+        return ""
+
+
+def stream_generate_content(model, prompt, guard: Optional[Guard] = None,
+                            on_chunk: Optional[Callable[[str], None]] = None,
+                            generation_config=None, cache: Optional[LLMCache] = None) -> str:
+    """
+    Streams a response, calling on_chunk(text_so_far) as it arrives and guard(text_so_far)
+    after every chunk. Raises StreamAborted as soon as the guard objects.
+    Complete responses are cached exactly like cached_generate_content.
+    """
+    cache = cache or get_default_cache()
+    name = model_name_of(model)
+    key = request_key(model, prompt, generation_config)
+    cached = cache.get(key)
+    if cached is not None:
+        tracing.record(cache_hits=1)
+        if on_chunk:
+            on_chunk(cached)
+        return cached
+    tracing.record(cache_misses=1)
+
+    kwargs = {"stream": True}
+    if generation_config is not None:
+        kwargs["generation_config"] = generation_config
+    response = get_default_limiter().call(
+        name, lambda: model.generate_content(prompt, **kwargs), request_tokens(model, prompt))
+
+    text, usage = "", None
+    for chunk in response:
+        text += _chunk_text(chunk)
+        usage = getattr(chunk, "usage_metadata", None) or usage  # Sent with the last chunk
+        if on_chunk:
+            on_chunk(text)
+        reason = guard(text) if guard else None
+        if reason:
+            # The SDK has no way to cancel a streaming request: we only stop reading it,
+            # so the abort saves the wait for the rest of the reply, not its tokens
+            record_usage(prompt, text, usage, model)
+            raise StreamAborted(reason, text)
+    record_usage(prompt, text, usage, model)
+    if text:
+        cache.set(key, text, name)
+    return text
+
+
+def stream_with_reissue(model, prompt, guard: Optional[Guard] = None,
+                        on_chunk: Optional[Callable[[str], None]] = None,
+                        generation_config: Optional[dict] = None,
+                        max_reissues: int = DEFAULT_REISSUES, cancel=None,
+                        on_restart: Optional[Callable[[int], None]] = None) -> Optional[str]:
+    """
+    stream_generate_content, re-issuing aborted requests with a higher temperature
+    (a fresh sample). Returns None if every attempt was aborted, or once cancel
+    (a threading.Event) is set: the stream stops at its next chunk.
+    on_restart(attempt) is called before each re-issue, so on_chunk state built from
+    the aborted text can be reset.
+    """
+    config = generation_config
+    guard = cancellable(guard, cancel)
+    for attempt in range(max_reissues + 1):
+        if cancel is not None and cancel.is_set():
+            return None
+        if attempt and on_restart:
+            on_restart(attempt)
+        try:
+            return stream_generate_content(model, prompt, guard, on_chunk, config)
+        except StreamAborted as e:
+            print(f"Aborted streaming response after {len(e.partial_text)} chars: {e.reason}")
+            tracing.record(aborted_streams=1)
+            if e.reason == CANCELLED:
+                return None
+            temperature = (config or {}).get("temperature", 0.4)
+            config = {**(config or {}), "temperature": round(min(1.0, temperature + 0.3), 2)}
+    tracing.fail("stream_aborted")
+    return None
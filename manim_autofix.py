@@ -0,0 +1,258 @@
+import ast
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from manim_linter import lint_manim_script, manim_api
+
+SCENE_NAME = "GeneratedManimScene"
+
+# Names from older manim / manimgl that generated code keeps using
+RENAMED_NAMES = {
+    "ShowCreation": "Create",
+    "TextMobject": "Tex",
+    "TexMobject": "MathTex",
+    "TexText": "Tex",
+    "FadeInFrom": "FadeIn",
+    "FadeInFromDown": "FadeIn",
+    "FadeOutAndShift": "FadeOut",
+    "ShowCreationThenDestruction": "ShowPassingFlash",
+    "GraphScene": "Scene",
+}
+RENAMED_METHODS = {
+    "get_graph": "plot",
+}
+MISSING_IMPORTS = {
+    "np": "import numpy as np",
+    "math": "import math",
+    "random": "import random",
+}
+# Escapes Python consumed inside non-raw TeX strings, e.g. "\vec" -> vertical tab + "ec"
+TEX_ESCAPES = {"\a": "\\a", "\b": "\\b", "\f": "\\f", "\n": "\\n", "\r": "\\r", "\t": "\\t", "\v": "\\v"}
+
+
+class FixResult(BaseModel):
+    rule: str
+    script: str
+    description: str
+
+
+# ---------------------------------------------------------------- source edits
+
+def _offset(lines: List[str], lineno: int, col: int) -> int:
+    """Character offset in the script for an AST (line, UTF-8 byte column) position."""
+    line = lines[lineno - 1]
+    return sum(len(l) for l in lines[:lineno - 1]) + len(line.encode("utf-8")[:col].decode("utf-8", "ignore"))
+
+
+def _apply_edits(script: str, edits: List[Tuple[ast.AST, str]]) -> str:
+    """Replace the source span of each node with new text, preserving everything else."""
+    lines = script.splitlines(keepends=True)
+    spans = []
+    for node, text in edits:
+        start = _offset(lines, node.lineno, node.col_offset)
+        end = _offset(lines, node.end_lineno, node.end_col_offset)
+        spans.append((start, end, text))
+    for start, end, text in sorted(spans, reverse=True):
+        script = script[:start] + text + script[end:]
+    return script
+
+
+def _segment(script: str, node: ast.AST) -> str:
+    return ast.get_source_segment(script, node)
+
+
+# ---------------------------------------------------------------- rules
+
+def _fix_animation_in_add(script: str, tree: ast.AST, log: str) -> Optional[FixResult]:
+    animations = manim_api().animations
+    edits = []
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                and node.func.attr == "add" and isinstance(node.func.value, ast.Name)
+                and node.func.value.id == "self"):
+            continue
+        for arg in node.args:
+            if (isinstance(arg, ast.Call) and isinstance(arg.func, ast.Name)
+                    and arg.func.id in animations and arg.args):
+                # self.add(GrowArrow(vec)) -> self.add(vec)
+                edits.append((arg, _segment(script, arg.args[0])))
+    if not edits:
+        return None
+    return FixResult(rule="animation-in-add", script=_apply_edits(script, edits),
+                     description=f"Unwrapped {len(edits)} animation(s) passed to self.add")
+
+
+def _fix_renamed_api(script: str, tree: ast.AST, log: str) -> Optional[FixResult]:
+    edits = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in RENAMED_NAMES:
+            edits.append((node, RENAMED_NAMES[node.id]))
+        elif isinstance(node, ast.Attribute) and node.attr in RENAMED_METHODS:
+            edits.append((node, f"{_segment(script, node.value)}.{RENAMED_METHODS[node.attr]}"))
+    if not edits:
+        return None
+    return FixResult(rule="renamed-api", script=_apply_edits(script, edits),
+                     description=f"Replaced {len(edits)} renamed Manim API name(s)")
+
+
+def _fix_missing_import(script: str, tree: ast.AST, log: str) -> Optional[FixResult]:
+    missing = set(re.findall(r"NameError: name '(\w+)' is not defined", log))
+    names = manim_api().names
+    imports = []
+    has_manim_star = any(
+        isinstance(n, ast.ImportFrom) and n.module == "manim" and any(a.name == "*" for a in n.names)
+        for n in tree.body
+    )
+    # Without an API snapshot, assume a missing CapWords name (or constant like UP) is a Manim export
+    if not has_manim_star and any(n in names or (not names and n[0].isupper()) for n in missing):
+        imports.append("from manim import *")
+    imports += [MISSING_IMPORTS[name] for name in sorted(missing) if name in MISSING_IMPORTS
+                and MISSING_IMPORTS[name] not in script]
+    if not imports:
+        return None
+    return FixResult(rule="missing-import", script="\n".join(imports) + "\n" + script,
+                     description=f"Added {', '.join(imports)}")
+
+
+def _fix_latex(script: str, tree: ast.AST, log: str) -> Optional[FixResult]:
+    edits = []
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                and node.func.id in ("MathTex", "Tex")):
+            continue
+        for arg in node.args:
+            if (isinstance(arg, ast.Constant) and isinstance(arg.value, str)
+                    and any(ch in arg.value for ch in TEX_ESCAPES)):
+                restored = "".join(TEX_ESCAPES.get(ch, ch) for ch in arg.value)
+                edits.append((arg, "r" + repr(restored).replace("\\\\", "\\")))
+    if edits:
+        return FixResult(rule="latex", script=_apply_edits(script, edits),
+                         description=f"Turned {len(edits)} TeX string(s) with swallowed escapes into raw strings")
+    if re.search(r"No such file or directory: '(latex|dvisvgm)'|latex: not found", log):
+        # No TeX installation: fall back to Pango-rendered Text
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name) and node.id in ("MathTex", "Tex"):
+                edits.append((node, "Text"))
+        if edits:
+            return FixResult(rule="latex", script=_apply_edits(script, edits),
+                             description="LaTeX unavailable, replaced Tex/MathTex with Text")
+    return None
+
+
+def _fix_scene_name(script: str, tree: ast.AST, log: str) -> Optional[FixResult]:
+    classes = [n for n in tree.body if isinstance(n, ast.ClassDef)]
+    if any(c.name == SCENE_NAME for c in classes):
+        return None
+    scenes = [c for c in classes
+              if any(isinstance(b, ast.Name) and b.id.endswith("Scene") for b in c.bases)]
+    if len(scenes) != 1:
+        return None
+    old = scenes[0].name
+    fixed = re.sub(rf"\b{re.escape(old)}\b", SCENE_NAME, script)
+    return FixResult(rule="scene-name", script=fixed, description=f"Renamed scene class {old} to {SCENE_NAME}")
+
+
+# (rule name, error-log classifier, rewrite); findings from the linter also trigger a rule
+RULES: List[Tuple[str, Callable[[str], bool], Callable]] = [
+    ("scene-name",
+     lambda log: "[scene-name]" in log or f"'{SCENE_NAME}' not defined" in log
+     or f"{SCENE_NAME} is not in the script" in log,
+     _fix_scene_name),
+    ("animation-in-add",
+     lambda log: "[animation-in-add]" in log or "Only values of type Mobject" in log
+     or bool(re.search(r"add.*Animation|Animation.*add", log)),
+     _fix_animation_in_add),
+    ("renamed-api",
+     lambda log: any(f"'{n}'" in log for n in list(RENAMED_NAMES) + list(RENAMED_METHODS))
+     or any(f"'{n}' is not a Manim class" in log for n in RENAMED_NAMES),
+     _fix_renamed_api),
+    ("missing-import",
+     lambda log: bool(re.search(r"NameError: name '\w+' is not defined", log)),
+     _fix_missing_import),
+    ("latex",
+     lambda log: bool(re.search(r"LaTeX|latex|dvisvgm|\.tex\b", log)),
+     _fix_latex),
+]
+
+
+class AutoFixStats:
+    """Per-rule hit counts and the LLM round-trips (and seconds) they saved."""
+
+    DEFAULT_LLM_SECONDS = 10.0
+
+    def __init__(self):
+        self.failures = 0
+        self.matched: Dict[str, int] = {name: 0 for name, _, _ in RULES}
+        self.applied: Dict[str, int] = {name: 0 for name, _, _ in RULES}
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_llm_call(self, seconds: float) -> None:
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_seconds += seconds
+
+    def avg_llm_seconds(self) -> float:
+        return self.llm_seconds / self.llm_calls if self.llm_calls else self.DEFAULT_LLM_SECONDS
+
+    def summary(self) -> dict:
+        avg = self.avg_llm_seconds()
+        with self._lock:
+            return {
+                "failures_seen": self.failures,
+                "llm_calls": self.llm_calls,
+                "avg_llm_seconds": round(avg, 3),
+                "rules": {
+                    name: {
+                        "matched": self.matched[name],
+                        "applied": self.applied[name],
+                        "hit_rate": round(self.applied[name] / self.failures, 3) if self.failures else 0.0,
+                        "llm_calls_saved": self.applied[name],
+                        "seconds_saved_est": round(self.applied[name] * avg, 1),
+                    }
+                    for name in self.matched
+                },
+            }
+
+    def report(self) -> str:
+        """Process totals and one line per rule that matched, for the end of a run."""
+        summary = self.summary()
+        lines = [f"Auto-fix: {summary['failures_seen']} failure(s) seen, {summary['llm_calls']} sent to the LLM"]
+        for name, rule in summary["rules"].items():
+            if rule["matched"]:
+                lines.append(f"  {name}: applied {rule['applied']} of {rule['matched']} matched, "
+                             f"hit rate {rule['hit_rate']:.0%}, ~{rule['seconds_saved_est']}s saved")
+        return "\n".join(lines)
+
+
+stats = AutoFixStats()
+
+
+def try_autofix(script: str, error_log: str) -> Optional[FixResult]:
+    """
+    Classify the error log and apply the first deterministic rewrite that changes the script.
+    Returns None when no rule matches, in which case the caller falls back to the LLM.
+    """
+    with stats._lock:
+        stats.failures += 1
+    try:
+        tree = ast.parse(script)
+    except SyntaxError:
+        return None
+    # Lint findings name problems the runtime log may only hint at
+    log = error_log + "\n" + "\n".join(str(f) for f in lint_manim_script(script, SCENE_NAME))
+    for name, matches, rewrite in RULES:
+        if not matches(log):
+            continue
+        with stats._lock:
+            stats.matched[name] += 1
+        fix = rewrite(script, tree, log)
+        if fix is not None and fix.script.strip() != script.strip():
+            with stats._lock:
+                stats.applied[name] += 1
+            return fix
+    return None
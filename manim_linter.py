@@ -0,0 +1,248 @@
+import ast
+import builtins
+import inspect
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Set
+
+from pydantic import BaseModel
+
+from render_cache import manim_version
+
+# manim's exports are read from a snapshot a render worker writes after importing manim,
+# so linting in the orchestrator never pays manim's multi-second import
+API_SNAPSHOT_DIR = os.getenv("MANIM_API_SNAPSHOT_DIR", ".cache/manim_api")
+
+# Used until a snapshot exists; the full set comes from manim's exports
+COMMON_ANIMATIONS = {
+    "Animation", "AnimationGroup", "ApplyMethod", "Circumscribe", "Create", "DrawBorderThenFill",
+    "FadeIn", "FadeOut", "FadeTransform", "Flash", "GrowArrow", "GrowFromCenter", "GrowFromEdge",
+    "GrowFromPoint", "Indicate", "LaggedStart", "MoveToTarget", "ReplacementTransform", "Rotate",
+    "Rotating", "ShowPassingFlash", "SpinInFromNothing", "Succession", "Transform",
+    "TransformMatchingShapes", "TransformMatchingTex", "Uncreate", "Unwrite", "Wiggle", "Write",
+}
+
+
+# Rules that are certain when they fire. unknown-name and bad-kwarg are heuristics
+# (manim's API is too dynamic to be sure), so they only inform the repair prompt
+BLOCKING_RULES = frozenset({"syntax", "scene-name", "missing-construct", "animation-in-add"})
+
+
+class LintFinding(BaseModel):
+    rule: str
+    line: int
+    message: str
+
+    @property
+    def blocking(self) -> bool:
+        return self.rule in BLOCKING_RULES
+
+    def __str__(self) -> str:
+        return f"line {self.line}: [{self.rule}] {self.message}"
+
+
+class ManimAPI(BaseModel):
+    """What `from manim import *` provides, as far as the lint rules need it."""
+    version: str = "unknown"
+    names: Set[str] = set()
+    animations: Set[str] = set(COMMON_ANIMATIONS)
+    kwargs: Dict[str, Optional[List[str]]] = {}  # Class -> accepted keyword arguments (None: unknown)
+
+
+_api: Optional[ManimAPI] = None
+_api_lock = threading.Lock()
+
+
+def api_snapshot_path(version: Optional[str] = None) -> str:
+    return os.path.join(API_SNAPSHOT_DIR, f"{version or manim_version()}.json")
+
+
+def build_api_snapshot(manim) -> ManimAPI:
+    """Read the snapshot off an imported manim module (in a render worker)."""
+    namespace = {name: getattr(manim, name) for name in dir(manim) if not name.startswith("_")}
+    base = namespace.get("Animation")
+    classes = {name: obj for name, obj in namespace.items() if isinstance(obj, type)}
+    kwargs = {}
+    for name, cls in classes.items():
+        accepted = accepted_kwargs(cls)
+        kwargs[name] = sorted(accepted) if accepted is not None else None
+    return ManimAPI(version=getattr(manim, "__version__", manim_version()), names=set(namespace),
+                    animations={n for n, c in classes.items() if isinstance(base, type) and issubclass(c, base)}
+                    or set(COMMON_ANIMATIONS), kwargs=kwargs)
+
+
+def write_api_snapshot(manim) -> Optional[str]:
+    """Write the snapshot for the installed manim version unless it exists; returns its path."""
+    path = api_snapshot_path()
+    if os.path.exists(path):
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(build_api_snapshot(manim).model_dump_json())
+    os.replace(tmp_path, path)
+    return path
+
+
+def manim_api() -> ManimAPI:
+    """
+    manim's exports from the snapshot for the installed version. Until a render worker
+    has written one, only COMMON_ANIMATIONS are known and the name/kwarg rules are skipped.
+    """
+    global _api
+    with _api_lock:
+        if _api is not None:
+            return _api
+        try:
+            with open(api_snapshot_path(), "r", encoding="utf-8") as f:
+                _api = ManimAPI(**json.load(f))
+            return _api
+        except (OSError, ValueError):
+            return ManimAPI()  # Looked for again next time
+
+
+def accepted_kwargs(cls) -> Optional[Set[str]]:
+    """
+    Keyword arguments a class constructor accepts, following **kwargs up the MRO.
+    Returns None when the accepted set can't be determined.
+    """
+    accepted: Set[str] = set()
+    for klass in cls.__mro__:
+        if klass is object:
+            return accepted
+        init = klass.__dict__.get("__init__")
+        if init is None:
+            continue
+        try:
+            params = list(inspect.signature(init).parameters.values())[1:]  # Without self
+        except (TypeError, ValueError):
+            return None
+        forwards = False
+        for param in params:
+            if param.kind is param.VAR_KEYWORD:
+                forwards = True
+            elif param.kind in (param.POSITIONAL_OR_KEYWORD, param.KEYWORD_ONLY):
+                accepted.add(param.name)
+        if not forwards:
+            return accepted
+    return None
+
+
+def _defined_names(tree: ast.AST) -> Set[str]:
+    names = set(dir(builtins))
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            names.add(node.id)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if alias.name != "*":
+                    names.add((alias.asname or alias.name).split(".")[0])
+    return names
+
+
+def _is_self_add(node: ast.Call) -> bool:
+    func = node.func
+    return (isinstance(func, ast.Attribute) and func.attr == "add"
+            and isinstance(func.value, ast.Name) and func.value.id == "self")
+
+
+def _call_name(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        return node.func.id
+    return None
+
+
+def lint_manim_script(script: str, scene_name: str = "GeneratedManimScene") -> List[LintFinding]:
+    """Static checks for the errors generated scripts hit most often, without rendering."""
+    try:
+        tree = ast.parse(script)
+    except SyntaxError as e:
+        return [LintFinding(rule="syntax", line=e.lineno or 0, message=str(e.msg))]
+
+    findings: List[LintFinding] = []
+    api = manim_api()
+    animations = api.animations
+
+    # Scene class name and construct()
+    classes = [node for node in tree.body if isinstance(node, ast.ClassDef)]
+    scene = next((c for c in classes if c.name == scene_name), None)
+    if scene is None:
+        others = [c.name for c in classes]
+        hint = f" (found: {', '.join(others)})" if others else ""
+        findings.append(LintFinding(rule="scene-name", line=classes[0].lineno if classes else 1,
+                                    message=f"Scene class must be named '{scene_name}'{hint}"))
+    elif not any(isinstance(n, ast.FunctionDef) and n.name == "construct" for n in scene.body):
+        findings.append(LintFinding(rule="missing-construct", line=scene.lineno,
+                                    message=f"'{scene_name}' has no construct(self) method"))
+
+    # Names bound to animation instances, e.g. `arrow_anim = GrowArrow(v)`
+    animation_vars = {
+        target.id
+        for node in ast.walk(tree) if isinstance(node, ast.Assign) and _call_name(node.value) in animations
+        for target in node.targets if isinstance(target, ast.Name)
+    }
+
+    defined = _defined_names(tree)
+    star_imports_manim = any(
+        isinstance(n, ast.ImportFrom) and (n.module or "").split(".")[0] == "manim"
+        and any(a.name == "*" for a in n.names)
+        for n in tree.body
+    )
+
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+
+        if _is_self_add(node):
+            for arg in node.args:
+                name = _call_name(arg)
+                if name in animations:
+                    findings.append(LintFinding(
+                        rule="animation-in-add", line=node.lineno,
+                        message=f"{name}(...) is an animation and cannot be passed to self.add; "
+                                f"add the mobject itself or use self.play({name}(...))"))
+                elif isinstance(arg, ast.Name) and arg.id in animation_vars:
+                    findings.append(LintFinding(
+                        rule="animation-in-add", line=node.lineno,
+                        message=f"'{arg.id}' holds an animation and cannot be passed to self.add"))
+
+        name = _call_name(node)
+        if not name or not api.names or not star_imports_manim:
+            continue
+        if name not in api.names:
+            if name[0].isupper() and name not in defined:
+                findings.append(LintFinding(rule="unknown-name", line=node.lineno,
+                                            message=f"'{name}' is not a Manim class or defined in the script"))
+            continue
+        if node.keywords and api.kwargs.get(name) is not None:
+            allowed = set(api.kwargs[name])
+            for kw in node.keywords:
+                if kw.arg is not None and kw.arg not in allowed:
+                    findings.append(LintFinding(rule="bad-kwarg", line=node.lineno,
+                                                message=f"{name}() got an unexpected keyword argument '{kw.arg}'"))
+    return findings
+
+
+def format_findings(findings: List[LintFinding]) -> str:
+    """Findings as a block of text for logs and the refinement prompt."""
+    return "Static analysis found these problems:\n" + "\n".join(str(f) for f in findings)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] == ["--snapshot"]:  # Write the API snapshot without waiting for a render worker
+        import manim
+
+        print(write_api_snapshot(manim) or f"{api_snapshot_path()} already exists")
+        sys.exit(0)
+    path = sys.argv[1] if len(sys.argv) > 1 else "generated_manim_script.py"
+    with open(path, "r", encoding="utf-8") as f:
+        results = lint_manim_script(f.read())
+    print(format_findings(results) if results else "No problems found.")
+    sys.exit(1 if results else 0)
@@ -0,0 +1,380 @@
+"""
+Page-block extraction from parsed textbook PDFs (the loop from Pdf_Extraction.ipynb).
+
+Pages are packed into blocks by estimated token count (pack_pages), cut only
+where a page opens with a unit/chapter/topic heading, and blocks are sent to
+Gemini concurrently (bounded, and paced by the shared rate limiter). A block
+whose output comes back truncated is split in two, again at a heading where
+possible, and each half is retried. Each block is written to its own file as
+soon as it completes and recorded in a checkpoint manifest, so a re-run after a
+crash only requests the blocks that are missing, failed, still incomplete
+(truncated at the last split, or JSON left open), or whose pages/prompt changed. Blocks go either to block text files (BlockFiles, as the notebook used
+to save them) or, parsed into records, to a record_sink.RecordSink dataset.
+
+    python pdf_extraction.py kech103.pdf --prompt instruction_prompt.txt --prefix Chemistry
+"""
+import argparse
+import concurrent.futures
+import contextvars
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from json_extractor import JSONStreamScanner
+from rate_limiter import estimate_tokens, limited_generate_content, model_name_of, system_instruction_of
+from tracing import span
+
+PAGE_BLOCK = 5
+# Input tokens per request; the extraction echoes the text plus explanations, so
+# output runs well above input and has to stay under the model's output limit
+DEFAULT_TOKEN_BUDGET = int(os.getenv("PDF_BLOCK_TOKENS", 4000))
+DEFAULT_MAX_PAGES = 20
+MAX_SPLIT_DEPTH = 3  # A truncated block is retried as at most 2**3 parts
+DEFAULT_CONCURRENCY = int(os.getenv("PDF_EXTRACTION_CONCURRENCY", 4))
+DEFAULT_MODEL = "gemini-2.0-flash"
+
+# (block_idx, start_pg, end_pg, content), as the notebook's `results` list
+BlockResult = Tuple[int, int, int, str]
+# (page number, text): a page of a block, or part of a page once a block is re-split
+Segment = Tuple[int, str]
+
+# "UNIT 3", "Chapter 2" and numbered topics such as "3.2 Atomic Mass" at the start of a line
+HEADING = re.compile(r"^[ \t]*(?:(?:UNIT|Unit|CHAPTER|Chapter)\s+\d+\b|\d+(?:\.\d+){1,3}\.?[ \t]+[A-Z])",
+                     re.MULTILINE)
+
+
+def chunk_pages(docs, block=5):
+    for i in range(0, len(docs), block):
+        yield docs[i : i + block], i + 1, i + block
+
+
+def _page_text(page) -> str:
+    # LlamaParse Documents, or plain strings when pages were loaded from a checkpoint
+    return page if isinstance(page, str) else page.text
+
+
+def starts_with_heading(text: str, lines: int = 3) -> bool:
+    """Whether a heading appears within the first few non-empty lines (after running headers)."""
+    head = "\n".join([line for line in text.splitlines() if line.strip()][:lines])
+    return HEADING.search(head) is not None
+
+
+def pack_pages(docs, token_budget: int = DEFAULT_TOKEN_BUDGET, max_pages: int = DEFAULT_MAX_PAGES):
+    """
+    Yield (pages, start_pg, end_pg) like chunk_pages, but pack as many pages as fit in
+    token_budget. A block that would overflow is cut before its last page that opens
+    with a heading, so a topic isn't spread over two requests; without one it is cut at
+    the overflowing page. A page over the budget on its own gets a block to itself.
+    """
+    block, tokens, start = [], 0, 1
+    for page in docs:
+        cost = estimate_tokens(_page_text(page))
+        while block and (tokens + cost > token_budget or len(block) >= max_pages):
+            cut = max((i for i in range(1, len(block)) if starts_with_heading(_page_text(block[i]))),
+                      default=len(block))
+            yield block[:cut], start, start + cut - 1
+            block, start = block[cut:], start + cut
+            tokens = sum(estimate_tokens(_page_text(p)) for p in block)
+        block.append(page)
+        tokens += cost
+    if block:
+        yield block, start, start + len(block) - 1
+
+
+def _split_text(text: str) -> List[str]:
+    """A page's text cut before each heading, or at paragraph breaks if it has none."""
+    cuts = [m.start() for m in HEADING.finditer(text) if m.start() > 0]
+    if not cuts:
+        cuts = [m.end() for m in re.finditer(r"\n[ \t]*\n", text) if m.end() < len(text)]
+    bounds = [0] + cuts + [len(text)]
+    return [text[a:b] for a, b in zip(bounds, bounds[1:]) if text[a:b].strip()]
+
+
+def split_segments(segments: List[Segment]) -> Optional[Tuple[List[Segment], List[Segment]]]:
+    """Halve a block by tokens, at a heading where there is one; None if it can't be split."""
+    if len(segments) == 1:
+        page, text = segments[0]
+        segments = [(page, piece) for piece in _split_text(text)]
+        if len(segments) < 2:
+            return None
+    costs = [estimate_tokens(text) for _, text in segments]
+    half = sum(costs) / 2
+    cuts = [i for i in range(1, len(segments)) if starts_with_heading(segments[i][1])]
+    cut = min(cuts or range(1, len(segments)), key=lambda i: abs(sum(costs[:i]) - half))
+    return segments[:cut], segments[cut:]
+
+
+def is_truncated(response) -> bool:
+    """Output cut off by the token limit (finish_reason MAX_TOKENS)."""
+    try:
+        reason = response.candidates[0].finish_reason
+    except (AttributeError, IndexError, TypeError):
+        return False
+    return getattr(reason, "name", str(reason)) in ("MAX_TOKENS", "2")
+
+
+def is_unparsed(text: str) -> bool:
+    """JSON left open at the end of the output, so its last value can't be parsed as is."""
+    scanner = JSONStreamScanner()
+    scanner.feed(text)
+    return scanner.partial() is not None
+
+
+def block_hash(model_name: str, instruction_prompt: str, block_text: str) -> str:
+    payload = json.dumps([model_name, instruction_prompt, block_text], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _write_atomic(path: str, text: str) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class ExtractionManifest:
+    """
+    JSON checkpoint of finished and failed blocks, keyed by page range.
+    Rewritten atomically after every block, so it is valid whenever the process dies.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.blocks = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.blocks = json.load(f).get("blocks", {})
+            except (OSError, json.JSONDecodeError):
+                print(f"Warning: unreadable manifest {path}, starting over")
+
+    @staticmethod
+    def key(start_pg: int, end_pg: int) -> str:
+        return f"{start_pg}-{end_pg}"
+
+    def completed(self, start_pg: int, end_pg: int, digest: str) -> Optional[dict]:
+        """The entry for a block that finished with these inputs and whose file still exists."""
+        entry = self.blocks.get(self.key(start_pg, end_pg))
+        if (entry and entry.get("status") == "done" and entry.get("hash") == digest
+                and os.path.exists(self.file_path(entry))):
+            return entry
+        return None
+
+    def file_path(self, entry: dict) -> str:
+        # Stored relative to the manifest, so the output directory can be moved
+        return os.path.join(os.path.dirname(self.path), entry.get("file", ""))
+
+    def record(self, start_pg: int, end_pg: int, **entry) -> None:
+        with self._lock:
+            self.blocks[self.key(start_pg, end_pg)] = {**entry, "updated_at": round(time.time(), 3)}
+            _write_atomic(self.path, json.dumps({"blocks": self.blocks}, indent=2, ensure_ascii=False))
+
+
+def block_file_name(prefix: str, start_pg: int, end_pg: int) -> str:
+    return f"{prefix}_block_{start_pg}_{end_pg}.txt"
+
+
+def read_block_file(path: str) -> str:
+    """Content of a block file without the ```json fence it was saved with."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if text.startswith("```json\n") and text.endswith("\n```\n"):
+        text = text[len("```json\n"):-len("\n```\n")]
+    return text
+
+
+class BlockFiles:
+    """
+    Block store writing each block's raw response to <prefix>_block_<start>_<end>.txt.
+    A store saves a finished block (returning manifest fields and the caller's result)
+    and loads the result back for blocks a previous run finished; see RecordSink.
+    """
+
+    def __init__(self, output_dir: str = ".", prefix: str = "Chemistry"):
+        self.output_dir = output_dir
+        self.manifest_path = os.path.join(output_dir, f"{prefix}_manifest.json")
+        self.prefix = prefix
+        os.makedirs(output_dir, exist_ok=True)
+
+    def save(self, block_idx: int, start_pg: int, end_pg: int, content: str) -> Tuple[dict, BlockResult]:
+        path = os.path.join(self.output_dir, block_file_name(self.prefix, start_pg, end_pg))
+        _write_atomic(path, f"```json\n{content}\n```\n")
+        return {"file": os.path.basename(path), "chars": len(content)}, (block_idx, start_pg, end_pg, content)
+
+    def load(self, entry: dict, block_idx: int, start_pg: int, end_pg: int) -> BlockResult:
+        path = os.path.join(os.path.dirname(self.manifest_path), entry["file"])
+        return block_idx, start_pg, end_pg, read_block_file(path)
+
+
+def extract_block(model, instruction_prompt: str, block_idx, segments: List[Segment],
+                  depth: int = 0) -> Tuple[str, int, bool]:
+    """
+    Extract one block; if the output is truncated, split the block and extract the
+    halves instead. Returns (content, number of splits, still truncated).
+    """
+    start_pg, end_pg = segments[0][0], segments[-1][0]
+    meta = f"<!-- block:{block_idx} pages:{start_pg}-{end_pg} -->\n"
+    if system_instruction_of(model) != instruction_prompt:  # Else it's already the model's system instruction
+        meta += instruction_prompt
+    response = limited_generate_content(model, [meta, "\n\n".join(t for _, t in segments)])
+    content = response.text.strip()
+    if not is_truncated(response):
+        return content, 0, False
+    halves = split_segments(segments) if depth < MAX_SPLIT_DEPTH else None
+    if halves is None:
+        return content, 0, True
+    print(f"Block {block_idx} (pages {start_pg}-{end_pg}) was truncated, retrying in two parts")
+    first, first_splits, first_truncated = extract_block(model, instruction_prompt, f"{block_idx}.1",
+                                                         halves[0], depth + 1)
+    second, second_splits, second_truncated = extract_block(model, instruction_prompt, f"{block_idx}.2",
+                                                            halves[1], depth + 1)
+    return f"{first}\n{second}", 1 + first_splits + second_splits, first_truncated or second_truncated
+
+
+def extract_blocks(documents, instruction_prompt: str, model=None, output_dir: str = ".",
+                   prefix: str = "Chemistry", block: Optional[int] = None,
+                   concurrency: int = DEFAULT_CONCURRENCY, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                   max_pages: int = DEFAULT_MAX_PAGES, sink=None) -> list:
+    """
+    Extract every page block, `concurrency` requests at a time, skipping blocks the
+    manifest already has. Pages are packed by token_budget, or into fixed blocks of
+    `block` pages if given. Blocks are saved to `sink` (e.g. a RecordSink) if given,
+    else to block files in output_dir. Returns the store's result for every block in
+    page order: BlockResult for block files, (block_idx, start_pg, end_pg, records)
+    for a RecordSink. Failed blocks are reported, left out, and retried next run;
+    incomplete blocks are saved as far as they go and also retried next run.
+    """
+    if model is None:
+        from gemini_client import get_model
+        model = get_model(DEFAULT_MODEL, system_instruction=instruction_prompt)
+    store = sink or BlockFiles(output_dir, prefix)
+    manifest = ExtractionManifest(store.manifest_path)
+    name = model_name_of(model)
+
+    results = {}
+    todo = []
+    blocks = list(chunk_pages(documents, block) if block else pack_pages(documents, token_budget, max_pages))
+    prune = getattr(store, "prune", None)
+    if prune:  # Parts of an earlier packing would duplicate pages
+        removed = prune((start_pg, end_pg) for _, start_pg, end_pg in blocks)
+        if removed:
+            print(f"Removed {removed} part(s) of page ranges this run no longer extracts")
+    for block_idx, (pages, start_pg, end_pg) in enumerate(blocks, start=1):
+        digest = block_hash(name, instruction_prompt, "\n\n".join(_page_text(p) for p in pages))
+        entry = manifest.completed(start_pg, end_pg, digest)
+        if entry:
+            results[block_idx] = store.load(entry, block_idx, start_pg, end_pg)
+        else:
+            todo.append((block_idx, pages, start_pg, end_pg, digest))
+    total = len(results) + len(todo)
+    print(f"{len(results)} block(s) already extracted, {len(todo)} to go")
+
+    def run(block_idx, pages, start_pg, end_pg, digest):
+        with span("pdf_block", block=block_idx, pages=f"{start_pg}-{end_pg}") as block_span:
+            start = time.perf_counter()
+            segments = [(start_pg + i, _page_text(p)) for i, p in enumerate(pages)]
+            try:
+                content, splits, truncated = extract_block(model, instruction_prompt, block_idx, segments)
+            except Exception as e:
+                block_span.fail(type(e).__name__)
+                manifest.record(start_pg, end_pg, block=block_idx, status="failed", hash=digest,
+                                error=f"{type(e).__name__}: {e}")
+                raise
+            # Truncated even after the last split, or cut off mid-JSON: keep what parsed, retry next run
+            status = "incomplete" if truncated or is_unparsed(content) else "done"
+            block_span.set(splits=splits, truncated=truncated, status=status)
+            fields, result = store.save(block_idx, start_pg, end_pg, content)
+            manifest.record(start_pg, end_pg, block=block_idx, status=status, hash=digest, splits=splits,
+                            truncated=truncated, seconds=round(time.perf_counter() - start, 3), **fields)
+            if status != "done":
+                print(f"Pages {start_pg}-{end_pg} came back incomplete; re-run to retry")
+            return result
+
+    failed = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {executor.submit(contextvars.copy_context().run, run, *job): job for job in todo}
+        for future in concurrent.futures.as_completed(futures):
+            block_idx, _, start_pg, end_pg, _ = futures[future]
+            try:
+                results[block_idx] = future.result()
+                print(f"Saved pages {start_pg}-{end_pg} ({len(results)}/{total})")
+            except Exception as e:
+                failed += 1
+                print(f"Pages {start_pg}-{end_pg} failed ({type(e).__name__}: {e}); re-run to retry")
+    if failed:
+        print(f"{failed} block(s) failed")
+    return [results[i] for i in sorted(results)]
+
+
+def write_combined(results: Iterable[BlockResult], path: str) -> None:
+    """All blocks in page order in one file, each tagged with its page range."""
+    parts = []
+    for block_idx, start_pg, end_pg, content in results:
+        parts.append(f"<!-- block:{block_idx} pages:{start_pg}-{end_pg} -->\n```json\n{content}\n```\n\n")
+    _write_atomic(path, "".join(parts))
+
+
+def load_pages(pdf_path: str, cache_path: Optional[str] = None) -> List[str]:
+    """Parse the PDF with LlamaParse once; page texts are kept next to the output for re-runs."""
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    from llama_parse import LlamaParse
+
+    documents = LlamaParse(result_type="text", verbose=True).load_data(pdf_path)
+    pages = [d.text for d in documents]
+    if cache_path:
+        _write_atomic(cache_path, json.dumps(pages, ensure_ascii=False))
+    return pages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resumable page-block extraction of a textbook PDF")
+    parser.add_argument("pdf", help="PDF to parse (page texts are cached as <prefix>_pages.json)")
+    parser.add_argument("--prompt", required=True, help="File with the extraction instruction prompt")
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--prefix", default="Chemistry",
+                        help="Subject; block files are <prefix>_block_<start>_<end>.txt")
+    parser.add_argument("--token-budget", type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help="Estimated input tokens per request")
+    parser.add_argument("--max-pages", type=int, default=DEFAULT_MAX_PAGES)
+    parser.add_argument("--block", type=int, default=None,
+                        help=f"Fixed pages per request instead of token packing (the notebook used {PAGE_BLOCK})")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--combined", default=None, help="Also write all blocks in order to this file")
+    parser.add_argument("--dataset", default=None,
+                        help="Write parsed records to this dataset root instead of block files")
+    parser.add_argument("--unit", default=None, help="Unit partition of the dataset (required with --dataset)")
+    parser.add_argument("--format", choices=("jsonl", "parquet"), default="jsonl")
+    args = parser.parse_args()
+
+    from gemini_client import get_model
+
+    with open(args.prompt, "r", encoding="utf-8") as f:
+        prompt = f.read()
+    os.makedirs(args.output_dir, exist_ok=True)
+    pages = load_pages(args.pdf, os.path.join(args.output_dir, f"{args.prefix}_pages.json"))
+    print(f"Total parsed pages: {len(pages)}")
+    start = time.perf_counter()
+    sink = None
+    if args.dataset:
+        from record_sink import RecordSink
+
+        if args.unit is None:
+            parser.error("--unit is required with --dataset")
+        sink = RecordSink(args.dataset, args.prefix, args.unit, args.format)
+    results = extract_blocks(pages, prompt, get_model(args.model, system_instruction=prompt), args.output_dir, args.prefix,
+                             block=args.block, concurrency=args.concurrency,
+                             token_budget=args.token_budget, max_pages=args.max_pages, sink=sink)
+    if sink:
+        print(f"{sum(r[3] for r in results)} records in {sink.partition_dir}")
+    elif args.combined:
+        write_combined(results, args.combined)
+        print(f"All JSON chunks saved to {args.combined}")
+    print(f"Done in {time.perf_counter() - start:.1f}s: {len(results)} block(s)")
@@ -0,0 +1,257 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import tracing
+
+# Requests-per-minute and tokens-per-minute per model. Override with
+# GEMINI_RATE_LIMITS='{"gemini-2.0-flash": {"rpm": 2000, "tpm": 4000000}}'
+DEFAULT_LIMITS = {
+    "gemini-1.5-flash": {"rpm": 15, "tpm": 1_000_000},
+    "gemini-2.0-flash": {"rpm": 15, "tpm": 1_000_000},
+    "gemini-pro": {"rpm": 60, "tpm": 120_000},
+}
+FALLBACK_LIMITS = {"rpm": 15, "tpm": 1_000_000}
+
+# Output tokens reserved up front; corrected once usage_metadata is known
+DEFAULT_OUTPUT_RESERVATION = 512
+RETRYABLE_CODES = {429, 500, 503, 504}
+RETRYABLE_NAMES = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+                   "InternalServerError", "DeadlineExceeded"}
+
+
+def estimate_tokens(prompt) -> int:
+    """Rough token count (~4 characters per token) for strings or lists of parts."""
+    if isinstance(prompt, (list, tuple)):
+        return sum(estimate_tokens(p) for p in prompt)
+    return max(1, len(str(prompt)) // 4)
+
+
+def model_name_of(model) -> str:
+    """Return a stable name for a GenerativeModel (or a plain string)."""
+    if isinstance(model, str):
+        return model
+    return getattr(model, "model_name", None) or type(model).__name__
+
+
+def system_instruction_of(model) -> Optional[str]:
+    """Text of the model's system instruction (set by gemini_client.get_model or the SDK), if any."""
+    text = getattr(model, "_instruction_text", None)
+    if text is not None:
+        return text
+    instruction = getattr(model, "_system_instruction", None)
+    if instruction is None or isinstance(instruction, str):
+        return instruction
+    parts = getattr(instruction, "parts", None) or []
+    return "".join(getattr(p, "text", "") for p in parts) or None
+
+
+def request_tokens(model, prompt) -> int:
+    """Estimated input tokens of a request, including the system instruction sent with it."""
+    instruction = system_instruction_of(model)
+    return estimate_tokens(prompt) + (estimate_tokens(instruction) if instruction else 0)
+
+
+def _short_name(model_name: str) -> str:
+    return model_name.split("/", 1)[-1]
+
+
+class TokenBucket:
+    """Thread-safe token bucket. reserve() debits immediately and returns how long to wait."""
+
+    def __init__(self, capacity: float, per_seconds: float = 60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / per_seconds
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, delta: float) -> None:
+        """Return (positive) or charge (negative) tokens after the fact."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + delta)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Extract a server-provided retry delay from a Gemini / HTTP error, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("Retry-After") or headers.get("retry-after")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None and hasattr(delay, "seconds"):
+            return delay.seconds + getattr(delay, "nanos", 0) / 1e9
+    text = str(error)
+    match = (re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", text)
+             or re.search(r"retry in ([\d.]+)\s*s", text, re.IGNORECASE))
+    return float(match.group(1)) if match else None
+
+
+def is_throttle(error: Exception) -> bool:
+    return (getattr(error, "code", None) == 429
+            or type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+            or "429" in str(error))
+
+
+def is_retryable(error: Exception) -> bool:
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_CODES:
+        return True
+    return type(error).__name__ in RETRYABLE_NAMES or is_throttle(error)
+
+
+class _ModelState:
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.blocked_until = 0.0
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+
+class RateLimiter:
+    """
+    Process-wide limiter in front of every Gemini call: per-model RPM/TPM buckets,
+    jittered exponential backoff on 429/5xx that honours retry-after, and queue-wait metrics.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, dict]] = None, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.limits = dict(DEFAULT_LIMITS)
+        env_limits = os.getenv("GEMINI_RATE_LIMITS")
+        if env_limits:
+            self.limits.update(json.loads(env_limits))
+        if limits:
+            self.limits.update(limits)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._models: Dict[str, _ModelState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, model_name: str) -> _ModelState:
+        name = _short_name(model_name)
+        with self._lock:
+            if name not in self._models:
+                cfg = self.limits.get(name, FALLBACK_LIMITS)
+                self._models[name] = _ModelState(cfg["rpm"], cfg["tpm"])
+            return self._models[name]
+
+    def acquire(self, model_name: str, tokens: int) -> float:
+        """Block until a request of `tokens` may be sent; returns the time spent waiting."""
+        state = self._state(model_name)
+        wait = max(state.requests.reserve(1), state.tokens.reserve(tokens),
+                   state.blocked_until - time.monotonic())
+        if wait > 0:
+            time.sleep(wait)
+        with self._lock:
+            state.calls += 1
+            state.wait_total += max(wait, 0.0)
+            state.wait_max = max(state.wait_max, wait)
+        return max(wait, 0.0)
+
+    def _backoff(self, state: _ModelState, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        server_delay = retry_after_seconds(error)
+        if server_delay is not None:
+            delay = max(delay, server_delay)
+        with self._lock:
+            state.retries += 1
+            if is_throttle(error):
+                state.throttled += 1
+                # Pause every caller of this model, not just the one that was rejected
+                state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+        return delay
+
+    def call(self, model_name: str, func: Callable, estimated_tokens: int = 0):
+        """Run func() under the model's limits, retrying retryable errors with backoff."""
+        state = self._state(model_name)
+        reserved = estimated_tokens + DEFAULT_OUTPUT_RESERVATION
+        attempt = 0
+        while True:
+            tracing.record(queue_wait_s=self.acquire(model_name, reserved))
+            try:
+                response = func()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = self._backoff(state, attempt, e)
+                tracing.record(retries=1, throttled=int(is_throttle(e)))
+                print(f"Gemini call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            try:
+                actual = response.usage_metadata.total_token_count
+            except Exception:  # Streaming responses only know usage once consumed
+                actual = None
+            if actual:
+                state.tokens.adjust(reserved - actual)
+            return response
+
+    def metrics(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                name: {
+                    "calls": s.calls,
+                    "retries": s.retries,
+                    "throttled": s.throttled,
+                    "queue_wait_total_s": round(s.wait_total, 3),
+                    "queue_wait_avg_s": round(s.wait_total / s.calls, 3) if s.calls else 0.0,
+                    "queue_wait_max_s": round(s.wait_max, 3),
+                }
+                for name, s in self._models.items()
+            }
+
+
+_default_limiter: Optional[RateLimiter] = None
+_default_lock = threading.Lock()
+
+
+def get_default_limiter() -> RateLimiter:
+    """Limiter shared by every Gemini call site in the process."""
+    global _default_limiter
+    with _default_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter()
+        return _default_limiter
+
+
+def set_default_limiter(limiter: Optional[RateLimiter]) -> None:
+    """Replace the process-wide limiter (None to recreate it with defaults on next use)."""
+    global _default_limiter
+    with _default_lock:
+        _default_limiter = limiter
+
+
+def limited_generate_content(model, prompt, **kwargs):
+    """model.generate_content(prompt) routed through the shared limiter."""
+    name = getattr(model, "model_name", None) or type(model).__name__
+    return get_default_limiter().call(
+        name, lambda: model.generate_content(prompt, **kwargs), request_tokens(model, prompt)
+    )
@@ -0,0 +1,249 @@
+"""
+Streaming sink for the records extracted from textbook page blocks.
+
+Each block's JSON records are parsed once, normalized with ftfy.fix_text once,
+and written as one part file of a dataset partitioned by subject and unit:
+
+    <root>/subject=Chemistry/unit=3/pages-00001-00008.jsonl    (or .parquet)
+
+Part files are named by page range, like the extraction manifest's entries, and
+every row carries block/pages/seq, so the dataset reads back in textbook order
+whatever order blocks finished in, and a retried block simply replaces its part.
+A re-run that packs pages differently (another --token-budget or --block) prunes
+the parts of ranges it no longer has. Only one block is in memory at a time.
+"""
+import csv
+import html
+import json
+import os
+import re
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from json_extractor import extract_all_json
+
+RECORD_FIELDS = ("chapter_number", "chapter_title", "topic_number", "topic_title", "content_type", "content")
+GROUP_KEY = RECORD_FIELDS[:-1]
+FORMATS = ("jsonl", "parquet")
+
+# Replaced by hand in the notebook before ftfy was applied everywhere; used if ftfy is missing
+MOJIBAKE = {"‚Ä¢": "•", "‚Äî": "—"}
+
+_PART = re.compile(r"^pages-(\d+)-(\d+)\.(jsonl|parquet)$")
+_BROKEN = re.compile(r"^_broken-pages-(\d+)-(\d+)\.jsonl$")
+_LEGACY_PART = re.compile(r"^_?(broken-)?block-\d+\.(jsonl|parquet)$")  # Named by block number before
+
+
+def normalize_text(text: str) -> str:
+    try:
+        from ftfy import fix_text
+    except ImportError:
+        for bad, good in MOJIBAKE.items():
+            text = text.replace(bad, good)
+        return text
+    return fix_text(text)
+
+
+def parse_block_records(content: str) -> Tuple[List[dict], List[dict]]:
+    """JSON records in a block's response, and entries describing anything that isn't one."""
+    content = html.unescape(content.replace("\x00", "").replace("\x1a", ""))
+    records, broken = [], []
+    for i, value in enumerate(extract_all_json(content), start=1):
+        for rec in value if isinstance(value, list) else [value]:
+            if isinstance(rec, dict):
+                records.append(rec)
+            else:
+                broken.append({"value_index": i, "error": "record is not a JSON object", "snippet": str(rec)[:300]})
+    if not records and content.strip():
+        broken.append({"value_index": 0, "error": "no JSON records found", "snippet": content[:300]})
+    return records, broken
+
+
+def normalize_record(rec: dict) -> Dict[str, str]:
+    return {field: normalize_text(str(rec.get(field) or "")).strip() for field in RECORD_FIELDS}
+
+
+def _write_atomic(path: str, write) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+class RecordSink:
+    """One partition (subject, unit) of the extracted-records dataset."""
+
+    def __init__(self, root: str, subject: str, unit, format: str = "jsonl"):
+        if format not in FORMATS:
+            raise ValueError(f"format must be one of {FORMATS}")
+        self.subject = subject
+        self.unit = str(unit)
+        self.format = format
+        self.partition_dir = os.path.join(root, f"subject={subject}", f"unit={self.unit}")
+        self.manifest_path = os.path.join(self.partition_dir, "_manifest.json")
+        os.makedirs(self.partition_dir, exist_ok=True)
+
+    def part_path(self, start_pg: int, end_pg: int) -> str:
+        return os.path.join(self.partition_dir, f"pages-{start_pg:05d}-{end_pg:05d}.{self.format}")
+
+    def broken_path(self, start_pg: int, end_pg: int) -> str:
+        return os.path.join(self.partition_dir, f"_broken-pages-{start_pg:05d}-{end_pg:05d}.jsonl")
+
+    def write_block(self, block_idx: int, start_pg: int, end_pg: int, content: str) -> Tuple[str, int, int]:
+        """Parse, normalize and write one block; returns (part path, records, broken entries)."""
+        records, broken = parse_block_records(content)
+        pages = f"{start_pg}-{end_pg}"
+        rows = [{"block": block_idx, "pages": pages, "seq": seq, **normalize_record(rec)}
+                for seq, rec in enumerate(records)]
+        path = self.part_path(start_pg, end_pg)
+        if self.format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            schema = pa.schema([("block", pa.int32()), ("pages", pa.string()), ("seq", pa.int32())]
+                               + [(field, pa.string()) for field in RECORD_FIELDS])
+            table = pa.Table.from_pylist(rows, schema=schema)
+            _write_atomic(path, lambda tmp: pq.write_table(table, tmp))
+        else:
+            def write(tmp):
+                with open(tmp, "w", encoding="utf-8") as f:
+                    for row in rows:
+                        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            _write_atomic(path, write)
+
+        broken_path = self.broken_path(start_pg, end_pg)
+        if broken:
+            def write_broken(tmp):
+                with open(tmp, "w", encoding="utf-8") as f:
+                    for entry in broken:
+                        f.write(json.dumps({"block": block_idx, "pages": pages, **entry}, ensure_ascii=False) + "\n")
+            _write_atomic(broken_path, write_broken)
+        elif os.path.exists(broken_path):
+            os.remove(broken_path)  # A retry of this block came back clean
+        return path, len(rows), len(broken)
+
+    # Block store interface used by pdf_extraction.extract_blocks
+    def save(self, block_idx: int, start_pg: int, end_pg: int, content: str) -> Tuple[dict, tuple]:
+        path, written, broken = self.write_block(block_idx, start_pg, end_pg, content)
+        return {"file": os.path.basename(path), "records": written, "broken": broken}, \
+            (block_idx, start_pg, end_pg, written)
+
+    def load(self, entry: dict, block_idx: int, start_pg: int, end_pg: int) -> tuple:
+        return block_idx, start_pg, end_pg, entry.get("records", 0)
+
+    def prune(self, ranges: Iterable[Tuple[int, int]]) -> int:
+        """Remove parts whose page range isn't in ranges (and block-numbered ones); returns how many."""
+        keep = {(int(start), int(end)) for start, end in ranges}
+        removed = 0
+        for name in os.listdir(self.partition_dir):
+            m = _PART.match(name) or _BROKEN.match(name)
+            if m and (int(m.group(1)), int(m.group(2))) in keep:
+                continue
+            if m or _LEGACY_PART.match(name):
+                os.remove(os.path.join(self.partition_dir, name))
+                removed += 1
+        return removed
+
+    def iter_records(self) -> Iterator[dict]:
+        return _iter_partition(self.partition_dir, self.subject, self.unit)
+
+
+def _iter_part(path: str) -> Iterator[dict]:
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _iter_partition(partition_dir: str, subject: str, unit: str) -> Iterator[dict]:
+    parts = sorted((int(m.group(1)), int(m.group(2)), name) for name in os.listdir(partition_dir)
+                   if (m := _PART.match(name)))
+    for _, _, name in parts:
+        for row in _iter_part(os.path.join(partition_dir, name)):
+            yield {"subject": subject, "unit": unit, **row}
+
+
+def _partition_value(name: str, key: str) -> Optional[str]:
+    prefix = f"{key}="
+    return name[len(prefix):] if name.startswith(prefix) else None
+
+
+def _unit_order(unit: str):
+    return (0, int(unit), "") if unit.isdigit() else (1, 0, unit)
+
+
+def iter_dataset(root: str, subject: Optional[str] = None, unit=None) -> Iterator[dict]:
+    """Rows of the whole dataset (or one subject/unit) in subject, unit, block, seq order."""
+    for subject_dir in sorted(os.listdir(root)):
+        subject_name = _partition_value(subject_dir, "subject")
+        if subject_name is None or (subject is not None and subject_name != subject):
+            continue
+        units = [(_partition_value(d, "unit"), d) for d in os.listdir(os.path.join(root, subject_dir))]
+        for unit_name, unit_dir in sorted((u for u in units if u[0] is not None), key=lambda u: _unit_order(u[0])):
+            if unit is not None and unit_name != str(unit):
+                continue
+            yield from _iter_partition(os.path.join(root, subject_dir, unit_dir), subject_name, unit_name)
+
+
+def iter_grouped(rows: Iterable[dict]) -> Iterator[dict]:
+    """
+    Merge consecutive rows of the same chapter/topic/content_type, joining their content
+    (the notebook's per-topic grouping, done in one streaming pass over ordered rows).
+    """
+    current, contents = None, []
+    for row in rows:
+        key = tuple(row.get(field, "") for field in ("subject", "unit") + GROUP_KEY)
+        if current is not None and key != current:
+            yield _group_row(current, contents)
+            contents = []
+        current = key
+        if row.get("content"):
+            contents.append(row["content"])
+    if current is not None:
+        yield _group_row(current, contents)
+
+
+def _group_row(key: tuple, contents: List[str]) -> dict:
+    return {**dict(zip(("subject", "unit") + GROUP_KEY, key)), "content": "\n\n".join(contents)}
+
+
+def write_csv(rows: Iterable[dict], path: str, fields=("subject", "unit") + RECORD_FIELDS) -> int:
+    """Stream rows to a CSV (all fields quoted, as before); returns the number written."""
+    count = 0
+
+    def write(tmp):
+        nonlocal count
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(fields), quoting=csv.QUOTE_ALL, extrasaction="ignore")
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+    _write_atomic(path, write)
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or export the extracted-records dataset")
+    parser.add_argument("root")
+    parser.add_argument("--subject", default=None)
+    parser.add_argument("--unit", default=None)
+    parser.add_argument("--csv", default=None, help="Export rows grouped by topic to this CSV")
+    args = parser.parse_args()
+
+    rows = iter_dataset(args.root, args.subject, args.unit)
+    if args.csv:
+        print(f"{write_csv(iter_grouped(rows), args.csv)} rows written to {args.csv}")
+    else:
+        counts: Dict[Tuple[str, str], int] = {}
+        for row in rows:
+            counts[(row["subject"], row["unit"])] = counts.get((row["subject"], row["unit"]), 0) + 1
+        for (subject, unit), count in counts.items():
+            print(f"{subject} unit {unit}: {count} records")
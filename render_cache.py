@@ -0,0 +1,203 @@
+import ast
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Optional, Tuple
+
+from file_lock import file_lock
+
+DEFAULT_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", ".cache/renders")
+DEFAULT_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+
+
+def manim_version() -> str:
+    # Read from package metadata so a cache lookup never imports manim itself
+    try:
+        from importlib.metadata import version
+        return version("manim")
+    except Exception:
+        return "unknown"
+
+
+def _strip_docstrings(tree: ast.AST) -> ast.AST:
+    for node in ast.walk(tree):
+        body = getattr(node, "body", None)
+        if (isinstance(body, list) and body and isinstance(body[0], ast.Expr)
+                and isinstance(body[0].value, ast.Constant) and isinstance(body[0].value.value, str)):
+            node.body = body[1:] or [ast.Pass()]
+    return tree
+
+
+def normalized_ast(script: str) -> str:
+    """AST dump of the script, independent of comments, whitespace and docstrings."""
+    tree = _strip_docstrings(ast.parse(script))
+    return ast.dump(tree, annotate_fields=False, include_attributes=False)
+
+
+def render_key(script: str, scene_name: str, resolution: Tuple[int, int],
+               version: Optional[str] = None) -> Optional[str]:
+    try:
+        source = normalized_ast(script)
+    except SyntaxError:
+        return None
+    payload = json.dumps([source, scene_name, list(resolution), version or manim_version()])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    Stores rendered PNGs by normalized scene AST, scene name, resolution and manim version.
+    manifest.json in the cache directory lists every entry for inspection. Several
+    processes may share the directory: every change re-reads and merges the manifest
+    under a file lock, so no process drops another's entries. A hit only touches the
+    PNG's mtime, and eviction removes the PNGs used least recently.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.manifest_path = os.path.join(cache_dir, "manifest.json")
+        self.lock_path = os.path.join(cache_dir, "manifest.lock")
+        self.version = manim_version()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.entries = self._load_manifest()
+
+    def _load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        # Drop entries whose PNG was removed by hand
+        return {k: v for k, v in entries.items() if os.path.exists(self._image_path(k))}
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Hold the thread and file locks, with self.entries freshly read from disk."""
+        with self._lock, file_lock(self.lock_path):
+            self.entries = self._load_manifest()
+            yield
+
+    def _save_manifest(self) -> None:
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _image_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def fetch(self, script: str, scene_name: str, resolution: Tuple[int, int],
+              output_path: Optional[str] = None) -> Optional[str]:
+        """Return a cached PNG (copied to output_path if given), or None on a miss."""
+        key = render_key(script, scene_name, resolution, self.version)
+        if key is None:
+            self.misses += 1
+            return None
+        image_path = self._image_path(key)
+        try:
+            # Hits only bump the PNG's mtime, which is what eviction orders by; no lock, no manifest write
+            os.utime(image_path)
+            if output_path:
+                os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+                shutil.copyfile(image_path, output_path)
+        except FileNotFoundError:  # Never stored, or evicted by another process meanwhile
+            self.misses += 1
+            return None
+        self.hits += 1
+        return output_path or image_path
+
+    def put(self, script: str, scene_name: str, resolution: Tuple[int, int], image_path: str) -> Optional[str]:
+        key = render_key(script, scene_name, resolution, self.version)
+        if key is None or not os.path.exists(image_path):
+            return None
+        now = time.time()
+        with self._locked():
+            tmp_path = f"{self._image_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.copyfile(image_path, tmp_path)
+            os.replace(tmp_path, self._image_path(key))
+            self.entries[key] = {
+                "scene_name": scene_name,
+                "resolution": list(resolution),
+                "manim_version": self.version,
+                "size": os.path.getsize(self._image_path(key)),
+                "source": image_path,
+                "created_at": now,
+            }
+            self._evict()
+            self._save_manifest()
+        return key
+
+    def _evict(self) -> None:
+        """Remove the least recently used PNGs (oldest mtime) until the cache fits max_bytes."""
+        total = sum(e["size"] for e in self.entries.values())
+        if total <= self.max_bytes:
+            return
+        last_used = {}
+        for key in self.entries:
+            try:
+                last_used[key] = os.path.getmtime(self._image_path(key))
+            except FileNotFoundError:
+                last_used[key] = 0.0  # Already gone; dropped first
+        for key in sorted(self.entries, key=last_used.get):
+            if total <= self.max_bytes:
+                break
+            total -= self.entries.pop(key)["size"]
+            try:
+                os.remove(self._image_path(key))
+            except FileNotFoundError:
+                pass
+
+    def clear(self) -> None:
+        with self._locked():
+            for key in list(self.entries):
+                try:
+                    os.remove(self._image_path(key))
+                except FileNotFoundError:
+                    pass
+            self.entries = {}
+            self._save_manifest()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "bytes": sum(e["size"] for e in self.entries.values()),
+        }
+
+
+_default_cache: Optional[RenderCache] = None
+_default_lock = threading.Lock()
+
+
+def get_default_render_cache() -> RenderCache:
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = RenderCache()
+        return _default_cache
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect the render cache manifest")
+    parser.add_argument("--dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--clear", action="store_true", help="Remove every cached render")
+    args = parser.parse_args()
+
+    cache = RenderCache(args.dir)
+    if args.clear:
+        cache.clear()
+        print("Render cache cleared.")
+    else:
+        print(json.dumps(cache.entries, indent=4))
+        print(json.dumps(cache.stats(), indent=4))
@@ -0,0 +1,249 @@
+import multiprocessing as mp
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+from typing import Optional, Tuple
+
+from pydantic import BaseModel
+
+from tex_cache import DEFAULT_CACHE_DIR as TEX_CACHE_DIR
+
+DEFAULT_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", 120))
+DEFAULT_MEMORY_MB = int(os.getenv("RENDER_MEMORY_MB", 4096))
+DEFAULT_RESOLUTION = (3840, 2160)
+# Draft renders only need to tell whether the script runs
+DRAFT_RESOLUTION = (480, 270)
+
+
+class RenderResult(BaseModel):
+    success: bool
+    image_path: Optional[str] = None
+    error_type: Optional[str] = None
+    error_message: Optional[str] = None
+    traceback: Optional[str] = None
+    duration: float = 0.0
+
+    def error_log(self) -> str:
+        """Text in the shape of manim's stderr, for the refinement prompt."""
+        if self.success:
+            return ""
+        return self.traceback or f"{self.error_type}: {self.error_message}"
+
+
+def default_worker_count() -> int:
+    return int(os.getenv("RENDER_WORKERS", 0)) or os.cpu_count() or 1
+
+
+def _limit_memory(memory_mb: int) -> None:
+    try:
+        import resource
+    except ImportError:  # Windows: no RLIMIT_AS, rely on the timeout
+        return
+    limit = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _render_job(manim, job: dict) -> dict:
+    """
+    Exec the script in a fresh namespace and save the last frame of the scene as PNG.
+    With job["dry_run"] the scene is constructed and played but nothing is written.
+    The script runs inside tempconfig, so module-level config.* assignments in it
+    are undone afterwards instead of leaking into the worker's later jobs.
+    """
+    width, height = job["resolution"]
+    render_config = {
+        "pixel_width": width,
+        "pixel_height": height,
+        "save_last_frame": True,
+        "write_to_movie": False,
+        "format": "png",
+        "media_dir": job["media_dir"],
+        "disable_caching": True,
+        "verbosity": "ERROR",
+        "progress_bar": "none",
+    }
+    if job.get("dry_run"):
+        # Applied last: manim's dry_run setter turns off every kind of output
+        render_config["dry_run"] = True
+    with manim.tempconfig(render_config):
+        namespace = {"__name__": "__generated_scene__", "__file__": job["script_path"]}
+        exec(compile(job["script"], job["script_path"], "exec"), namespace)
+        scene_cls = namespace.get(job["scene_name"])
+        if scene_cls is None:
+            raise NameError(f"Scene class '{job['scene_name']}' not defined in script")
+        # The script may set other options (background colour etc.), but not these
+        manim.config.update(render_config)
+        scene = scene_cls()
+        scene.render()
+        if job.get("dry_run"):
+            return {"image_path": None}
+        rendered = str(scene.renderer.file_writer.image_file_path)
+
+    output_path = job.get("output_path")
+    if output_path and os.path.abspath(rendered) != os.path.abspath(output_path):
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        shutil.move(rendered, output_path)
+        rendered = output_path
+    return {"image_path": rendered}
+
+
+def _worker_main(conn, memory_mb: int, tex_cache_dir: Optional[str]) -> None:
+    # Paid once per worker instead of once per render
+    _limit_memory(memory_mb)
+    import manim
+
+    from manim_linter import write_api_snapshot
+
+    try:
+        write_api_snapshot(manim)  # Lets the orchestrator lint against manim without importing it
+    except Exception as e:
+        print(f"Could not write the manim API snapshot: {e}")
+
+    if tex_cache_dir:
+        from tex_cache import TexCache, install
+
+        install(manim, TexCache(tex_cache_dir), scratch_dir=tempfile.mkdtemp(prefix="manim-tex-"))
+
+    conn.send({"ready": True})
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        start = time.perf_counter()
+        try:
+            result = _render_job(manim, job)
+            result.update(success=True)
+        except BaseException as e:  # SystemExit/MemoryError from generated code must not kill the worker
+            result = {
+                "success": False,
+                "error_type": type(e).__name__,
+                "error_message": str(e),
+                "traceback": traceback.format_exc(),
+            }
+        result["duration"] = time.perf_counter() - start
+        conn.send(result)
+
+
+# Workers are (re)started from request threads; a forked child could inherit a lock
+# another thread holds (rate limiter, sqlite, an import in progress) and deadlock
+_mp = mp.get_context("spawn")
+
+
+class _Worker:
+    def __init__(self, memory_mb: int, tex_cache_dir: Optional[str]):
+        self.conn, child_conn = _mp.Pipe()
+        self.process = _mp.Process(target=_worker_main, args=(child_conn, memory_mb, tex_cache_dir), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout: float) -> bool:
+        if not self.ready and self.conn.poll(timeout):
+            self.ready = self.conn.recv().get("ready", False)
+        return self.ready
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(5)
+        self.conn.close()
+
+
+class RenderPool:
+    """
+    Pool of long-lived worker processes with manim already imported.
+    render() is thread-safe: each call borrows an idle worker, and a worker
+    that times out or dies is replaced with a fresh one.
+    Workers share the TeX -> SVG cache in tex_cache_dir (None: manim's own per-media-dir one).
+    """
+
+    def __init__(self, workers: Optional[int] = None, memory_mb: int = DEFAULT_MEMORY_MB,
+                 media_dir: str = "media", startup_timeout: float = 120.0,
+                 tex_cache_dir: Optional[str] = TEX_CACHE_DIR):
+        self.size = workers or default_worker_count()
+        self.memory_mb = memory_mb
+        self.tex_cache_dir = os.path.abspath(tex_cache_dir) if tex_cache_dir else None
+        self.media_dir = media_dir
+        self.startup_timeout = startup_timeout
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._closed = False
+        for _ in range(self.size):
+            self._idle.put(_Worker(memory_mb, self.tex_cache_dir))
+
+    def render(self, script: str, scene_name: str, output_path: Optional[str] = None,
+               resolution: Tuple[int, int] = DEFAULT_RESOLUTION, timeout: float = DEFAULT_TIMEOUT,
+               script_path: str = "<generated_manim_script>", dry_run: bool = False,
+               media_dir: Optional[str] = None) -> RenderResult:
+        """media_dir overrides the pool's, e.g. so concurrent jobs don't share manim's intermediate files."""
+        if self._closed:
+            raise RuntimeError("RenderPool is closed")
+        worker = self._idle.get()
+        start = time.perf_counter()
+        try:
+            if not worker.wait_ready(self.startup_timeout):
+                raise RuntimeError("Render worker failed to start")
+            worker.conn.send({
+                "script": script,
+                "script_path": script_path,
+                "scene_name": scene_name,
+                "output_path": output_path,
+                "resolution": tuple(resolution),
+                "media_dir": media_dir or self.media_dir,
+                "dry_run": dry_run,
+            })
+            if not worker.conn.poll(timeout):
+                worker.kill()
+                worker = _Worker(self.memory_mb, self.tex_cache_dir)
+                return RenderResult(success=False, error_type="TimeoutError",
+                                    error_message=f"Render exceeded {timeout}s",
+                                    duration=time.perf_counter() - start)
+            return RenderResult(**worker.conn.recv())
+        except (EOFError, OSError, RuntimeError) as e:
+            # Worker crashed (e.g. hit the memory cap inside native code)
+            worker.kill()
+            worker = _Worker(self.memory_mb, self.tex_cache_dir)
+            return RenderResult(success=False, error_type="WorkerCrashed",
+                                error_message=str(e) or "Render worker exited unexpectedly",
+                                duration=time.perf_counter() - start)
+        finally:
+            self._idle.put(worker)
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.process.join(5)
+            worker.kill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default_pool: Optional[RenderPool] = None
+_default_lock = threading.Lock()
+
+
+def get_default_pool() -> RenderPool:
+    """Render pool shared by every caller in the process."""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = RenderPool()
+        return _default_pool
@@ -0,0 +1,221 @@
+"""
+Offline quality check for rendered Manim frames.
+
+Flags the usual ways a render that ran without errors is still unusable:
+
+- blank: (almost) nothing differs from the background colour
+- clipped: content runs into one or more frame edges
+- overlap: regions with far more stroke edges than text or shapes produce
+  alone, which is what overlapping labels and formulas look like
+- low contrast: the content is hard to tell from the background (WCAG ratio)
+
+Each check is a handful of NumPy operations on the frame. 4K PNGs are decoded
+at reduced size by OpenCV, so one frame scores in milliseconds.
+
+    python score_manim_images.py output.png [attempt]
+    python score_manim_images.py media/images/ --workers 8 --output scores.json
+
+Exits 1 if any image failed.
+"""
+import concurrent.futures
+import json
+import os
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Frames are scored at about this width; cells and margins scale with it
+TARGET_WIDTH = 960
+GRID_COLUMNS = 30
+EDGE_MARGIN = 2  # px at scoring size
+
+FOREGROUND_DELTA = 0.1  # Max channel difference from the background to count as content
+BLANK_COVERAGE = 0.0005
+CLIP_OCCUPANCY = 0.005  # Share of an edge strip covered by content
+EDGE_DELTA = 0.12
+DENSE_CELL = 0.5  # Share of a cell's pixels that are edges
+MIN_CONTRAST = 3.0
+PASS_SCORE = 0.7
+
+EDGES = ("top", "bottom", "left", "right")
+_LUMA = np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+
+
+def png_size(path: str) -> Optional[Tuple[int, int]]:
+    """(width, height) from the PNG header, without decoding the image."""
+    with open(path, "rb") as f:
+        header = f.read(24)
+    if len(header) < 24 or header[:8] != b"\x89PNG\r\n\x1a\n":
+        return None
+    return struct.unpack(">II", header[16:24])
+
+
+def load_image(path: str, target_width: int = TARGET_WIDTH) -> Tuple[np.ndarray, int]:
+    """RGB float32 image in [0, 1], decoded at 1/2, 1/4 or 1/8 size when that's still >= target_width."""
+    import cv2
+
+    size = png_size(path)
+    factor = 1
+    while size and size[0] // (factor * 2) >= target_width and factor < 8:
+        factor *= 2
+    flags = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+             4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+    image = cv2.imread(path, flags[factor])
+    if image is None:
+        raise ValueError(f"cannot decode {path}")
+    return image[..., ::-1].astype(np.float32) / 255.0, factor
+
+
+def relative_luminance(rgb: np.ndarray) -> np.ndarray:
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    return linear @ _LUMA
+
+
+def contrast_ratio(l1: float, l2: float) -> float:
+    return (max(l1, l2) + 0.05) / (min(l1, l2) + 0.05)
+
+
+def _dense_regions(dense: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """Bounding boxes (in cells: row0, col0, row1, col1) of 4-connected groups of dense cells."""
+    seen = np.zeros_like(dense)
+    regions = []
+    for r, c in zip(*np.nonzero(dense)):
+        if seen[r, c]:
+            continue
+        stack, box = [(r, c)], [r, c, r, c]
+        seen[r, c] = True
+        while stack:
+            y, x = stack.pop()
+            box = [min(box[0], y), min(box[1], x), max(box[2], y), max(box[3], x)]
+            for ny, nx in ((y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)):
+                if 0 <= ny < dense.shape[0] and 0 <= nx < dense.shape[1] and dense[ny, nx] and not seen[ny, nx]:
+                    seen[ny, nx] = True
+                    stack.append((ny, nx))
+        regions.append(tuple(int(v) for v in box))
+    return regions
+
+
+def score_array(rgb: np.ndarray, scale: int = 1) -> dict:
+    """Scores for an RGB float image; region boxes are multiplied by scale (the decode factor)."""
+    h, w = rgb.shape[:2]
+    border = np.concatenate([rgb[0], rgb[-1], rgb[:, 0], rgb[:, -1]])
+    background = np.median(border, axis=0)
+    diff = np.abs(rgb - background.astype(np.float32))
+    mask = np.maximum(np.maximum(diff[..., 0], diff[..., 1]), diff[..., 2]) > FOREGROUND_DELTA  # Faster than max(axis=2)
+    coverage = float(mask.mean())
+    blank = coverage < BLANK_COVERAGE
+
+    m = EDGE_MARGIN
+    occupancy = {"top": mask[:m].mean(), "bottom": mask[-m:].mean(),
+                 "left": mask[:, :m].mean(), "right": mask[:, -m:].mean()}
+    touched = [edge for edge in EDGES if occupancy[edge] > CLIP_OCCUPANCY]
+    # Content on all four edges is a full-frame background (NumberPlane, Axes), not clipping
+    clipped = [] if len(touched) == len(EDGES) else touched
+
+    contrast = None
+    if mask.any():
+        foreground = np.percentile(relative_luminance(rgb[mask]), 90)
+        contrast = contrast_ratio(float(foreground), float(relative_luminance(background)))
+    low_contrast = contrast is not None and contrast < MIN_CONTRAST
+
+    gray = rgb @ _LUMA
+    edges = np.zeros((h, w), dtype=bool)
+    edges[1:, 1:] = (np.abs(gray[1:, 1:] - gray[:-1, 1:]) + np.abs(gray[1:, 1:] - gray[1:, :-1])) > EDGE_DELTA
+    cell = max(4, w // GRID_COLUMNS)
+    rows, cols = h // cell, w // cell
+    density = edges[:rows * cell, :cols * cell].reshape(rows, cell, cols, cell).mean(axis=(1, 3))
+    regions = [[c0 * cell * scale, r0 * cell * scale, (c1 + 1) * cell * scale, (r1 + 1) * cell * scale]
+               for r0, c0, r1, c1 in _dense_regions(density > DENSE_CELL)]
+
+    issues = []
+    if blank:
+        issues.append(f"Frame is blank or nearly blank ({coverage:.2%} of pixels differ from the background)")
+    if clipped:
+        issues.append(f"Content is cut off at the {', '.join(clipped)} edge(s) of the frame")
+    if regions:
+        issues.append(f"{len(regions)} region(s) look like overlapping text or shapes: {regions}")
+    if low_contrast:
+        issues.append(f"Low contrast between content and background (ratio {contrast:.2f} < {MIN_CONTRAST})")
+
+    score = 0.0 if blank else max(0.0, 1.0 - 0.25 * len(clipped) - 0.15 * min(len(regions), 3)
+                                  - (0.3 if low_contrast else 0.0))
+    return {
+        "width": w * scale,
+        "height": h * scale,
+        "coverage": round(coverage, 5),
+        "blank": blank,
+        "edge_occupancy": {edge: round(float(v), 4) for edge, v in occupancy.items()},
+        "clipped_edges": clipped,
+        "contrast_ratio": round(contrast, 2) if contrast is not None else None,
+        "low_contrast": low_contrast,
+        "max_edge_density": round(float(density.max()), 3) if density.size else 0.0,
+        "overlap_regions": regions,
+        "issues": issues,
+        "score": round(score, 3),
+        "passed": not blank and score >= PASS_SCORE,
+    }
+
+
+def score_image(path: str) -> dict:
+    start = time.perf_counter()
+    rgb, factor = load_image(path)
+    result = {"path": path, **score_array(rgb, factor)}
+    result["scored_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+def _score_or_error(path: str) -> dict:
+    try:
+        return score_image(path)
+    except (OSError, ValueError) as e:
+        return {"path": path, "error": str(e), "passed": False, "score": 0.0, "issues": [str(e)]}
+
+
+def score_paths(paths: List[str], workers: Optional[int] = None) -> List[dict]:
+    """Score many images on a thread pool (OpenCV decoding and NumPy release the GIL)."""
+    if len(paths) <= 1:
+        return [_score_or_error(p) for p in paths]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        return list(executor.map(_score_or_error, paths))
+
+
+def find_images(directory: str) -> List[str]:
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(directory)
+                  for name in names if name.lower().endswith(".png"))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Score rendered Manim frames for blank, clipped, "
+                                                 "overlapping and low-contrast content")
+    parser.add_argument("paths", nargs="+", help="PNG files or directories; a trailing number is the attempt")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=None, help="Write the JSON scores here instead of stdout")
+    args = parser.parse_args()
+
+    attempt: Optional[int] = None
+    if len(args.paths) > 1 and args.paths[-1].isdigit():  # debugging_agent: score_manim_images.py <image> <attempt>
+        attempt = int(args.paths.pop())
+    images: List[str] = []
+    for path in args.paths:
+        images.extend(find_images(path) if os.path.isdir(path) else [path])
+
+    start = time.perf_counter()
+    scores: List[Dict] = score_paths(images, args.workers)
+    if attempt is not None:
+        for entry in scores:
+            entry["attempt"] = attempt
+    text = json.dumps(scores[0] if len(scores) == 1 and not os.path.isdir(args.paths[0]) else scores, indent=4)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    failed = [s for s in scores if not s["passed"]]
+    print(f"Scored {len(scores)} image(s) in {time.perf_counter() - start:.2f}s, {len(failed)} failed",
+          file=sys.stderr)
+    sys.exit(1 if failed else 0)
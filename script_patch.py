@@ -0,0 +1,145 @@
+import re
+from typing import List, Optional, Sequence, Set, Tuple
+
+SCRIPT_HINTS = ("generated_manim_script", "__generated_scene__")
+CONTEXT_RADIUS = 3
+MAX_LOG_CHARS = 2000
+
+PATCH_INSTRUCTIONS = """
+Reply with ONLY a unified diff against the script, inside a ```diff block.
+Use the line numbers shown above in the @@ hunk headers, include 2-3 unchanged context lines
+around every change, and do not resend unchanged parts of the script.
+"""
+
+_FRAME_RE = re.compile(r'File "([^"]+)", line (\d+)')
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(Exception):
+    """The model's diff could not be applied to the script."""
+
+
+def number_lines(script: str, line_numbers: Optional[Set[int]] = None) -> str:
+    """Script with line numbers; only the given lines when line_numbers is set."""
+    lines = script.splitlines()
+    width = len(str(len(lines)))
+    out, previous = [], 0
+    for number, line in enumerate(lines, start=1):
+        if line_numbers is not None and number not in line_numbers:
+            continue
+        if line_numbers is not None and previous and number != previous + 1:
+            out.append("...")
+        out.append(f"{number:>{width}}| {line}")
+        previous = number
+    return "\n".join(out)
+
+
+def trim_error_log(log: str, hints: Sequence[str] = SCRIPT_HINTS,
+                   max_chars: int = MAX_LOG_CHARS) -> Tuple[str, List[int]]:
+    """
+    Reduce a traceback to the frames inside the generated script, the innermost
+    frame and the final exception, and return the script line numbers the frames point at.
+    """
+    lines = log.strip().splitlines()
+    frames = []  # (text lines, is in script, script line number)
+    for i, line in enumerate(lines):
+        match = _FRAME_RE.search(line)
+        if not match:
+            continue
+        text = [line.strip()]
+        # The frame's source line follows the "File ..." line
+        if i + 1 < len(lines) and not _FRAME_RE.search(lines[i + 1]):
+            text.append(lines[i + 1].strip())
+        in_script = any(h in match.group(1) for h in hints)
+        frames.append((text, in_script, int(match.group(2))))
+
+    if not frames:
+        # Not a traceback (e.g. lint findings): already short, keep its "line N" references
+        trimmed = log.strip()
+        script_lines = [int(n) for n in re.findall(r"\bline (\d+)", log)]
+    else:
+        kept = [f for f in frames if f[1]]
+        if not frames[-1][1]:
+            kept.append(frames[-1])
+        # Final exception: the non-blank lines after the last frame
+        last = max(i for i, l in enumerate(lines) if _FRAME_RE.search(l))
+        tail = [l.rstrip() for l in lines[last + 2:] if l.strip()][-5:]
+        trimmed = "\n".join([line for text, _, _ in kept for line in text] + tail)
+        script_lines = [number for _, in_script, number in frames if in_script]
+
+    if len(trimmed) > max_chars:
+        trimmed = trimmed[:max_chars // 2] + "\n...\n" + trimmed[-max_chars // 2:]
+    return trimmed, script_lines
+
+
+def context_lines(script: str, lines: Sequence[int], radius: int = CONTEXT_RADIUS) -> Set[int]:
+    total = len(script.splitlines())
+    wanted = set()
+    for number in lines:
+        wanted.update(range(max(1, number - radius), min(total, number + radius) + 1))
+    return wanted
+
+
+def extract_diff(response_text: str) -> Optional[str]:
+    fenced = re.search(r"```(?:diff|patch)?\s*\n(.*?)```", response_text, re.DOTALL)
+    text = fenced.group(1) if fenced else response_text
+    return text if re.search(r"^@@ ", text, re.MULTILINE) else None
+
+
+def _parse_hunks(diff: str) -> List[Tuple[int, List[str], List[str]]]:
+    hunks, current = [], None
+    for line in diff.splitlines():
+        header = _HUNK_RE.match(line)
+        if header:
+            current = (int(header.group(1)), [], [])
+            hunks.append(current)
+            continue
+        if current is None or line.startswith(("---", "+++", "\\")):
+            continue
+        _, old, new = current
+        if line.startswith("-"):
+            old.append(line[1:])
+        elif line.startswith("+"):
+            new.append(line[1:])
+        else:
+            # Context line; models often drop the leading space on blank lines
+            text = line[1:] if line.startswith(" ") else line
+            old.append(text)
+            new.append(text)
+    # Blank lines separating hunks are not context
+    for _, old, new in hunks:
+        while old and new and old[-1] == new[-1] == "":
+            old.pop()
+            new.pop()
+    return hunks
+
+
+def _find(lines: List[str], block: List[str], expected: int) -> Optional[int]:
+    """Index where block matches lines, searching outward from the expected position."""
+    stripped = [l.rstrip() for l in block]
+    for distance in range(len(lines) + 1):
+        for start in (expected - distance, expected + distance):
+            if 0 <= start <= len(lines) - len(block) and \
+                    [l.rstrip() for l in lines[start:start + len(block)]] == stripped:
+                return start
+    return None
+
+
+def apply_unified_diff(script: str, diff: str) -> str:
+    """Apply a unified diff, tolerating shifted line numbers. Raises PatchError on mismatch."""
+    hunks = _parse_hunks(diff)
+    if not hunks:
+        raise PatchError("No hunks found in diff")
+    lines = script.splitlines()
+    delta = 0
+    for old_start, old, new in hunks:
+        expected = max(0, old_start - 1 + delta)
+        if not old:
+            index = min(old_start + delta, len(lines))
+        else:
+            index = _find(lines, old, expected)
+            if index is None:
+                raise PatchError(f"Hunk at line {old_start} does not match the script")
+        lines[index:index + len(old)] = new
+        delta += len(new) - len(old)
+    return "\n".join(lines) + ("\n" if script.endswith("\n") else "")
@@ -0,0 +1,396 @@
+"""
+Similarity cache for stage results (topic analyses, visual plans).
+
+The exact LLM cache only helps when a prompt repeats byte for byte, but the same
+topic keeps arriving as variants: "Equality of Vectors" for grade 11, "Vector
+equality" in another chapter. Each entry here is stored with a vector of its
+query text; a lookup returns the most similar entries by cosine similarity, and
+the agent either reuses a close match outright or passes it to the model as a
+seed to adapt.
+
+By default vectors are character n-gram counts hashed into a fixed width and
+weighted by TF-IDF over the entries in the cache, so no embedding model or API
+call is needed. Any object with `name`, `use_idf` and `embed(texts)` can be
+plugged in instead (see GeminiEmbedder).
+
+Vectors are kept sparse (the non-zero n-gram buckets of a short title are a few
+hundred of 16384). Entries are evicted by TTL and least recent use and persisted
+to an append-only JSONL log: put() appends one line under a file lock, after
+reading the lines other processes appended, so concurrent pipelines share
+entries instead of overwriting each other's file. Every COMPACT_EVERY appends
+(or on save()) the log is rewritten atomically without replaced or evicted entries.
+"""
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from file_lock import file_lock
+
+DEFAULT_CACHE_DIR = os.getenv("SEMANTIC_CACHE_DIR", ".cache/semantic")
+DEFAULT_REUSE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_REUSE", 0.9))
+DEFAULT_SEED_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_SEED", 0.55))
+DEFAULT_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 5000))
+DEFAULT_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL", 30 * 24 * 3600))
+COMPACT_EVERY = 256  # Appended lines after which the log is rewritten without replaced or evicted entries
+
+_PRIME = np.uint64((1 << 31) - 1)
+_BASE = 257
+
+
+def _disabled_from_env() -> bool:
+    return os.getenv("SEMANTIC_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+
+
+def normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w]+", " ", (text or "").lower()).split())
+
+
+class NgramEmbedder:
+    """Hashed character n-gram counts with sublinear TF; the cache applies IDF."""
+
+    use_idf = True
+
+    def __init__(self, ngram_range: Tuple[int, int] = (3, 5), dim: int = 1 << 14):
+        self.ngram_range = ngram_range
+        self.dim = dim
+
+    @property
+    def name(self) -> str:
+        return f"ngram-{self.ngram_range[0]}-{self.ngram_range[1]}-{self.dim}"
+
+    def _vector(self, text: str) -> np.ndarray:
+        data = np.frombuffer(f" {normalize(text)} ".encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+        counts = np.zeros(self.dim, dtype=np.float32)
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            if len(data) < n:
+                break
+            windows = np.lib.stride_tricks.sliding_window_view(data, n)
+            powers = np.uint64(_BASE) ** np.arange(n - 1, -1, -1, dtype=np.uint64)
+            buckets = ((windows * powers).sum(axis=1) % _PRIME) % np.uint64(self.dim)
+            counts += np.bincount(buckets.astype(np.int64), minlength=self.dim).astype(np.float32)
+        nonzero = counts > 0
+        counts[nonzero] = 1 + np.log(counts[nonzero])
+        return counts
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not len(texts):
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.stack([self._vector(t) for t in texts])
+
+
+class GeminiEmbedder:
+    """Dense embeddings from the Gemini embedding API (one request per embed() call)."""
+
+    use_idf = False
+
+    def __init__(self, model: str = "models/text-embedding-004"):
+        self.model = model
+
+    @property
+    def name(self) -> str:
+        return self.model
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        from gemini_client import configure
+
+        result = configure().embed_content(model=self.model, content=list(texts),
+                                           task_type="semantic_similarity")
+        return np.asarray(result["embedding"], dtype=np.float32).reshape(len(texts), -1)
+
+
+class SemanticMatch(NamedTuple):
+    similarity: float
+    text: str
+    value: dict
+    meta: dict
+
+
+def _sparse(vector: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    indices = np.flatnonzero(vector).astype(np.int32)
+    return indices, vector[indices].astype(np.float32)
+
+
+def _entry_key(text: str, meta: dict) -> str:
+    return json.dumps([text, meta], sort_keys=True, ensure_ascii=False)
+
+
+class SemanticCache:
+    """Stage results keyed by query text, looked up by cosine similarity of their vectors."""
+
+    def __init__(self, path: Optional[str] = None, embedder=None,
+                 reuse_threshold: float = DEFAULT_REUSE_THRESHOLD,
+                 seed_threshold: float = DEFAULT_SEED_THRESHOLD,
+                 max_entries: Optional[int] = DEFAULT_MAX_ENTRIES,
+                 ttl: Optional[float] = DEFAULT_TTL_SECONDS, bypass: Optional[bool] = None):
+        self.path = path
+        self.embedder = embedder or NgramEmbedder()
+        self.reuse_threshold = reuse_threshold
+        self.seed_threshold = seed_threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bypass = _disabled_from_env() if bypass is None else bypass
+        self.reuses = 0
+        self.seeds = 0
+        self.misses = 0
+        self.entries: List[dict] = []  # With the sparse vector as "indices"/"values" arrays
+        self._positions: Dict[str, int] = {}  # _entry_key -> index in entries
+        self._index: Optional[tuple] = None  # (rows, indices, weighted values, row norms); rebuilt after changes
+        self._idf: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._lock_path = f"{path}.lock" if path else None
+        self._log_id: Optional[tuple] = None  # (device, inode) of the log file read so far
+        self._offset = 0  # Bytes of the log already applied
+        self._appended = 0  # Lines this process appended since the log was last compacted
+        if path and os.path.exists(path):
+            with self._lock, file_lock(self._lock_path):
+                self._read_log()
+                self._evict()
+
+    def _read_log(self) -> bool:
+        """
+        Apply lines appended to the log (by any process) since it was last read; if another
+        process compacted it meanwhile, start over from the new file. Returns whether the
+        log ends in a complete line. Lines are written whole and the log is only ever
+        replaced atomically, so this needs self._lock but not the file lock.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                st = os.fstat(f.fileno())
+                if (st.st_dev, st.st_ino) != self._log_id or st.st_size < self._offset:
+                    self.entries, self._positions, self._index = [], {}, None
+                    self._log_id, self._offset = (st.st_dev, st.st_ino), 0
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            self._log_id, self._offset = None, 0
+            return True
+        end = data.rfind(b"\n") + 1  # A partial last line was left by a writer that died
+        self._offset += end
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("embedder") == self.embedder.name:  # Other embedders' vectors can't be compared
+                self._add(record)
+        return end == len(data)
+
+    def _add(self, record: dict) -> None:
+        vector = record.pop("vector")
+        entry = {**{k: v for k, v in record.items() if k != "embedder"},
+                 "indices": np.asarray(vector["i"], dtype=np.int32),
+                 "values": np.asarray(vector["v"], dtype=np.float32)}
+        key = _entry_key(entry["text"], entry["meta"])
+        if key in self._positions:
+            self.entries[self._positions[key]] = entry
+        else:
+            self._positions[key] = len(self.entries)
+            self.entries.append(entry)
+        self._index = None
+
+    def _record(self, entry: dict) -> dict:
+        record = {k: v for k, v in entry.items() if k not in ("indices", "values")}
+        return {"embedder": self.embedder.name, **record,
+                "vector": {"i": entry["indices"].tolist(), "v": [round(float(v), 5) for v in entry["values"]]}}
+
+    def _compact(self) -> None:
+        """Rewrite the log with only the live entries (replaced and evicted ones dropped). Needs both locks."""
+        self._read_log()
+        self._evict()
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self.entries:
+                f.write(json.dumps(self._record(entry), ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        st = os.stat(self.path)
+        self._log_id, self._offset, self._appended = (st.st_dev, st.st_ino), st.st_size, 0
+
+    def save(self) -> None:
+        """Merge what other processes appended and rewrite the log compactly."""
+        if not self.path:
+            return
+        with self._lock, file_lock(self._lock_path):
+            self._compact()
+
+    def _remove(self, keep: np.ndarray) -> None:
+        self.entries = [e for e, k in zip(self.entries, keep) if k]
+        self._positions = {_entry_key(e["text"], e["meta"]): i for i, e in enumerate(self.entries)}
+        self._index = None
+
+    def _expire(self) -> None:
+        if self.ttl is not None and self.entries:
+            cutoff = time.time() - self.ttl
+            keep = np.array([e["created_at"] >= cutoff for e in self.entries])
+            if not keep.all():
+                self._remove(keep)
+
+    def _evict(self) -> None:
+        """Drop expired entries, then the least recently used ones beyond max_entries."""
+        self._expire()
+        if self.max_entries is not None and len(self.entries) > self.max_entries:
+            accessed = np.array([e["accessed_at"] for e in self.entries])
+            keep = np.zeros(len(self.entries), dtype=bool)
+            keep[np.argsort(-accessed, kind="stable")[:self.max_entries]] = True
+            self._remove(keep)
+
+    def _build_index(self, dim: int) -> tuple:
+        if self._index is None:
+            lengths = np.array([len(e["indices"]) for e in self.entries])
+            rows = np.repeat(np.arange(len(self.entries)), lengths)
+            indices = np.concatenate([e["indices"] for e in self.entries])
+            values = np.concatenate([e["values"] for e in self.entries])
+            if self.embedder.use_idf:
+                df = np.bincount(indices, minlength=dim)[:dim]
+                self._idf = (np.log((1 + len(self.entries)) / (1 + df)) + 1).astype(np.float32)
+                values = values * self._idf[indices]
+            norms = np.sqrt(np.bincount(rows, weights=values * values, minlength=len(self.entries)))
+            self._index = (rows, indices, values, np.where(norms > 0, norms, 1))
+        return self._index
+
+    def lookup(self, text: str, k: int = 3, **where) -> List[SemanticMatch]:
+        """The k most similar entries (best first) whose meta agrees with every `where` field."""
+        if self.bypass:
+            return []
+        query = self.embedder.embed([text])[0]
+        with self._lock:
+            if self.path:
+                self._read_log()  # Pick up what other processes stored
+            if not self.entries:
+                return []
+            rows, indices, values, norms = self._build_index(len(query))
+            if self.embedder.use_idf:
+                query = query * self._idf
+            query = query / (np.linalg.norm(query) or 1)
+            # Sparse rows x dense query: only the entries' non-zero dimensions are touched
+            scores = np.bincount(rows, weights=values * query[indices], minlength=len(self.entries)) / norms
+            if where:
+                allowed = np.array([all(e["meta"].get(f) == v for f, v in where.items()) for e in self.entries])
+                scores = np.where(allowed, scores, -np.inf)
+            top = np.argsort(-scores, kind="stable")[:k]
+            now = time.time()
+            matches = []
+            for i in top.tolist():
+                if not np.isfinite(scores[i]):
+                    break
+                entry = self.entries[i]
+                entry["accessed_at"] = now
+                matches.append(SemanticMatch(float(scores[i]), entry["text"], entry["value"], entry["meta"]))
+            return matches
+
+    def find(self, text: str, **same) -> Tuple[Optional[str], Optional[SemanticMatch]]:
+        """
+        ("reuse", match) when the best entry is above reuse_threshold and its meta agrees
+        with every `same` field, ("seed", match) when it is above seed_threshold, else (None, None).
+        """
+        matches = self.lookup(text, k=1)
+        if matches and matches[0].similarity >= self.reuse_threshold \
+                and all(matches[0].meta.get(f) == v for f, v in same.items()):
+            self.reuses += 1
+            return "reuse", matches[0]
+        if same and matches and matches[0].similarity >= self.reuse_threshold:
+            # The closest entry is for another grade; a reusable one may still be further down
+            for match in self.lookup(text, k=1, **same):
+                if match.similarity >= self.reuse_threshold:
+                    self.reuses += 1
+                    return "reuse", match
+        if matches and matches[0].similarity >= self.seed_threshold:
+            self.seeds += 1
+            return "seed", matches[0]
+        self.misses += 1
+        return None, None
+
+    def put(self, text: str, value: dict, **meta) -> None:
+        """Store value for text (replacing an entry with the same text and meta) and append it to the log."""
+        if self.bypass:
+            return
+        indices, values = _sparse(self.embedder.embed([text])[0])
+        now = time.time()
+        record = {"embedder": self.embedder.name, "text": text, "value": value, "meta": meta,
+                  "created_at": now, "accessed_at": now,
+                  "vector": {"i": indices.tolist(), "v": [round(float(v), 5) for v in values]}}
+        with self._lock:
+            if not self.path:
+                self._add(record)
+                self._evict()
+                return
+            with file_lock(self._lock_path):
+                complete = self._read_log()  # Entries other processes added meanwhile
+                line = ("" if complete else "\n") + json.dumps(record, ensure_ascii=False) + "\n"
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, "ab") as f:
+                    f.write(line.encode("utf-8"))
+                    st = os.fstat(f.fileno())
+                self._log_id, self._offset = (st.st_dev, st.st_ino), st.st_size
+                self._appended += 1
+                self._add(record)
+                self._evict()
+                if self._appended >= COMPACT_EVERY:
+                    self._compact()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries, self._positions, self._index = [], {}, None
+            if self.path:
+                with file_lock(self._lock_path):
+                    if os.path.exists(self.path):
+                        os.remove(self.path)
+                    self._log_id, self._offset, self._appended = None, 0, 0
+
+    def stats(self) -> dict:
+        lookups = self.reuses + self.seeds + self.misses
+        return {
+            "entries": len(self.entries),
+            "reuses": self.reuses,
+            "seeds": self.seeds,
+            "misses": self.misses,
+            "reuse_rate": self.reuses / lookups if lookups else 0.0,
+            "embedder": self.embedder.name,
+            "bypass": self.bypass,
+        }
+
+
+_default_caches: Dict[str, SemanticCache] = {}
+_default_lock = threading.Lock()
+
+
+def get_default_semantic_cache(kind: str) -> SemanticCache:
+    """Process-wide cache for one kind of result ("topic_analysis", "visual_plan")."""
+    with _default_lock:
+        if kind not in _default_caches:
+            _default_caches[kind] = SemanticCache(os.path.join(DEFAULT_CACHE_DIR, f"{kind}.jsonl"))
+        return _default_caches[kind]
+
+
+def set_default_semantic_cache(kind: str, cache: Optional[SemanticCache]) -> None:
+    """Replace the cache for kind (None to recreate it from the environment on next use)."""
+    with _default_lock:
+        if cache is None:
+            _default_caches.pop(kind, None)
+        else:
+            _default_caches[kind] = cache
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query or clear a semantic cache")
+    parser.add_argument("kind", choices=["topic_analysis", "visual_plan"])
+    parser.add_argument("query", nargs="?", help="Show the entries most similar to this text")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--clear", action="store_true")
+    args = parser.parse_args()
+
+    cache = get_default_semantic_cache(args.kind)
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {cache.path}")
+    elif args.query:
+        for match in cache.lookup(args.query, k=args.k):
+            print(f"{match.similarity:.3f}  {match.text!r}  {match.meta}")
+    else:
+        print(json.dumps(cache.stats(), indent=4))
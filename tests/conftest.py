@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the top-level modules directly, as the scripts do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rate_limiter  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiter():
+    """Full request buckets for every test; the shared limiter would carry them over."""
+    rate_limiter.set_default_limiter(None)
+    yield
+    rate_limiter.set_default_limiter(None)
@@ -0,0 +1,65 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import fakes  # noqa: E402
+import gemini_client  # noqa: E402
+import llm_cache  # noqa: E402
+import semantic_cache  # noqa: E402
+from batch_pipeline import BatchPipeline, read_rows  # noqa: E402
+
+ROWS = [
+    {"topic": "Equality of Vectors", "chapter": "Motion in a Plane", "grade": "11"},
+    {"topic": "Photosynthesis", "chapter": "Plants", "grade": "7"},
+    {"topic": "equality of vectors", "chapter": "Motion in a Plane", "grade": "11"},
+]
+
+
+@pytest.fixture(autouse=True)
+def fake_gemini():
+    gemini_client.set_model_factory(lambda name, system_instruction=None: fakes.FakeModel(
+        name, latency_ms=0, system_instruction=system_instruction))
+    llm_cache.set_default_cache(llm_cache.LLMCache(":memory:", bypass=True))
+    for kind in ("topic_analysis", "visual_plan"):
+        semantic_cache.set_default_semantic_cache(kind, semantic_cache.SemanticCache(bypass=True))
+    yield
+    gemini_client.set_model_factory(None)
+    llm_cache.set_default_cache(None)
+    for kind in ("topic_analysis", "visual_plan"):
+        semantic_cache.set_default_semantic_cache(kind, None)
+
+
+def run(pipeline, tmp_path, rows=ROWS):
+    output = tmp_path / "out.jsonl"
+    counts = asyncio.run(pipeline.run(rows, str(output)))
+    with open(output, encoding="utf-8") as f:
+        return counts, [json.loads(line) for line in f]
+
+
+def test_every_row_gets_a_record_and_duplicates_share_one_run(tmp_path):
+    counts, records = run(BatchPipeline(2, 2, 2), tmp_path)
+    assert counts == {"ok": 3, "failed": 0}
+    by_topic = {r["topic"]: r for r in records}
+    assert by_topic["equality of vectors"]["duplicate_of"] == "Equality of Vectors"
+    assert by_topic["equality of vectors"]["code"] == by_topic["Equality of Vectors"]["code"]
+    assert set(by_topic["Photosynthesis"]["timings"]) == {"analyze", "plan", "codegen"}
+
+
+def test_fanout_dry_runs_candidates_on_the_render_pool(tmp_path):
+    pool = fakes.FakeRenderPool(0, 0)
+    counts, records = run(BatchPipeline(2, 2, 2, codegen_fanout=2, dedup_threshold=None, render_pool=pool),
+                          tmp_path, ROWS[:1])
+    assert counts == {"ok": 1, "failed": 0}
+    assert pool.renders >= 1
+
+
+def test_read_rows_from_csv_and_jsonl(tmp_path):
+    (tmp_path / "topics.csv").write_text("topic,chapter,grade\n Vectors ,Motion,11\n", encoding="utf-8")
+    (tmp_path / "topics.jsonl").write_text('{"topic": "Vectors", "grade": 11}\n\n', encoding="utf-8")
+    assert list(read_rows(str(tmp_path / "topics.csv"))) == [{"topic": "Vectors", "chapter": "Motion", "grade": "11"}]
+    assert list(read_rows(str(tmp_path / "topics.jsonl"))) == [{"topic": "Vectors", "chapter": "", "grade": "11"}]
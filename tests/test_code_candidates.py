@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import fakes  # noqa: E402
+import gemini_client  # noqa: E402
+import llm_cache  # noqa: E402
+from json_extractor import parse_model  # noqa: E402
+from Manim_code_agent import ManimCodeAgent  # noqa: E402
+from visual_plan_agent import VisualPlan  # noqa: E402
+
+
+@pytest.fixture
+def agent():
+    gemini_client.set_model_factory(lambda name, system_instruction=None: fakes.FakeModel(
+        name, latency_ms=0, system_instruction=system_instruction))
+    llm_cache.set_default_cache(llm_cache.LLMCache(":memory:", bypass=True))
+    yield ManimCodeAgent()
+    gemini_client.set_model_factory(None)
+    llm_cache.set_default_cache(None)
+
+
+def scripted(agent, outcomes):
+    """Replace _candidate: outcomes[index] is (seconds, accepted); records what each call saw."""
+    calls = {}
+
+    def candidate(plan, index, render_pool, cancel=None):
+        seconds, accepted = outcomes[index]
+        calls[index] = {"render_pool": render_pool, "cancel": cancel}
+        time.sleep(seconds)
+        return f"code {index}", accepted, "" if accepted else "rejected"
+    agent._candidate = candidate
+    return calls
+
+
+def test_first_passing_candidate_wins_and_the_rest_are_cancelled(agent):
+    calls = scripted(agent, {0: (0.3, True), 1: (0.0, False), 2: (0.05, True), 3: (0.0, True)})
+    pool = object()
+    code = agent.generate_code_parallel(None, fanout=2, max_candidates=4, render_pool=pool)
+    assert code.Code == "code 2"
+    assert sorted(calls) == [0, 1, 2]  # 1 was replaced by 2; 2 won before 3 was needed
+    assert all(c["render_pool"] is pool for c in calls.values())
+    assert calls[0]["cancel"].is_set()
+
+
+def test_falls_back_to_a_rejected_candidate(agent):
+    scripted(agent, {i: (0.0, False) for i in range(3)})
+    code = agent.generate_code_parallel(None, fanout=2, max_candidates=3)
+    assert code.Code.startswith("code ")
+    assert code.Description == "Best effort after 3 candidates"
+
+
+def test_stops_at_the_timeout(agent):
+    scripted(agent, {0: (0.5, True)})
+    start = time.monotonic()
+    code = agent.generate_code_parallel(None, fanout=1, max_candidates=1, timeout=0.05)
+    assert time.monotonic() - start < 0.4
+    assert code.Code == ""
+
+
+def test_candidates_are_dry_run_rendered(agent):
+    plan = parse_model(fakes.VISUAL_PLAN_JSON, VisualPlan)
+    pool = fakes.FakeRenderPool(0, 0)
+    code = agent.generate_code_parallel(plan, fanout=2, max_candidates=2, render_pool=pool)
+    assert "class GeneratedManimScene" in code.Code
+    assert pool.renders >= 1
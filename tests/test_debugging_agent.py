@@ -0,0 +1,60 @@
+import json
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import fakes  # noqa: E402
+import gemini_client  # noqa: E402
+import llm_cache  # noqa: E402
+import debugging_agent  # noqa: E402
+from render_cache import RenderCache  # noqa: E402
+
+REJECTED = {"score": 0.31, "passed": False, "issues": ["text overlaps the axes"], "scored_ms": 1.0}
+
+
+@pytest.fixture
+def run_job(tmp_path, monkeypatch):
+    """Run the debug loop on fakes: codegen "writes" the given script, renders never touch manim."""
+    monkeypatch.chdir(tmp_path)
+    gemini_client.set_model_factory(lambda name, system_instruction=None: fakes.FakeModel(
+        name, latency_ms=0, system_instruction=system_instruction))
+    llm_cache.set_default_cache(llm_cache.LLMCache(":memory:", bypass=True))
+
+    def run(script, quality=None, max_attempts=3):
+        def fake_run(args, **kwargs):
+            with open(args[args.index("--output") + 1], "w") as f:
+                f.write(script)
+            return types.SimpleNamespace(returncode=0)
+
+        monkeypatch.setattr(debugging_agent, "subprocess", types.SimpleNamespace(
+            run=fake_run, CalledProcessError=debugging_agent.subprocess.CalledProcessError))
+        monkeypatch.setattr(debugging_agent, "check_render_quality", lambda path, attempt: quality)
+        result = debugging_agent.run_manim_code_agent(
+            "Equality of Vectors", max_attempts=max_attempts, render_pool=fakes.FakeRenderPool(0, 0),
+            render_cache=RenderCache(str(tmp_path / "renders")))
+        (job,) = os.listdir(tmp_path / "jobs")
+        with open(tmp_path / "jobs" / job / "manifest.json", encoding="utf-8") as f:
+            return result, json.load(f)
+
+    yield run
+    gemini_client.set_model_factory(None)
+    llm_cache.set_default_cache(None)
+
+
+def test_repairs_a_broken_script(run_job):
+    (script_path, image), manifest = run_job(fakes.BROKEN_SCRIPT)
+    assert image is not None and os.path.exists(image)
+    assert (manifest["status"], manifest["attempts"]) == ("ok", 2)
+    sources = [a["source"] for a in manifest["artifacts"] if a["kind"] == "script"]
+    assert sources[0] == "codegen" and sources[1] in ("autofix", "llm")
+
+
+def test_a_render_rejected_on_the_last_attempt_is_degraded(run_job):
+    (script_path, image), manifest = run_job(fakes.MANIM_CODE, quality=dict(REJECTED), max_attempts=1)
+    assert image is not None
+    assert manifest["status"] == "quality_failed"
+    assert (manifest["score"], manifest["issues"]) == (0.31, ["text overlaps the axes"])
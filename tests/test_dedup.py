@@ -0,0 +1,35 @@
+from dedup import deduplicate
+
+PARAGRAPH = ("A vector has both magnitude and direction. Two vectors are equal when they have the same "
+             "magnitude and point in the same direction, wherever they start. We draw them as arrows whose "
+             "length shows the magnitude and whose head shows the direction of the quantity.")
+
+
+def test_exact_duplicates_ignore_case_and_whitespace():
+    result = deduplicate(["Define  mitosis.", "define mitosis.", "Define meiosis."])
+    assert result.group == [0, 0, 2]
+    assert result.stats() == {"items": 3, "unique": 2, "exact_duplicates": 1, "near_duplicates": 0}
+
+
+def test_near_duplicates_share_a_representative():
+    edited = PARAGRAPH.replace("We draw them", "We usually draw them")
+    result = deduplicate([PARAGRAPH, "Photosynthesis makes glucose from light.", edited])
+    assert result.group == [0, 1, 0]
+    assert result.fan_out({0: "plan A", 1: "plan B"}) == ["plan A", "plan B", "plan A"]
+
+
+def test_short_texts_that_differ_by_a_word_stay_apart():
+    result = deduplicate(["Explain the equality of two vectors in a plane",
+                          "Explain the equality of two matrices in a plane"], threshold=0.5)
+    assert result.group == [0, 1]
+
+
+def test_long_repetitive_texts_are_not_treated_as_short():
+    text = "the cell divides and the cell grows and the cell divides again " * 3
+    assert deduplicate([text, text + "today"], threshold=0.8).group == [0, 0]
+
+
+def test_partitions_and_threshold_one():
+    assert deduplicate(["Vectors", "vectors"], partitions=["Physics", "Maths"]).group == [0, 1]
+    edited = PARAGRAPH.replace("We draw them", "We usually draw them")
+    assert deduplicate([PARAGRAPH, edited], threshold=1).group == [0, 1]
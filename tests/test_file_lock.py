@@ -0,0 +1,36 @@
+import threading
+import time
+
+from file_lock import file_lock
+
+
+def test_holders_exclude_each_other(tmp_path):
+    path = str(tmp_path / "locks" / "manifest.json.lock")
+    inside, overlaps = [], []
+
+    def worker():
+        for _ in range(5):
+            with file_lock(path):
+                inside.append(1)
+                if len(inside) > 1:
+                    overlaps.append(1)
+                time.sleep(0.002)
+                inside.pop()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == []
+
+
+def test_released_after_an_exception(tmp_path):
+    path = str(tmp_path / "cache.lock")
+    try:
+        with file_lock(path):
+            raise ValueError("save failed")
+    except ValueError:
+        pass
+    with file_lock(path):
+        pass
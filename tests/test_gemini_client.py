@@ -0,0 +1,80 @@
+import types
+
+import pytest
+
+import gemini_client
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    yield
+    gemini_client.set_model_factory(None)
+    gemini_client.reset_token_usage()
+
+
+def test_models_are_pooled_per_name_and_instruction():
+    built = []
+    gemini_client.set_model_factory(lambda name, system_instruction=None: built.append(
+        (name, system_instruction)) or object())
+    first = gemini_client.get_model("gemini-2.0-flash", "You are a tutor.")
+    assert gemini_client.get_model("gemini-2.0-flash", "You are a tutor.") is first
+    assert gemini_client.get_model("gemini-2.0-flash") is not first
+    assert built == [("gemini-2.0-flash", "You are a tutor."), ("gemini-2.0-flash", None)]
+
+    gemini_client.set_model_factory(lambda name, system_instruction=None: object())
+    assert gemini_client.get_model("gemini-2.0-flash", "You are a tutor.") is not first
+
+
+class FakeGenai:
+    def __init__(self, caching_works=True):
+        self.created = []
+        self.caching_works = caching_works
+        genai = self
+
+        class CachedContent:
+            @staticmethod
+            def create(**kwargs):
+                if not genai.caching_works:
+                    raise RuntimeError("400 Cached content is too small")
+                genai.created.append(kwargs)
+                return kwargs
+
+        class GenerativeModel:
+            def __init__(self, model_name, system_instruction=None):
+                self.model_name, self.system_instruction, self.cached = model_name, system_instruction, None
+
+            @classmethod
+            def from_cached_content(cls, cached):
+                model = cls(cached["model"])
+                model.cached = cached
+                return model
+
+        self.caching = types.SimpleNamespace(CachedContent=CachedContent)
+        self.GenerativeModel = GenerativeModel
+
+
+@pytest.mark.parametrize("caching_works", [True, False])
+def test_long_instructions_use_context_caching_when_available(monkeypatch, caching_works):
+    genai = FakeGenai(caching_works)
+    monkeypatch.setattr(gemini_client, "configure", lambda: genai)
+    monkeypatch.setattr(gemini_client, "CONTEXT_CACHE_MIN_TOKENS", 10)
+    instruction = "Extract every table from the page. " * 20
+    model = gemini_client.get_model("gemini-1.5-flash-002", instruction)
+    assert model._instruction_text == instruction
+    if caching_works:
+        assert genai.created[0]["model"] == "models/gemini-1.5-flash-002"
+        assert gemini_client.context_cached_tokens(model) > 0
+    else:
+        assert model.system_instruction == instruction
+        assert gemini_client.context_cached_tokens(model) == 0
+    # Short instructions are always sent inline
+    assert gemini_client.get_model("gemini-1.5-flash-002", "Be brief.").cached is None
+
+
+def test_token_ledger_per_model():
+    gemini_client.record_tokens("gemini-2.0-flash", 100, 20, cached_tokens=80)
+    gemini_client.record_tokens("gemini-2.0-flash", 50, 10)
+    assert gemini_client.token_usage() == {"gemini-2.0-flash": {
+        "calls": 2, "prompt_tokens": 150, "cached_tokens": 80, "response_tokens": 30}}
+    gemini_client.reset_token_usage()
+    assert gemini_client.token_usage() == {}
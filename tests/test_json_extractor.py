@@ -0,0 +1,46 @@
+from typing import List
+
+from pydantic import BaseModel
+
+from json_extractor import JSONStreamScanner, extract_all_json, extract_json, parse_model, validate_partial
+
+
+class Plan(BaseModel):
+    title: str
+    steps: List[str]
+
+
+def test_skips_prose_fences_comments_and_trailing_commas():
+    text = """Here is the plan:
+```json
+{
+  // the title
+  "title": "Vectors", /* inline */
+  "steps": ["draw", "label",],
+}
+```
+Hope this helps [1]."""
+    assert extract_json(text) == {"title": "Vectors", "steps": ["draw", "label"]}
+
+
+def test_raw_newlines_inside_strings_are_escaped():
+    assert extract_json('{"code": "line one\nline two"}') == {"code": "line one\nline two"}
+
+
+def test_every_value_and_a_repaired_truncated_tail():
+    assert extract_all_json('[1, 2] then {"a": 1} and {"b": [1, 2, "unfinish') == [
+        [1, 2], {"a": 1}, {"b": [1, 2, "unfinish"]}]
+
+
+def test_scanner_returns_values_as_they_close():
+    scanner = JSONStreamScanner()
+    assert scanner.feed('{"title": "Vec') == []
+    assert scanner.partial() == {"title": "Vec"}
+    assert scanner.feed('tors", "steps": []} {"x": ') == [{"title": "Vectors", "steps": []}]
+    assert scanner.partial() == {"x": None}
+
+
+def test_parse_model_and_valid_prefix_of_a_partial_object():
+    assert parse_model('```json\n[{"title": "T", "steps": ["a"]}]\n```', Plan) == Plan(title="T", steps=["a"])
+    assert parse_model('{"title": "T"}', Plan) is None
+    assert validate_partial({"title": "T", "steps": ["a", 3]}, Plan) == {"title": "T", "steps": ["a"]}
@@ -0,0 +1,78 @@
+import json
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import fakes  # noqa: E402
+from learning_objectives import (ObjectiveGenerator, ObjectiveStore, content_hash, format_objectives,  # noqa: E402
+                                 generate_for_csv, pack_batches, parse_batch_response)
+
+
+def answer_batches(skip_id=None):
+    """Responder answering every "### id:" item in the prompt, except skip_id in multi-row batches."""
+    def respond(prompt):
+        ids = re.findall(r"### id: (\w+)", str(prompt))
+        rows = [{"id": item_id, "objectives": {"Understand": [f"Explain item {item_id}"]}}
+                for item_id in ids if len(ids) == 1 or item_id != skip_id]
+        return json.dumps(rows)
+    return respond
+
+
+def test_format_objectives_orders_bloom_levels_and_drops_empty_items():
+    text = format_objectives({"Apply": ["Use it", " "], "Remember": ["Recall it"], "Create": []})
+    assert text == "<Remember>\n1. Recall it\n</Remember>\n<Apply>\n1. Use it\n</Apply>"
+
+
+def test_parse_batch_response_keeps_only_requested_ids():
+    text = 'Sure:\n```json\n[{"id": "r1", "objectives": {"Remember": ["A"]}}, ' \
+           '{"id": "r9", "objectives": {"Remember": ["B"]}}, {"id": "r2", "objectives": {}}]\n```'
+    assert parse_batch_response(text, ["r1", "r2"]) == {"r1": "<Remember>\n1. A\n</Remember>"}
+
+
+def test_pack_batches_respects_row_and_token_limits():
+    items = [(str(n), "word " * 40) for n in range(5)]
+    assert [len(b) for b in pack_batches(items, max_rows=2, max_tokens=10_000)] == [2, 2, 1]
+    assert [len(b) for b in pack_batches(items, max_rows=10, max_tokens=1)] == [1] * 5
+
+
+def test_store_reloads_and_skips_a_torn_line(tmp_path):
+    path = str(tmp_path / "objectives.jsonl")
+    ObjectiveStore(path).add_many([("a", "<Remember>\n1. A\n</Remember>")], "gemini-2.0-flash")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"hash": "b", "object')
+    store = ObjectiveStore(path)
+    assert "a" in store and "b" not in store
+
+
+def test_rows_the_reply_skipped_are_retried_alone(tmp_path):
+    model = fakes.FakeModel("gemini-2.0-flash", latency_ms=0, responder=answer_batches(skip_id="r2"))
+    store = ObjectiveStore(str(tmp_path / "objectives.jsonl"))
+    generator = ObjectiveGenerator(store, model, batch_rows=3, concurrency=2, dedup_threshold=None)
+    counts = generator.generate([f"Content about topic {n}" for n in range(4)] + ["", "Content about topic 0"])
+    assert (counts["generated"], counts["failed"], counts["skipped"]) == (4, 0, 1)
+    assert counts["requests"] == 3  # Batches of 3 and 1, then r2 of the first batch on its own
+    assert all(content_hash(f"Content about topic {n}") in store for n in range(4))
+
+    # A second run sends nothing
+    again = ObjectiveGenerator(ObjectiveStore(store.path), model, dedup_threshold=None)
+    assert again.generate([f"Content about topic {n}" for n in range(4)])["requests"] == 0
+
+
+def test_generate_for_csv_resumes_and_fans_out_near_duplicates(tmp_path):
+    source = tmp_path / "combined.csv"
+    source.write_text("title,content\n"
+                      "a,Vectors have magnitude and direction and add by the parallelogram law\n"
+                      "b,Vectors have magnitude and direction and add by the parallelogram law.\n"
+                      "c,Photosynthesis turns light energy into chemical energy in plants\n"
+                      "d,\n", encoding="utf-8")
+    model = fakes.FakeModel("gemini-2.0-flash", latency_ms=0, responder=answer_batches())
+    output = tmp_path / "objectives.csv"
+    counts = generate_for_csv(str(source), str(output), store_path=str(tmp_path / "store.jsonl"), model=model)
+    assert (counts["generated"], counts["deduplicated"], counts["missing"]) == (2, 1, 0)
+
+    with open(output, encoding="utf-8") as f:
+        text = f.read()
+    assert text.startswith("title,content,learning_objectives")
+    assert text.count("<Understand>") == 3
@@ -0,0 +1,71 @@
+import types
+
+import llm_cache
+from llm_cache import LLMCache, cached_generate_content, get_default_cache, request_key, set_default_cache
+
+
+class EchoModel:
+    """Minimal GenerativeModel stand-in: replies with the prompt, counting calls."""
+
+    def __init__(self, model_name="models/echo", system_instruction=None):
+        self.model_name = model_name
+        self._system_instruction = system_instruction
+        self.calls = 0
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls += 1
+        part = types.SimpleNamespace(text=f"echo: {prompt}")
+        candidate = types.SimpleNamespace(content=types.SimpleNamespace(parts=[part]))
+        return types.SimpleNamespace(candidates=[candidate], usage_metadata=None)
+
+
+def test_get_set_and_ttl(monkeypatch):
+    cache = LLMCache(":memory:", ttl=60, bypass=False)
+    cache.set("k", "value", "models/echo")
+    assert cache.get("k") == "value"
+    now = llm_cache.time.time()
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now + 61)
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_evicts_least_recently_used_over_max_bytes(monkeypatch):
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(llm_cache.time, "time", lambda: float(next(clock)))
+    cache = LLMCache(":memory:", ttl=None, max_bytes=10, bypass=False)
+    cache.set("a", "12345")
+    cache.set("b", "12345")
+    cache.get("a")
+    cache.set("c", "12345")
+    assert [cache.get(k) is not None for k in "abc"] == [True, False, True]
+
+
+def test_cached_generate_content_serves_repeats_from_the_cache():
+    cache = LLMCache(":memory:", bypass=False)
+    model = EchoModel()
+    assert cached_generate_content(model, "hello", cache=cache) == "echo: hello"
+    assert cached_generate_content(model, "hello", cache=cache) == "echo: hello"
+    assert model.calls == 1
+    assert cache.stats()["hits"] == 1
+    assert cached_generate_content(model, "hello", cache=cache, bypass=True) == "echo: hello"
+    assert model.calls == 2
+
+
+def test_key_covers_model_config_and_system_instruction():
+    key = request_key(EchoModel(), "hello")
+    assert request_key(EchoModel(), "hello") == key
+    assert request_key(EchoModel("models/other"), "hello") != key
+    assert request_key(EchoModel(), "hello", {"temperature": 0.9}) != key
+    assert request_key(EchoModel(system_instruction="Be brief."), "hello") != key
+
+
+def test_default_cache_reads_settings_from_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "load_env", lambda: monkeypatch.setenv("LLM_CACHE_TTL", "5"))
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    set_default_cache(None)
+    try:
+        cache = get_default_cache()
+        assert cache.path == str(tmp_path / "cache.sqlite3")
+        assert cache.ttl == 5.0
+    finally:
+        set_default_cache(None)
@@ -0,0 +1,73 @@
+import threading
+import types
+
+import pytest
+
+from llm_cache import LLMCache, set_default_cache
+from llm_stream import code_guard, diff_guard, stream_generate_content, stream_with_reissue
+
+CODE = "```python\nfrom manim import *\n\nclass GeneratedManimScene(Scene):\n    pass\n```"
+PROSE = "Sure! Let me explain how vectors work before writing anything. " * 20
+
+
+class StreamingModel:
+    """Streams each queued reply in 40-character chunks, recording the configs it was called with."""
+
+    model_name = "models/fake-stream"
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.configs = []
+        self.chunks_sent = 0
+
+    def generate_content(self, prompt, stream=False, generation_config=None):
+        self.configs.append(generation_config)
+        text = self.replies.pop(0)
+
+        def chunks():
+            for i in range(0, len(text), 40):
+                self.chunks_sent += 1
+                yield types.SimpleNamespace(text=text[i:i + 40], usage_metadata=None)
+        return chunks()
+
+
+@pytest.fixture(autouse=True)
+def memory_cache():
+    cache = LLMCache(":memory:", bypass=False)
+    set_default_cache(cache)
+    yield cache
+    set_default_cache(None)
+
+
+def test_guards():
+    assert code_guard("GeneratedManimScene")(CODE) is None
+    assert code_guard("GeneratedManimScene")(CODE.replace("GeneratedManimScene", "Other")) == "wrong scene class Other"
+    assert code_guard()(PROSE) == "no code block"
+    assert diff_guard()("@@ -1,2 +1,2 @@\n-a\n+b") is None
+    assert diff_guard()(CODE) == "full script instead of a diff"
+
+
+def test_reissues_an_aborted_stream_with_a_fresh_sample(memory_cache):
+    model = StreamingModel(PROSE, CODE)
+    restarts, seen = [], []
+    text = stream_with_reissue(model, "prompt", code_guard("GeneratedManimScene"), on_chunk=seen.append,
+                               on_restart=restarts.append)
+    assert text == CODE
+    assert model.configs == [None, {"temperature": 0.7}]
+    assert restarts == [1]
+    assert model.chunks_sent < len(PROSE) // 40 + len(CODE) // 40  # The prose was cut short
+    # The complete reply is cached under the request that produced it
+    assert stream_generate_content(model, "prompt", generation_config={"temperature": 0.7}) == CODE
+
+
+def test_gives_up_after_max_reissues():
+    model = StreamingModel(PROSE, PROSE)
+    assert stream_with_reissue(model, "prompt", code_guard(), max_reissues=1) is None
+    assert len(model.configs) == 2
+
+
+def test_cancel_stops_the_stream_without_a_reissue():
+    cancel = threading.Event()
+    model = StreamingModel(CODE, CODE)
+    assert stream_with_reissue(model, "prompt", on_chunk=lambda text: cancel.set(), cancel=cancel) is None
+    assert (len(model.configs), model.chunks_sent) == (1, 1)
@@ -0,0 +1,47 @@
+import pytest
+
+import manim_linter
+from manim_autofix import try_autofix
+
+
+@pytest.fixture(autouse=True)
+def no_snapshot(tmp_path, monkeypatch):
+    # Only the built-in animation list is known, as before a render worker has run
+    monkeypatch.setattr(manim_linter, "API_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(manim_linter, "_api", None)
+
+
+def scene(body, name="GeneratedManimScene", header="from manim import *\n"):
+    return f"{header}\nclass {name}(Scene):\n    def construct(self):\n{body}\n"
+
+
+def test_renames_the_scene_class():
+    fix = try_autofix(scene("        pass", name="VectorScene"), "VectorScene is not in the script")
+    assert fix.rule == "scene-name"
+    assert "class GeneratedManimScene(Scene):" in fix.script
+
+
+def test_unwraps_animations_passed_to_add():
+    fix = try_autofix(scene("        self.add(GrowArrow(vec))"), "TypeError: Only values of type Mobject can be added")
+    assert fix.rule == "animation-in-add"
+    assert "self.add(vec)" in fix.script
+
+
+def test_replaces_renamed_api_and_adds_missing_imports():
+    fix = try_autofix(scene("        self.play(ShowCreation(c))"), "NameError: name 'ShowCreation' is not defined")
+    assert (fix.rule, "self.play(Create(c))" in fix.script) == ("renamed-api", True)
+
+    fix = try_autofix(scene("        x = np.array([1, 0, 0])"), "NameError: name 'np' is not defined")
+    assert fix.rule == "missing-import"
+    assert fix.script.startswith("import numpy as np\n")
+
+
+def test_restores_tex_escapes_python_swallowed():
+    fix = try_autofix(scene('        t = MathTex("\\vec{a} = \\frac{1}{2}")'), "LaTeX compilation error")
+    assert fix.rule == "latex"
+    assert "MathTex(r'\\vec{a} = \\frac{1}{2}')" in fix.script
+
+
+def test_leaves_unknown_errors_to_the_llm():
+    assert try_autofix(scene("        self.play(Write(t))"), "ValueError: something unusual") is None
+    assert try_autofix("def broken(:", "SyntaxError") is None
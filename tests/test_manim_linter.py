@@ -0,0 +1,76 @@
+import types
+
+import pytest
+
+import manim_linter
+from manim_linter import build_api_snapshot, lint_manim_script, manim_api, write_api_snapshot
+
+
+class Mobject:
+    def __init__(self, color=None, **kwargs):
+        pass
+
+
+class Circle(Mobject):
+    def __init__(self, radius=1.0, **kwargs):
+        super().__init__(**kwargs)
+
+
+class Animation:
+    def __init__(self, mobject, run_time=1.0):
+        pass
+
+
+class Create(Animation):
+    pass
+
+
+FAKE_MANIM = types.SimpleNamespace(__version__="0.0-test", Mobject=Mobject, Circle=Circle, Animation=Animation,
+                                   Create=Create, UP=(0, 1, 0))
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(manim_linter, "API_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(manim_linter, "_api", None)
+    return tmp_path
+
+
+def scene(body, name="GeneratedManimScene"):
+    return f"from manim import *\n\nclass {name}(Scene):\n    def construct(self):\n{body}\n"
+
+
+def rules(findings):
+    return [(f.rule, f.line, f.blocking) for f in findings]
+
+
+def test_certain_findings_block_without_a_snapshot(snapshot_dir):
+    assert rules(lint_manim_script("def broken(:")) == [("syntax", 1, True)]
+    assert rules(lint_manim_script(scene("        pass", name="Demo"))) == [("scene-name", 3, True)]
+    script = scene("        arrow = Create(Circle())\n        self.add(arrow)\n        self.add(Create(Circle()))")
+    assert rules(lint_manim_script(script)) == [("animation-in-add", 6, True), ("animation-in-add", 7, True)]
+    # Name and keyword rules need the snapshot
+    assert lint_manim_script(scene("        self.play(Crate(Circle(radius=2, colour=RED)))")) == []
+
+
+def test_snapshot_enables_the_heuristic_rules(snapshot_dir):
+    assert write_api_snapshot(FAKE_MANIM).startswith(str(snapshot_dir))
+    assert write_api_snapshot(FAKE_MANIM) is None  # Already written
+    api = manim_api()
+    assert api.animations == {"Animation", "Create"}
+    assert api.kwargs["Circle"] == ["color", "radius"]
+
+    findings = lint_manim_script(scene("        self.play(Crate(Circle(radius=2, colour=UP)))"))
+    assert rules(findings) == [("unknown-name", 5, False), ("bad-kwarg", 5, False)]
+
+
+def test_kwargs_follow_kwargs_up_the_mro():
+    class Base:
+        def __init__(self, name="", *args, **kwargs):
+            pass
+
+    class Sized(Base):
+        def __init__(self, size=1, **kwargs):
+            super().__init__(**kwargs)
+
+    assert build_api_snapshot(types.SimpleNamespace(Sized=Sized)).kwargs["Sized"] == ["name", "size"]
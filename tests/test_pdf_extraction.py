@@ -0,0 +1,68 @@
+import json
+import types
+
+from pdf_extraction import extract_block, extract_blocks, pack_pages
+
+PAGE = "x" * 400  # ~100 tokens
+
+
+class BlockModel:
+    """Replies to each request through reply(text) -> (content, finish_reason), counting calls."""
+
+    model_name = "models/fake-extractor"
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = 0
+
+    def generate_content(self, parts, **kwargs):
+        self.calls += 1
+        content, reason = self.reply(parts[-1])
+        candidate = types.SimpleNamespace(finish_reason=types.SimpleNamespace(name=reason))
+        return types.SimpleNamespace(text=content, candidates=[candidate], usage_metadata=None)
+
+
+def manifest(tmp_path):
+    with open(tmp_path / "Chemistry_manifest.json", encoding="utf-8") as f:
+        return json.load(f)["blocks"]
+
+
+def test_pack_pages_cuts_before_a_heading():
+    pages = [PAGE, "UNIT 2\n" + PAGE, PAGE]
+    assert [(s, e) for _, s, e in pack_pages(pages, token_budget=250)] == [(1, 1), (2, 3)]
+    assert [(s, e) for _, s, e in pack_pages([PAGE] * 3, token_budget=250)] == [(1, 2), (3, 3)]
+    assert [(s, e) for _, s, e in pack_pages([PAGE] * 3, token_budget=10_000, max_pages=2)] == [(1, 2), (3, 3)]
+
+
+def test_only_max_tokens_splits_a_block():
+    def reply(text):
+        if "page two" in text and "page one" in text:
+            return '[{"p": 1}, {"p"', "MAX_TOKENS"
+        return json.dumps([{"p": 2 if "page two" in text else 1}]), "STOP"
+
+    model = BlockModel(reply)
+    content, splits, truncated = extract_block(model, "Extract.", 1, [(1, "page one"), (2, "page two")])
+    assert (content, splits, truncated) == ('[{"p": 1}]\n[{"p": 2}]', 1, False)
+    assert model.calls == 3
+
+    model = BlockModel(lambda text: ('[{"p": 1}, {"p"', "STOP"))
+    assert extract_block(model, "Extract.", 1, [(1, "page one"), (2, "page two")])[1:] == (0, False)
+    assert model.calls == 1
+
+
+def test_resumes_and_retries_incomplete_blocks(tmp_path):
+    replies = {"page one": ['[{"p": 1}]'], "page two": ['[{"p": 2}, {"p"', '[{"p": 2}]']}
+    model = BlockModel(lambda text: (replies[text].pop(0), "STOP"))
+    pages = ["page one", "page two"]
+
+    results = extract_blocks(pages, "Extract.", model=model, output_dir=str(tmp_path), block=1)
+    assert [r[1:3] for r in results] == [(1, 1), (2, 2)]
+    assert {k: v["status"] for k, v in manifest(tmp_path).items()} == {"1-1": "done", "2-2": "incomplete"}
+
+    results = extract_blocks(pages, "Extract.", model=model, output_dir=str(tmp_path), block=1)
+    assert model.calls == 3  # Only the incomplete block was requested again
+    assert results[1][3] == '[{"p": 2}]'
+    assert manifest(tmp_path)["2-2"]["status"] == "done"
+
+    extract_blocks(pages, "Extract.", model=model, output_dir=str(tmp_path), block=1)
+    assert model.calls == 3
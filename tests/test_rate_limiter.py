@@ -0,0 +1,52 @@
+import types
+
+import pytest
+
+from rate_limiter import RateLimiter, TokenBucket, estimate_tokens, retry_after_seconds
+
+
+class ResourceExhausted(Exception):
+    pass
+
+
+def test_bucket_allows_a_burst_then_asks_to_wait():
+    bucket = TokenBucket(2, per_seconds=60)
+    assert bucket.reserve(1) == 0.0
+    assert bucket.reserve(1) == 0.0
+    assert bucket.reserve(1) == pytest.approx(30.0, rel=0.01)
+
+
+def test_retry_delay_from_headers_and_messages():
+    error = Exception("429")
+    error.response = types.SimpleNamespace(headers={"Retry-After": "7"})
+    assert retry_after_seconds(error) == 7.0
+    assert retry_after_seconds(Exception("429 Resource has been exhausted. Please retry in 2.5s.")) == 2.5
+    assert retry_after_seconds(Exception('retry_delay { seconds: 12 }')) == 12.0
+    assert retry_after_seconds(Exception("boom")) is None
+
+
+def test_retries_throttled_calls_and_counts_them():
+    limiter = RateLimiter(limits={"fake": {"rpm": 100, "tpm": 1_000_000}}, base_delay=0.001, max_delay=0.01)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ResourceExhausted("quota exceeded")
+        return "ok"
+
+    assert limiter.call("models/fake", flaky) == "ok"
+    assert limiter.metrics()["fake"]["retries"] == 2
+    assert limiter.metrics()["fake"]["throttled"] == 2
+
+
+def test_does_not_retry_other_errors():
+    limiter = RateLimiter(base_delay=0.001)
+    with pytest.raises(ValueError):
+        limiter.call("fake", lambda: (_ for _ in ()).throw(ValueError("bad prompt")))
+    assert limiter.metrics()["fake"]["retries"] == 0
+
+
+def test_estimates_tokens_for_strings_and_parts():
+    assert estimate_tokens("x" * 400) == 100
+    assert estimate_tokens(["x" * 400, "y" * 40]) == 110
@@ -0,0 +1,52 @@
+import csv
+import json
+import os
+
+from record_sink import RecordSink, iter_dataset, iter_grouped, parse_block_records, write_csv
+
+
+def rec(topic, content, content_type="Text"):
+    return {"chapter_number": "3", "chapter_title": "Atoms", "topic_number": topic, "topic_title": f"Topic {topic}",
+            "content_type": content_type, "content": content}
+
+
+def test_parse_keeps_records_and_reports_the_rest():
+    records, broken = parse_block_records('```json\n[{"content": "a &amp; b"}, 7]\n```')
+    assert records == [{"content": "a & b"}]
+    assert [b["error"] for b in broken] == ["record is not a JSON object"]
+    assert parse_block_records("Sorry, I can't help with that.")[1][0]["error"] == "no JSON records found"
+
+
+def test_parts_are_named_by_page_range_and_read_back_in_page_order(tmp_path):
+    sink = RecordSink(str(tmp_path), "Chemistry", 3)
+    sink.save(2, 6, 9, json.dumps([rec("3.2", "second")]))
+    fields, result = sink.save(1, 1, 5, json.dumps([rec("3.1", "first"), rec("3.1", "more")]))
+    assert fields == {"file": "pages-00001-00005.jsonl", "records": 2, "broken": 0}
+    assert result == (1, 1, 5, 2)
+
+    rows = list(iter_dataset(str(tmp_path), subject="Chemistry"))
+    assert [(r["unit"], r["pages"], r["content"]) for r in rows] == [
+        ("3", "1-5", "first"), ("3", "1-5", "more"), ("3", "6-9", "second")]
+
+
+def test_broken_parts_are_replaced_by_a_clean_retry_and_stale_ranges_pruned(tmp_path):
+    sink = RecordSink(str(tmp_path), "Chemistry", 3)
+    sink.save(1, 1, 5, "not json")
+    assert os.path.exists(sink.broken_path(1, 5))
+    sink.save(1, 1, 5, json.dumps([rec("3.1", "first")]))
+    assert not os.path.exists(sink.broken_path(1, 5))
+
+    sink.save(2, 6, 9, json.dumps([rec("3.2", "second")]))
+    open(os.path.join(sink.partition_dir, "block-1.jsonl"), "w").close()
+    assert sink.prune([(1, 5)]) == 2
+    assert sorted(os.listdir(sink.partition_dir)) == ["pages-00001-00005.jsonl"]
+
+
+def test_grouped_csv(tmp_path):
+    sink = RecordSink(str(tmp_path), "Chemistry", 3)
+    sink.save(1, 1, 5, json.dumps([rec("3.1", "a"), rec("3.1", "b"), rec("3.2", "c")]))
+    count = write_csv(iter_grouped(iter_dataset(str(tmp_path))), str(tmp_path / "out.csv"))
+    assert count == 2
+    with open(tmp_path / "out.csv", encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [(r["topic_number"], r["content"]) for r in rows] == [("3.1", "a\n\nb"), ("3.2", "c")]
@@ -0,0 +1,54 @@
+import os
+
+from render_cache import RenderCache, render_key
+
+SCRIPT = '''from manim import *
+
+class Demo(Scene):
+    """Shows a circle."""
+
+    def construct(self):
+        self.play(Create(Circle()))
+'''
+DRAFT = (854, 480)
+
+
+def write_png(path, size=100):
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG" + b"\0" * (size - 4))
+    return path
+
+
+def test_key_ignores_comments_whitespace_and_docstrings():
+    reformatted = SCRIPT.replace('    """Shows a circle."""\n', "").replace("self.play(", "# draw it\n        self.play(")
+    assert render_key(reformatted, "Demo", DRAFT, "0.18") == render_key(SCRIPT, "Demo", DRAFT, "0.18")
+    assert render_key(SCRIPT, "Demo", (3840, 2160), "0.18") != render_key(SCRIPT, "Demo", DRAFT, "0.18")
+    assert render_key(SCRIPT, "Demo", DRAFT, "0.19") != render_key(SCRIPT, "Demo", DRAFT, "0.18")
+    assert render_key("def broken(:", "Demo", DRAFT, "0.18") is None
+
+
+def test_put_then_fetch_copies_the_png(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"))
+    assert cache.fetch(SCRIPT, "Demo", DRAFT) is None
+    cache.put(SCRIPT, "Demo", DRAFT, write_png(str(tmp_path / "render.png")))
+
+    output = str(tmp_path / "out" / "frame.png")
+    assert cache.fetch(SCRIPT, "Demo", DRAFT, output) == output
+    assert os.path.getsize(output) == 100
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1, "bytes": 100}
+    # A second process sees the entry through the manifest
+    assert RenderCache(str(tmp_path / "cache")).fetch(SCRIPT, "Demo", DRAFT) is not None
+
+
+def test_evicts_the_least_recently_fetched(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), max_bytes=300)
+    scenes = ["A", "B", "C"]
+    for i, scene in enumerate(scenes):
+        key = cache.put(SCRIPT, scene, DRAFT, write_png(str(tmp_path / f"{scene}.png")))
+        os.utime(cache._image_path(key), (i, i))
+    cache.fetch(SCRIPT, "A", DRAFT)  # Most recently used now
+
+    cache.put(SCRIPT, "D", DRAFT, write_png(str(tmp_path / "D.png")))
+    kept = [scene for scene in scenes + ["D"] if cache.fetch(SCRIPT, scene, DRAFT)]
+    assert kept == ["A", "C", "D"]
+    assert cache.stats()["bytes"] == 300
@@ -0,0 +1,59 @@
+import pytest
+
+from script_patch import PatchError, apply_unified_diff, extract_diff, number_lines, trim_error_log
+
+SCRIPT = """from manim import *
+
+class Demo(Scene):
+    def construct(self):
+        text = Text("Hello")
+        self.play(Write(text))
+        self.wait()
+"""
+
+
+def test_applies_a_fenced_diff():
+    reply = """Here is the fix:
+```diff
+--- a/script.py
++++ b/script.py
+@@ -5,3 +5,3 @@
+         text = Text("Hello")
+-        self.play(Write(text))
++        self.play(FadeIn(text))
+         self.wait()
+```"""
+    patched = apply_unified_diff(SCRIPT, extract_diff(reply))
+    assert patched == SCRIPT.replace("Write(text)", "FadeIn(text)")
+
+
+def test_tolerates_shifted_line_numbers():
+    diff = """@@ -1,2 +1,3 @@
+         self.play(Write(text))
++        self.play(text.animate.shift(UP))
+         self.wait()
+"""
+    patched = apply_unified_diff(SCRIPT, diff)
+    assert "        self.play(Write(text))\n        self.play(text.animate.shift(UP))\n        self.wait()" in patched
+
+
+def test_rejects_a_hunk_that_does_not_match():
+    with pytest.raises(PatchError):
+        apply_unified_diff(SCRIPT, "@@ -6,1 +6,1 @@\n-        self.play(Create(text))\n+        self.play(Write(text))\n")
+    assert extract_diff("class Demo(Scene): ...") is None
+
+
+def test_numbers_only_the_requested_lines():
+    assert number_lines(SCRIPT, {1, 5, 6}) == '1| from manim import *\n...\n5|         text = Text("Hello")\n' \
+                                             '6|         self.play(Write(text))'
+
+
+def test_trimmed_log_keeps_the_script_frames_and_the_error():
+    log = "\n".join(['Traceback (most recent call last):'] + [
+        f'  File "/usr/lib/python3/site-packages/manim/mod{i}.py", line {i}, in f\n    call()' for i in range(200)
+    ] + ['  File "generated_manim_script.py", line 6, in construct\n    self.play(Write(text))',
+         "NameError: name 'Write' is not defined"])
+    trimmed, script_lines = trim_error_log(log)
+    assert script_lines == [6]
+    assert trimmed.splitlines() == ['File "generated_manim_script.py", line 6, in construct',
+                                    "self.play(Write(text))", "NameError: name 'Write' is not defined"]
@@ -0,0 +1,56 @@
+import semantic_cache
+from semantic_cache import SemanticCache
+
+
+def filled(path=None, **kwargs):
+    cache = SemanticCache(path, bypass=False, **kwargs)
+    cache.put("Equality of Vectors", {"plan": "vectors"}, grade="11")
+    cache.put("Photosynthesis in Plants", {"plan": "photosynthesis"}, grade="10")
+    cache.put("Newton's Laws of Motion", {"plan": "newton"}, grade="9")
+    return cache
+
+
+def test_reuses_close_matches_and_seeds_from_related_ones():
+    cache = filled(reuse_threshold=0.9, seed_threshold=0.3)
+    assert cache.find("Equality of Vectors", grade="11")[0] == "reuse"
+    action, match = cache.find("Equality of vectors in a plane", grade="11")
+    assert (action, match.value) == ("seed", {"plan": "vectors"})
+    # The same topic for another grade is only a seed
+    assert cache.find("Equality of Vectors", grade="12")[0] == "seed"
+    assert cache.find("Mughal architecture")[0] is None
+    assert cache.stats()["reuses"] == 1
+
+
+def test_lookup_filters_on_meta():
+    cache = filled()
+    assert [m.text for m in cache.lookup("Laws", k=3, grade="10")] == ["Photosynthesis in Plants"]
+
+
+def test_the_log_is_shared_between_instances_and_compacted(tmp_path):
+    path = str(tmp_path / "plans.jsonl")
+    first = filled(path)
+    second = SemanticCache(path, bypass=False)
+    assert len(second.entries) == 3
+
+    second.put("Equality of Vectors", {"plan": "vectors v2"}, grade="11")  # Replaces the entry
+    first.put("Acids and Bases", {"plan": "acids"}, grade="10")
+    assert first.lookup("Equality of Vectors", k=1)[0].value == {"plan": "vectors v2"}
+    assert len(first.entries) == 4
+
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 5
+    first.save()
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 4
+    assert len(SemanticCache(path, bypass=False).entries) == 4
+
+
+def test_evicts_least_recently_used_and_expired(monkeypatch):
+    cache = filled(max_entries=2)
+    assert sorted(e["text"] for e in cache.entries) == ["Newton's Laws of Motion", "Photosynthesis in Plants"]
+
+    now = semantic_cache.time.time()
+    cache = filled(ttl=60)
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: now + 120)
+    cache.put("Acids and Bases", {"plan": "acids"})
+    assert [e["text"] for e in cache.entries] == ["Acids and Bases"]
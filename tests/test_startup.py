@@ -0,0 +1,64 @@
+"""
+Start-up regression tests: the CLI and the agent modules must not import manim,
+the Gemini SDK or OpenCV until a command actually needs them.
+
+Each probe runs in a fresh interpreter with a meta-path finder that records every
+import attempt, so an eager import is caught even where the package isn't installed.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ["manim", "google.generativeai", "cv2"]
+AGENT_MODULES = ["Topic_analysis_agent", "visual_plan_agent", "Manim_code_agent", "debugging_agent",
+                 "batch_pipeline"]
+
+_PROBE = """
+import json, runpy, sys
+attempted = set()
+
+class Recorder:
+    @staticmethod
+    def find_spec(name, path=None, target=None):
+        attempted.add(name)
+
+sys.meta_path.insert(0, Recorder)
+try:
+{body}
+except SystemExit:
+    pass
+print(json.dumps(sorted(attempted)))
+"""
+
+
+def attempted_imports(body: str) -> set:
+    code = _PROBE.format(body="\n".join("    " + line for line in body.splitlines()))
+    out = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True,
+                         check=True)
+    return set(json.loads(out.stdout.strip().splitlines()[-1]))
+
+
+def heavy_in(attempted: set) -> list:
+    # google.generativeai is never looked up when google itself is missing, so match top-level names
+    roots = {name.split(".")[0] for name in attempted}
+    return [m for m in HEAVY if m.split(".")[0] in roots]
+
+
+def test_probe_records_missing_packages():
+    attempted = attempted_imports("try:\n    import manim\nexcept ImportError:\n    pass")
+    assert heavy_in(attempted) == ["manim"]
+
+
+def test_cli_help_imports_nothing_heavy():
+    attempted = attempted_imports('sys.argv = ["cli.py", "--help"]\nrunpy.run_path("cli.py", run_name="__main__")')
+    assert "argparse" in attempted
+    assert heavy_in(attempted) == []
+
+
+@pytest.mark.parametrize("module", AGENT_MODULES)
+def test_agent_import_is_lazy(module):
+    assert heavy_in(attempted_imports(f"import {module}")) == []
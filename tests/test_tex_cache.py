@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import types
+
+import tex_cache
+from tex_cache import TexCache, install, prewarm_script, tex_key
+
+
+def make_svg(path, size=100):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("x" * size)
+    return str(path)
+
+
+def age(path, seconds):
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+
+def test_key_covers_source_compiler_format_and_version():
+    key = tex_key("a^2", "latex", ".dvi", version="0.18.0")
+    assert key == tex_key("a^2", "latex", ".dvi", version="0.18.0")
+    assert len({key, tex_key("b^2", "latex", ".dvi", version="0.18.0"),
+                tex_key("a^2", "xelatex", ".xdv", version="0.18.0"),
+                tex_key("a^2", "latex", ".dvi", version="0.19.0")}) == 4
+
+
+def test_put_then_get_counts_hits_and_misses(tmp_path):
+    cache = TexCache(str(tmp_path / "tex"))
+    key = tex_key("a^2", version="test")
+    assert cache.get(key) is None
+    path = cache.put(key, make_svg(tmp_path / "a.svg"))
+    assert cache.get(key) == path and path.startswith(os.path.join(cache.root, key[:2]))
+    assert cache.stats() == {"entries": 1, "bytes": 100, "hits": 1, "misses": 1}
+
+
+def test_eviction_removes_least_recently_used_outside_the_grace_period(tmp_path):
+    cache = TexCache(str(tmp_path / "tex"), max_bytes=250)
+    keys = [tex_key(f"x_{n}", version="test") for n in range(3)]
+    for n, key in enumerate(keys[:2]):
+        age(cache.put(key, make_svg(tmp_path / f"{n}.svg")), tex_cache.EVICT_GRACE_SECONDS * (3 - n))
+    stale_tmp = cache.path(keys[0]) + ".999.1.tmp"
+    make_svg(stale_tmp)
+    age(stale_tmp, tex_cache.EVICT_GRACE_SECONDS * 2)
+    assert cache.get(keys[0]) is not None  # Now the most recently used
+    cache.put(keys[2], make_svg(tmp_path / "2.svg"))
+    assert [cache.get(key) is not None for key in keys] == [True, False, True]
+    assert not os.path.exists(stale_tmp)
+
+
+def test_recently_used_entries_survive_past_max_bytes(tmp_path):
+    cache = TexCache(str(tmp_path / "tex"), max_bytes=150)
+    keys = [tex_key(f"y_{n}", version="test") for n in range(3)]
+    for n, key in enumerate(keys):
+        cache.put(key, make_svg(tmp_path / f"{n}.svg"))
+    assert cache.stats()["entries"] == 3
+
+
+def test_install_routes_tex_compilation_through_the_cache(tmp_path, monkeypatch):
+    compiled = []
+
+    def tex_to_svg_file(expression, environment=None, tex_template=None):
+        compiled.append(expression)
+        return make_svg(tmp_path / f"compiled{len(compiled)}.svg")
+
+    template = types.SimpleNamespace(tex_compiler="latex", output_format=".dvi",
+                                     get_texcode_for_expression=lambda e: f"<preamble>{e}",
+                                     get_texcode_for_expression_in_env=lambda e, env: f"<{env}>{e}")
+    tex_file_writing = types.SimpleNamespace(tex_to_svg_file=tex_to_svg_file)
+    tex_mobject = types.SimpleNamespace(tex_to_svg_file=tex_to_svg_file)
+    manim = types.SimpleNamespace(config=types.SimpleNamespace(tex_template=template, tex_dir=""))
+    modules = {"manim": manim, "manim.mobject": types.SimpleNamespace(text=types.SimpleNamespace(
+        tex_mobject=tex_mobject)), "manim.mobject.text": types.SimpleNamespace(tex_mobject=tex_mobject),
+        "manim.mobject.text.tex_mobject": tex_mobject,
+        "manim.utils": types.SimpleNamespace(tex_file_writing=tex_file_writing),
+        "manim.utils.tex_file_writing": tex_file_writing}
+    for name, module in modules.items():
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.setattr(tex_cache, "manim_version", lambda: "test")
+
+    cache = TexCache(str(tmp_path / "tex"))
+    install(manim, cache, scratch_dir=str(tmp_path / "scratch"))
+    first = tex_mobject.tex_to_svg_file("a^2")
+    assert tex_mobject.tex_to_svg_file("a^2") == first
+    tex_file_writing.tex_to_svg_file("a^2", environment="align*")
+    assert compiled == ["a^2", "a^2"]
+    assert manim.config.tex_dir == str(tmp_path / "scratch")
+    # Installing again wraps the original compiler, not the cached wrapper
+    install(manim, cache)
+    assert tex_file_writing.tex_to_svg_file.__wrapped__ is tex_to_svg_file
+
+
+def test_prewarm_script_compiles():
+    compile(prewarm_script([r"\vec{A}", "F = ma"]), "prewarm.py", "exec")
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+import tracing
+from tracing import Tracer, annotate, fail, record, span, traced
+
+
+@pytest.fixture
+def tracer(tmp_path):
+    tracer = Tracer(path=str(tmp_path / "traces.jsonl"))
+    tracing.set_default_tracer(tracer)
+    yield tracer
+    tracer.close()
+    tracing.set_default_tracer(None)
+
+
+def test_counters_roll_up_to_every_ancestor(tracer):
+    with span("code_generation", topic="Vectors"):
+        record(llm_calls=1, prompt_tokens=100)
+        with span("validation"):
+            record(llm_calls=1, prompt_tokens=40)
+            annotate(passed=True)
+
+    validation, generation = tracer.finished
+    assert validation["parent_id"] == generation["span_id"]
+    assert validation["trace_id"] == generation["trace_id"]
+    assert generation["counters"] == {"llm_calls": 2, "prompt_tokens": 140}
+    assert validation["attributes"] == {"passed": True}
+    # Stage metrics count each call once, against the stage it happened in
+    summary = tracer.summary()
+    assert (summary["code_generation"]["llm_calls"], summary["validation"]["llm_calls"]) == (1, 1)
+
+
+def test_failures_from_exceptions_fail_and_none_results(tracer):
+    @traced("visual_plan")
+    def plan(ok):
+        return {"scenes": []} if ok else None
+
+    plan(True)
+    plan(False)
+    with pytest.raises(ValueError):
+        with span("render_attempt"):
+            raise ValueError("boom")
+    with span("refinement"):
+        fail("no_change")
+
+    assert [(s["name"], s["failure_class"]) for s in tracer.finished] == [
+        ("visual_plan", None), ("visual_plan", "no_result"), ("render_attempt", "ValueError"),
+        ("refinement", "no_change")]
+    assert tracer.summary()["visual_plan"]["failures"] == {"no_result": 1}
+
+
+def test_exports_jsonl_and_prometheus(tracer):
+    with span("topic_analysis"):
+        record(cache_hits=1)
+    tracer.close()
+    with open(tracer.path, encoding="utf-8") as f:
+        assert [json.loads(line)["name"] for line in f] == ["topic_analysis"]
+
+    text = tracer.prometheus_text()
+    assert 'agent_stage_duration_seconds_count{stage="topic_analysis"} 1' in text
+    assert 'agent_llm_cache_hits_total{stage="topic_analysis"} 1' in text
+
+
+def test_record_outside_a_span_is_a_no_op():
+    record(llm_calls=1)
+    annotate(x=1)
+    fail("ignored")
@@ -0,0 +1,30 @@
+import json
+import os
+
+from workspace import JobWorkspace
+
+
+def test_jobs_get_separate_directories(tmp_path):
+    first = JobWorkspace(root=str(tmp_path), topic="Vectors")
+    second = JobWorkspace(root=str(tmp_path), topic="Vectors")
+    assert first.job_id != second.job_id
+    assert first.image_path(1) != second.image_path(1)
+    assert os.path.dirname(first.image_path(1)) == os.path.join(first.path, "images")
+
+
+def test_script_versions_and_manifest_history(tmp_path):
+    job = JobWorkspace(root=str(tmp_path), topic="Vectors")
+    job.write_script("v1\n", attempt=0, source="codegen")
+    job.write_script("v2\n", attempt=1, source="autofix")
+    job.write_script("v1\n", attempt=2, source="llm")
+    assert job.read_script() == "v1\n"
+    assert len(os.listdir(os.path.join(job.path, "scripts"))) == 2
+
+    job.finish(status="ok", attempts=3)
+    # Reopening the job reads the manifest back
+    with open(job.manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert JobWorkspace(job.job_id, root=str(tmp_path)).manifest == manifest
+    assert (manifest["topic"], manifest["status"]) == ("Vectors", "ok")
+    assert [a["source"] for a in manifest["artifacts"]] == ["codegen", "autofix", "llm"]
+    assert manifest["artifacts"][0]["path"] == manifest["artifacts"][2]["path"]
@@ -0,0 +1,210 @@
+"""
+Content-addressed TeX -> SVG cache shared by every render worker.
+
+Manim compiles each MathTex/Tex string with latex and dvisvgm into its tex_dir,
+which is per media dir, not safe for several processes writing at once, and
+starts out cold in every fresh worker. Installed in a worker, this cache wraps
+manim's tex_to_svg_file: the key is a hash of the full .tex source (template
+preamble, environment and expression), the compiler and the manim version, and
+a hit returns the shared SVG without running latex at all.
+
+Layout: <root>/<key[:2]>/<key>.svg. Entries are written to a temp file and
+os.replace()d into place, so any number of processes can read and fill the
+cache at once and never see a partial file. Hits bump the file's mtime; past
+max_bytes the least recently used files are removed, except those used in the
+last EVICT_GRACE_SECONDS, which a worker may be about to read.
+"""
+import hashlib
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from render_cache import manim_version
+
+DEFAULT_CACHE_DIR = os.getenv("TEX_CACHE_DIR", ".cache/tex")
+DEFAULT_MAX_BYTES = int(os.getenv("TEX_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+EVICT_GRACE_SECONDS = 300
+
+# Formulas from the few-shot example, generated_manim_script.py and the topics rendered so far
+COMMON_FORMULAS = [
+    r"a^2", r"b^2", r"c^2", r"a^2 + b^2 = c^2", r"3^2 + 4^2 = 5^2",
+    r"\vec{A}", r"\vec{B}", r"\vec{A} = \vec{B}", r"|\vec{A}| = |\vec{B}|",
+    r"\vec{r} = x\hat{i} + y\hat{j}", r"\vec{v} = \frac{d\vec{r}}{dt}", r"\vec{a} = \frac{d\vec{v}}{dt}",
+    r"v = u + at", r"s = ut + \frac{1}{2}at^2", r"v^2 = u^2 + 2as",
+    r"\vec{v} = \vec{v}_0 + \vec{a}t", r"\vec{r} = \vec{r}_0 + \vec{v}_0 t + \frac{1}{2}\vec{a}t^2",
+    r"F = ma", r"E = mc^2", r"6CO_2 + 6H_2O \rightarrow C_6H_{12}O_6 + 6O_2",
+]
+
+
+def tex_key(tex_source: str, compiler: str = "", output_format: str = "", version: Optional[str] = None) -> str:
+    payload = "\x00".join([tex_source, compiler, output_format, version or manim_version()])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TexCache:
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, max_bytes: Optional[int] = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._bytes: Optional[int] = None  # Estimate; rescanned whenever eviction runs
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.svg")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.path(key)
+        try:
+            os.utime(path)  # Marks it recently used, and fails if it was evicted
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def put(self, key: str, svg_path: str) -> str:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(svg_path, tmp_path)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += size
+            if self.max_bytes is not None and (self._bytes is None or self._bytes > self.max_bytes):
+                self._evict()
+        return path
+
+    def _entries(self) -> List[tuple]:
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                full = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(full)
+                except FileNotFoundError:  # Removed by another process meanwhile
+                    continue
+                if name.endswith(".tmp"):
+                    if time.time() - st.st_mtime > EVICT_GRACE_SECONDS:  # Left by a killed worker
+                        _remove(full)
+                    continue
+                entries.append((st.st_mtime, st.st_size, full))
+        return entries
+
+    def _evict(self) -> None:
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - EVICT_GRACE_SECONDS
+        for mtime, size, full in sorted(entries):
+            if total <= self.max_bytes or mtime > cutoff:
+                break
+            if _remove(full):
+                total -= size
+        self._bytes = total
+
+    def clear(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        return {"entries": len(entries), "bytes": sum(size for _, size, _ in entries),
+                "hits": self.hits, "misses": self.misses}
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def install(manim, cache: TexCache, scratch_dir: Optional[str] = None) -> None:
+    """
+    Route manim's TeX compilation through cache (once per process, e.g. in a render
+    worker). Misses compile into scratch_dir, private to this process.
+    """
+    from manim.mobject.text import tex_mobject
+    from manim.utils import tex_file_writing
+
+    compile_tex = getattr(tex_file_writing.tex_to_svg_file, "__wrapped__", tex_file_writing.tex_to_svg_file)
+    if scratch_dir:
+        os.makedirs(scratch_dir, exist_ok=True)
+        manim.config.tex_dir = os.path.abspath(scratch_dir)
+
+    def tex_to_svg_file(expression, environment=None, tex_template=None):
+        template = tex_template or manim.config.tex_template
+        source = (template.get_texcode_for_expression_in_env(expression, environment) if environment
+                  else template.get_texcode_for_expression(expression))
+        key = tex_key(source, template.tex_compiler, template.output_format)
+        cached = cache.get(key)
+        if cached is not None:
+            return Path(cached)
+        svg = compile_tex(expression, environment=environment, tex_template=tex_template)
+        return Path(cache.put(key, str(svg)))
+
+    tex_to_svg_file.__wrapped__ = compile_tex
+    tex_file_writing.tex_to_svg_file = tex_to_svg_file
+    tex_mobject.tex_to_svg_file = tex_to_svg_file
+
+
+PREWARM_SCENE = "TexCachePrewarm"
+
+
+def prewarm_script(formulas: Iterable[str]) -> str:
+    """A scene that only constructs a MathTex per formula, skipping any that fail to compile."""
+    return f"""from manim import *
+
+FORMULAS = {list(formulas)!r}
+
+
+class {PREWARM_SCENE}(Scene):
+    def construct(self):
+        for formula in FORMULAS:
+            try:
+                MathTex(formula)
+            except Exception as e:
+                print(f"TeX cache: could not compile {{formula!r}}: {{e}}")
+"""
+
+
+def prewarm(formulas: Iterable[str] = COMMON_FORMULAS, pool=None):
+    """Compile formulas into the shared cache through a render worker (a dry run, nothing is written)."""
+    from render_pool import DRAFT_RESOLUTION, get_default_pool
+
+    pool = pool or get_default_pool()
+    return pool.render(prewarm_script(formulas), PREWARM_SCENE, resolution=DRAFT_RESOLUTION, dry_run=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pre-warm or inspect the shared TeX -> SVG cache")
+    parser.add_argument("--prewarm", nargs="?", const="", default=None, metavar="FILE",
+                        help="Compile the common formulas, or one formula per line of FILE")
+    parser.add_argument("--clear", action="store_true")
+    args = parser.parse_args()
+
+    cache = TexCache()
+    if args.clear:
+        cache.clear()
+    if args.prewarm is not None:
+        formulas = COMMON_FORMULAS
+        if args.prewarm:
+            with open(args.prewarm, "r", encoding="utf-8") as f:
+                formulas = [line.strip() for line in f if line.strip()]
+        from render_pool import RenderPool
+
+        with RenderPool(workers=1, tex_cache_dir=cache.root) as pool:
+            result = prewarm(formulas, pool)
+        print(f"Pre-warmed {len(formulas)} formulas in {result.duration:.1f}s"
+              if result.success else f"Pre-warm failed: {result.error_log()}")
+    print(cache.stats())
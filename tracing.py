@@ -0,0 +1,319 @@
+"""
+Structured spans and metrics for the agent pipeline.
+
+Every stage runs inside a span (topic_analysis, visual_plan, code_generation,
+validation, render_attempt, refinement, ...). A span records wall time, whether
+it failed and why, and counters filled in by the layers underneath it: LLM calls,
+prompt/response tokens, cache hits/misses, retries, throttles and queue wait.
+Counters are inclusive, so a code_generation span also counts the tokens of the
+validation spans inside it.
+
+Finished spans are appended to a JSONL file (TRACE_PATH, or Tracer(path=...)) and
+aggregated per stage into Prometheus text, served by serve_metrics() or written
+with prometheus_text().
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+DEFAULT_METRICS_PORT = 9464
+
+# Counter name -> (Prometheus metric, help text)
+COUNTERS = {
+    "llm_calls": ("agent_llm_calls_total", "Requests sent to the model"),
+    "prompt_tokens": ("agent_prompt_tokens_total", "Prompt tokens sent to the model"),
+    "response_tokens": ("agent_response_tokens_total", "Response tokens received from the model"),
+    "cached_prompt_tokens": ("agent_cached_prompt_tokens_total", "Prompt tokens served from provider context caches"),
+    "cache_hits": ("agent_llm_cache_hits_total", "Responses served from the LLM cache"),
+    "cache_misses": ("agent_llm_cache_misses_total", "LLM cache lookups that missed"),
+    "retries": ("agent_llm_retries_total", "Model calls retried after an error"),
+    "throttled": ("agent_llm_throttled_total", "Model calls rejected with 429 / quota errors"),
+    "queue_wait_s": ("agent_llm_queue_wait_seconds_total", "Time spent waiting for rate-limit capacity"),
+    "aborted_streams": ("agent_llm_aborted_streams_total", "Streamed responses cut off by a guard"),
+    "semantic_reuses": ("agent_semantic_cache_reuses_total", "Stage results reused from a similar earlier request"),
+    "semantic_seeds": ("agent_semantic_cache_seeds_total", "Prompts seeded with a similar earlier result"),
+    "autofix_repairs": ("agent_autofix_repairs_total", "Failed renders repaired by a deterministic auto-fix rule"),
+    "llm_repairs": ("agent_llm_repairs_total", "Failed renders sent to the model for repair"),
+    "lint_rejections": ("agent_lint_rejections_total", "Renders skipped because the pre-flight lint found certain errors"),
+}
+
+_current: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"], attributes: dict):
+        self.tracer = tracer
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.attributes = dict(attributes)
+        self.counters: Dict[str, float] = {}
+        self.failure_class: Optional[str] = None
+        self.start = time.time()
+        self._start = time.perf_counter()
+        self.duration: Optional[float] = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def fail(self, failure_class: str) -> None:
+        self.failure_class = failure_class
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_s": round(self.duration, 6) if self.duration is not None else None,
+            "status": "error" if self.failure_class else "ok",
+            "failure_class": self.failure_class,
+            "attributes": self.attributes,
+            "counters": {k: round(v, 6) for k, v in self.counters.items()},
+        }
+
+
+class _StageMetrics:
+    def __init__(self):
+        self.count = 0
+        self.duration_sum = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.failures: Dict[str, int] = {}
+        self.counters: Dict[str, float] = {}
+
+    def observe(self, duration: float) -> None:
+        self.count += 1
+        self.duration_sum += duration
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if duration <= bound:
+                self.buckets[i] += 1
+
+
+class Tracer:
+    """Collects spans, exports them as JSONL and aggregates per-stage metrics."""
+
+    def __init__(self, path: Optional[str] = None, keep: int = 1000):
+        self.path = path
+        self.keep = keep
+        self.finished: List[dict] = []  # Most recent spans, for inspection
+        self._stages: Dict[str, _StageMetrics] = {}
+        self._lock = threading.Lock()
+        self._file = None
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        current = Span(self, name, _current.get(), attributes)
+        token = _current.set(current)
+        try:
+            yield current
+        except BaseException as e:
+            current.fail(type(e).__name__)
+            raise
+        finally:
+            _current.reset(token)
+            current.duration = time.perf_counter() - current._start
+            self._finish(current)
+
+    def record(self, span: Optional[Span], **counts) -> None:
+        """Add counts to span and its ancestors; metrics are attributed to span's stage only."""
+        if span is None:
+            return
+        with self._lock:
+            stage = self._stage(span.name)
+            for key, value in counts.items():
+                stage.counters[key] = stage.counters.get(key, 0) + value
+            node = span
+            while node is not None:
+                for key, value in counts.items():
+                    node.counters[key] = node.counters.get(key, 0) + value
+                node = node.parent
+
+    def _stage(self, name: str) -> _StageMetrics:
+        if name not in self._stages:
+            self._stages[name] = _StageMetrics()
+        return self._stages[name]
+
+    def _finish(self, span: Span) -> None:
+        line = span.to_dict()
+        with self._lock:
+            stage = self._stage(span.name)
+            stage.observe(span.duration)
+            if span.failure_class:
+                stage.failures[span.failure_class] = stage.failures.get(span.failure_class, 0) + 1
+            self.finished.append(line)
+            del self.finished[:-self.keep]
+            if self.path:
+                if self._file is None:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+                self._file.flush()
+
+    def summary(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                name: {
+                    "count": s.count,
+                    "duration_total_s": round(s.duration_sum, 3),
+                    "duration_avg_s": round(s.duration_sum / s.count, 3) if s.count else 0.0,
+                    "failures": dict(s.failures),
+                    **{k: round(v, 3) for k, v in s.counters.items()},
+                }
+                for name, s in self._stages.items()
+            }
+
+    def prometheus_text(self) -> str:
+        """Per-stage metrics in the Prometheus text exposition format."""
+        with self._lock:
+            stages = sorted(self._stages.items())
+            lines = [
+                "# HELP agent_stage_duration_seconds Wall time of pipeline stages",
+                "# TYPE agent_stage_duration_seconds histogram",
+            ]
+            for name, s in stages:
+                for bound, count in zip(DURATION_BUCKETS, s.buckets):
+                    lines.append(f'agent_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'agent_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {s.count}')
+                lines.append(f'agent_stage_duration_seconds_sum{{stage="{name}"}} {s.duration_sum:.6f}')
+                lines.append(f'agent_stage_duration_seconds_count{{stage="{name}"}} {s.count}')
+            lines += [
+                "# HELP agent_stage_failures_total Failed stage runs by failure class",
+                "# TYPE agent_stage_failures_total counter",
+            ]
+            for name, s in stages:
+                for failure_class, count in sorted(s.failures.items()):
+                    lines.append(f'agent_stage_failures_total{{stage="{name}",failure_class="{failure_class}"}} {count}')
+            for key, (metric, help_text) in COUNTERS.items():
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+                for name, s in stages:
+                    if key in s.counters:
+                        lines.append(f'{metric}{{stage="{name}"}} {s.counters[key]:g}')
+        return "\n".join(lines) + "\n"
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_default_tracer: Optional[Tracer] = None
+_default_lock = threading.Lock()
+
+
+def get_default_tracer() -> Tracer:
+    global _default_tracer
+    with _default_lock:
+        if _default_tracer is None:
+            _default_tracer = Tracer(path=os.getenv("TRACE_PATH") or None)
+        return _default_tracer
+
+
+def set_default_tracer(tracer: Optional[Tracer]) -> None:
+    """Replace the shared tracer (None resets it to the env-configured default)."""
+    global _default_tracer
+    with _default_lock:
+        _default_tracer = tracer
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def span(name: str, **attributes):
+    """Context manager: run the block inside a span of the default tracer."""
+    return get_default_tracer().span(name, **attributes)
+
+
+def traced(name: str, **attributes):
+    """Decorator: run the function inside a span; a None result marks the span failed."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, **attributes) as s:
+                result = func(*args, **kwargs)
+                if result is None and s.failure_class is None:
+                    s.fail("no_result")
+                return result
+        return wrapper
+    return decorate
+
+
+def record(**counts) -> None:
+    """Add counters (llm_calls, prompt_tokens, cache_hits, retries, ...) to the current span."""
+    s = _current.get()
+    if s is not None:
+        s.tracer.record(s, **counts)
+
+
+def fail(failure_class: str) -> None:
+    """Mark the current span failed, for stages that report failure by return value."""
+    s = _current.get()
+    if s is not None:
+        s.fail(failure_class)
+
+
+def annotate(**attributes) -> None:
+    s = _current.get()
+    if s is not None:
+        s.set(**attributes)
+
+
+def serve_metrics(port: int = DEFAULT_METRICS_PORT, host: str = "127.0.0.1",
+                  tracer: Optional[Tracer] = None):
+    """Serve /metrics (Prometheus text) from a daemon thread; returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = (tracer or get_default_tracer()).prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep scrapes out of the pipeline's output
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize a span JSONL file per stage")
+    parser.add_argument("path", nargs="?", default=os.getenv("TRACE_PATH", "traces.jsonl"))
+    args = parser.parse_args()
+
+    stats: Dict[str, dict] = {}
+    with open(args.path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            s = json.loads(line)
+            entry = stats.setdefault(s["name"], {"count": 0, "failed": 0, "seconds": 0.0,
+                                                 "llm_calls": 0, "prompt_tokens": 0, "response_tokens": 0})
+            entry["count"] += 1
+            entry["failed"] += s["status"] == "error"
+            entry["seconds"] += s["duration_s"] or 0.0
+            for key in ("llm_calls", "prompt_tokens", "response_tokens"):
+                entry[key] += s["counters"].get(key, 0)
+    print(f"{'stage':<20} {'count':>6} {'failed':>6} {'total s':>9} {'avg s':>7} {'calls':>6} {'tokens in/out':>15}")
+    for name, e in sorted(stats.items(), key=lambda item: -item[1]["seconds"]):
+        tokens = f"{e['prompt_tokens']:.0f}/{e['response_tokens']:.0f}"
+        print(f"{name:<20} {e['count']:>6} {e['failed']:>6} {e['seconds']:>9.2f} "
+              f"{e['seconds'] / e['count']:>7.2f} {e['llm_calls']:>6.0f} {tokens:>15}")
@@ -1,16 +1,11 @@
-import google.generativeai as genai
 import json
-import os
-import re
-from dotenv import load_dotenv
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, ValidationError
+from typing import Callable, List, Optional
 from Topic_analysis_agent import TopicAnalysisAgent
-
-# Load API Key
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEMINI_API_KEY)
+from gemini_client import get_model
+from json_extractor import JSONStreamScanner, extract_json, validate_partial
+from llm_stream import json_guard, stream_with_reissue
+from tracing import annotate, fail, record, traced
 
 # Define Pydantic Models for Visual Plan
 class ManimObject(BaseModel):
@@ -44,43 +39,102 @@ Example:
     "SelectedVisualization": "Flowchart"
 }"""
 
+def plan_query(topic_analysis) -> str:
+    """Text a visual plan is looked up by in the semantic cache."""
+    return f"{topic_analysis.CoreTopic}: {', '.join(topic_analysis.KeyConcepts)}"
+
+
 class VisualPlanAgent:
-    def __init__(self):
+    def __init__(self, semantic_cache=None):
         self.system_prompt = VISUAL_PLAN_SYSTEM_PROMPT
-        self.model = genai.GenerativeModel("gemini-1.5-flash")
-
-    def generate_plan(self, topic_analysis: dict, chapter: str, grade: str) -> Optional[VisualPlan]:
-        """Generate a visual plan based on Topic Analysis."""
+        self.model = get_model("gemini-1.5-flash", system_instruction=self.system_prompt)
+        self.semantic_cache = semantic_cache  # None: the shared one, loaded on first use (imports numpy)
+
+    def _semantic_cache(self):
+        if self.semantic_cache is None:
+            from semantic_cache import get_default_semantic_cache
+            self.semantic_cache = get_default_semantic_cache("visual_plan")
+        return self.semantic_cache
+
+    @traced("visual_plan")
+    def generate_plan(self, topic_analysis: dict, chapter: str, grade: str,
+                      on_partial: Optional[Callable[[VisualPlan], None]] = None) -> Optional[VisualPlan]:
+        """
+        Generate a visual plan based on Topic Analysis.
+        The response is streamed; on_partial receives a VisualPlan holding the fields
+        validated so far (built with model_construct) each time more of them arrive.
+        A plan for a near-identical analysis at the same grade is reused without a model
+        call; one for a merely similar analysis is passed to the model as a starting point.
+        """
         if not topic_analysis:
             print("Error: No valid topic analysis data received.")
             return None
 
+        cache, query = self._semantic_cache(), plan_query(topic_analysis)
+        mode, match = cache.find(query, grade=grade)
+        if mode == "reuse":
+            annotate(semantic_cache="reuse", similarity=round(match.similarity, 3), reused_topic=match.text)
+            record(semantic_reuses=1)
+            plan = VisualPlan.model_validate(match.value)
+            if on_partial:
+                on_partial(plan)
+            return plan
+
         # Convert Pydantic model to dictionary first
         prompt = f"""
         **Topic Analysis:** {json.dumps(topic_analysis.model_dump(), indent=4)}
         **Chapter:** {chapter}
         **Grade:** {grade}
         """
+        if mode == "seed":
+            annotate(semantic_cache="seed", similarity=round(match.similarity, 3), seed_topic=match.text)
+            record(semantic_seeds=1)
+            prompt += f"""
+        **Related Plan** (for "{match.text}", grade {match.meta.get('grade')}; keep what applies, adapt the rest):
+        {json.dumps(match.value)}
+        """
 
-        response = self.model.generate_content(self.system_prompt + prompt)
+        scanner, consumed, last_fields = JSONStreamScanner(), 0, None
+
+        def on_restart(attempt: int) -> None:
+            # A re-issued request streams a new reply from the start
+            nonlocal scanner, consumed, last_fields
+            scanner, consumed, last_fields = JSONStreamScanner(), 0, None
+
+        def on_chunk(text_so_far: str) -> None:
+            nonlocal consumed, last_fields
+            scanner.feed(text_so_far[consumed:])
+            consumed = len(text_so_far)
+            current = scanner.values[0] if scanner.values else scanner.partial()
+            fields = validate_partial(current, VisualPlan)
+            if fields and fields != last_fields:
+                last_fields = fields
+                on_partial(VisualPlan.model_construct(**fields))
+
+        response_text = stream_with_reissue(self.model, prompt, guard=json_guard(),
+                                            on_chunk=on_chunk if on_partial else None,
+                                            on_restart=on_restart if on_partial else None)
         
         # Debugging: Print raw response
-        response_text = response.candidates[0].content.parts[0].text.strip() if response.candidates else ""
+        response_text = response_text.strip() if response_text else ""
         print("Raw Response from Gemini:\n", response_text)
 
-        # Extract JSON block
-        json_match = re.search(r'```json\s*([\s\S]*?)\s*```', response_text)
+        # Extract JSON block (fenced or not)
+        visual_plan_data = extract_json(response_text, expect=(dict,))
 
-        if not json_match:
+        if visual_plan_data is None:
             print("Error: JSON block not found in response.")
+            fail("json_error")
             return None
 
         try:
-            visual_plan_data = json.loads(json_match.group(1))
-            return VisualPlan(**visual_plan_data)
-        except json.JSONDecodeError as e:
-            print("Error: Invalid JSON format in response.", str(e))
+            plan = VisualPlan.model_validate(visual_plan_data)
+        except ValidationError as e:
+            print("Error: Invalid visual plan in response.", str(e))
+            fail("validation_error")
             return None
+        cache.put(query, plan.model_dump(), grade=grade, chapter=chapter)
+        return plan
 
 
 if __name__ == "__main__":
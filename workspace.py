@@ -0,0 +1,144 @@
+"""
+Per-job workspaces for the generate -> render -> repair loop.
+
+Every run of the pipeline gets its own directory under JOB_WORKSPACE_ROOT:
+
+    jobs/<job_id>/
+        generated_manim_script.py     current script (what the next render uses)
+        scripts/<sha256[:16]>.py      every version of the script, by content hash
+        media/                        manim's media_dir for this job's renders
+        images/output_attempt_N.png   rendered frames (+ .score.json)
+        logs/manim_error_attempt_N.log
+        manifest.json                 job metadata and the history of artifacts
+
+Nothing is shared between jobs, so any number of topics can run at once on one
+machine. Files are written through a temp file and os.replace, so a reader (or
+a crashed job) never sees a half-written script or manifest.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+DEFAULT_ROOT = os.getenv("JOB_WORKSPACE_ROOT", "jobs")
+SCRIPT_NAME = "generated_manim_script.py"
+
+
+def new_job_id() -> str:
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(4).hex()}"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _write_atomic(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class JobWorkspace:
+    """The directory holding every artifact of one pipeline job."""
+
+    def __init__(self, job_id: Optional[str] = None, root: str = DEFAULT_ROOT, **metadata):
+        self.job_id = job_id or new_job_id()
+        self.path = os.path.abspath(os.path.join(root, self.job_id))
+        self.manifest_path = os.path.join(self.path, "manifest.json")
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        self.manifest = self._load_manifest()
+        if metadata:
+            self.manifest.update(metadata)
+            self._save_manifest()
+
+    def _load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"job_id": self.job_id, "created_at": round(time.time(), 3), "artifacts": []}
+
+    def _save_manifest(self) -> None:
+        _write_atomic(self.manifest_path, json.dumps(self.manifest, indent=4, ensure_ascii=False))
+
+    def file(self, *parts: str) -> str:
+        """Absolute path of a file inside the workspace (parent directories are created)."""
+        path = os.path.join(self.path, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    @property
+    def script_path(self) -> str:
+        return os.path.join(self.path, SCRIPT_NAME)
+
+    @property
+    def media_dir(self) -> str:
+        path = os.path.join(self.path, "media")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def image_path(self, attempt: int) -> str:
+        return self.file("images", f"output_attempt_{attempt}.png")
+
+    def log_path(self, attempt: int) -> str:
+        return self.file("logs", f"manim_error_attempt_{attempt}.log")
+
+    def record(self, kind: str, path: str, **info) -> None:
+        """Add an artifact to the manifest's history."""
+        with self._lock:
+            self.manifest["artifacts"].append({"kind": kind, "path": os.path.relpath(path, self.path),
+                                               "at": round(time.time(), 3), **info})
+            self._save_manifest()
+
+    def write_script(self, script: str, **info) -> str:
+        """Make script the current one; every version is also kept under scripts/ by content hash."""
+        digest = content_hash(script)
+        version_path = self.file("scripts", f"{digest[:16]}.py")
+        if not os.path.exists(version_path):
+            _write_atomic(version_path, script)
+        _write_atomic(self.script_path, script)
+        self.record("script", version_path, sha256=digest, **info)
+        return self.script_path
+
+    def read_script(self) -> str:
+        with open(self.script_path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def write_text(self, name: str, text: str, kind: Optional[str] = None, **info) -> str:
+        path = self.file(name)
+        _write_atomic(path, text)
+        if kind:
+            self.record(kind, path, **info)
+        return path
+
+    def read_text(self, name: str) -> str:
+        with open(os.path.join(self.path, name), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def finish(self, **result) -> None:
+        with self._lock:
+            self.manifest.update(result, finished_at=round(time.time(), 3))
+            self._save_manifest()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="List job workspaces")
+    parser.add_argument("--root", default=DEFAULT_ROOT)
+    args = parser.parse_args()
+
+    if os.path.isdir(args.root):
+        for job_id in sorted(os.listdir(args.root)):
+            manifest_path = os.path.join(args.root, job_id, "manifest.json")
+            if not os.path.exists(manifest_path):
+                continue
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            print(f"{job_id}  {manifest.get('topic', '')!r}  status={manifest.get('status', 'running')}  "
+                  f"artifacts={len(manifest.get('artifacts', []))}")